@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import sys
+import math
+import heapq
+from generate import *
+
+# -----------------------------------------------------------------------------
+# Beam search -----------------------------------------------------------------
+# Finds the most likely lines the lyrics models can write, instead of
+# sampling one line at a time. the probability of a word is its count over
+# the total count of its candidates, in the model selectNGramModel picks for
+# the line so far (trigram, then bigram, then unigram), and a line is scored
+# by the log of the product of the probabilities of its words and of the
+# '$:::$' that ends it.
+#
+# Lines of different lengths are ranked by their log-probability per word,
+# ending included, since the total would always favor the shortest lines.
+
+# the number of partial lines kept after each word
+BEAM_WIDTH = 32
+
+
+def beamSearchLines(models, desiredLength, n=10, sentence1=None, beamWidth=BEAM_WIDTH,
+                    minLength=MIN_RHYMING_LENGTH):
+    """
+    Requires: models is a list of trained NGramModel objects sorted by
+              descending priority: tri-, then bi-, then unigrams.
+              desiredLength >= minLength >= 1, and n and beamWidth are
+              positive ints. sentence1 is None or a list of strings
+    Modifies: nothing
+    Effects:  searches for lines of minLength to desiredLength words,
+              keeping the beamWidth most likely partial lines after each
+              word, and returns the best n lines that were finished as a
+              list of (score, line) tuples, best first, where line is a
+              list of strings and score its log-probability per word.
+
+              a line is only finished where the models can end it with
+              '$:::$'. if sentence1 is given, it is also only finished if
+              its last word rhymes with the last word of sentence1, as
+              checkForRhyme decides, so every line returned rhymes. the
+              rhyming words are looked ahead for as soon as they are
+              candidates, because the few partial lines that happen to
+              end on a rhyme would rarely stay in the beam otherwise.
+    """
+    rhymeIndex = getRhymeIndex()
+    rhyme_word = sentence1[-1] if sentence1 is not None else None
+
+    # partial lines are (log-probability, words) tuples, where words
+    # still starts with the starting symbols
+    beam = [(0.0, ['^::^', '^:::^'])]
+    finished = []
+
+    for length in range(desiredLength + 1):
+        expanded = []
+        for score, words in beam:
+            selected_model = selectNGramModel(models, words)
+            if selected_model is None:
+                continue
+            candidates = selected_model.getCandidateDictionary(words)
+            total = float(sum(candidates.values()))
+            for word, count in candidates.items():
+                if word in ('^::^', '^:::^'):
+                    continue
+                word_score = score + math.log(count / total)
+                if word == '$:::$':
+                    if length >= minLength and rhyme_word is None:
+                        finished.append((word_score / (length + 1), words[2:]))
+                elif length < desiredLength:
+                    expanded.append((word_score, words + [word]))
+                    if (rhyme_word is not None and length + 1 >= minLength
+                            and rhymeIndex.rhymes(rhyme_word, word)):
+                        finished.extend(endLine(models, word_score, words + [word]))
+
+        # all partial lines are the same length, so
+        # their total log-probabilities can be compared
+        beam = heapq.nlargest(beamWidth, expanded, key=lambda hypothesis: hypothesis[0])
+        if not beam:
+            break
+
+    return heapq.nlargest(n, finished, key=lambda line: line[0])
+
+def endLine(models, score, words):
+    """
+    Requires: models is the same as for beamSearchLines, and words is a
+              partial line of beamSearchLines with log-probability score
+    Modifies: nothing
+    Effects:  returns [(score, line)] for the line finished right after
+              words, scored as beamSearchLines scores finished lines, or
+              [] if the models can't end the line there
+    """
+    selected_model = selectNGramModel(models, words)
+    if selected_model is None:
+        return []
+    candidates = selected_model.getCandidateDictionary(words)
+    count = candidates.get('$:::$', 0)
+    if count <= 0:
+        return []
+    score += math.log(count / float(sum(candidates.values())))
+    return [(score / (len(words) - 1), words[2:])]
+
+def scoreLine(models, line):
+    """
+    Requires: models is the same as for beamSearchLines and line is a
+              non-empty list of strings
+    Modifies: nothing
+    Effects:  returns the log-probability per word of line, ending
+              included, the way beamSearchLines scores it, so sampled
+              lines can be ranked alongside. returns -inf if the models
+              can't write line at all
+    """
+    words = ['^::^', '^:::^']
+    score = 0.0
+    for word in line + ['$:::$']:
+        selected_model = selectNGramModel(models, words)
+        if selected_model is None:
+            return float('-inf')
+        candidates = selected_model.getCandidateDictionary(words)
+        count = candidates.get(word, 0)
+        if count <= 0:
+            return float('-inf')
+        score += math.log(count / float(sum(candidates.values())))
+        words.append(word)
+    return score / (len(line) + 1)
+
+
+# -----------------------------------------------------------------------------
+# Testing code ----------------------------------------------------------------
+
+if __name__ == '__main__':
+    lyricsModels = trainLyricsModels(sys.argv[1] if len(sys.argv) > 1 else 'Coldplay')
+    for score, line in beamSearchLines(lyricsModels[0], 6):
+        print('%.3f' % score, ' '.join(line))
+    print('')
+    for score, line in beamSearchLines(lyricsModels[0], 6, sentence1=['you', 'and', 'me']):
+        print('%.3f' % score, ' '.join(line))
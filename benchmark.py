@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import sys
+import io
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from modelRegistry import *
+
+# -----------------------------------------------------------------------------
+# Benchmarks ------------------------------------------------------------------
+# Run from the top level directory, next to rhymeLibrary.txt:
+#     python benchmark.py
+
+def benchmarkRhymeIndex(models, numSongs=5):
+    """
+    Requires: models is the list returned by trainLyricsModels
+    Modifies: the process-wide RhymeIndex
+    Effects:  generates numSongs songs with a fresh RhymeIndex and
+              prints how long each song took and how many times
+              rhymeLibrary.txt was loaded while generating it
+    """
+
+    # starts from an index that hasn't been loaded yet so
+    # that the first song pays for loading the library
+    rhymeIndex = RhymeIndex()
+    setRhymeIndex(rhymeIndex)
+
+    print('RhymeIndex: songs =', numSongs)
+    for i in range(numSongs):
+        loads = rhymeIndex.loadCount
+        start = time.time()
+        with redirect_stdout(io.StringIO()):   # the songs themselves aren't needed
+            runRhymingLyricsGenerator(models)
+        elapsed = time.time() - start
+        print('  song %d: %.3fs, rhymeLibrary loads = %d' % (i + 1, elapsed, rhymeIndex.loadCount - loads))
+    print('  total rhymeLibrary loads =', rhymeIndex.loadCount)
+
+def benchmarkCompactStorage(lyricsDirectory):
+    """
+    Requires: nothing
+    Modifies: nothing
+    Effects:  trains the lyrics models with and without compact storage
+              and prints the memory used by each model's counts
+    """
+    print('Compact storage:')
+    names = ['trigram', 'bigram', 'unigram', 'reverse trigram', 'reverse bigram']
+    for compact in [False, True]:
+        models = trainLyricsModels(lyricsDirectory, compact)
+        counts = [model.nGramCounts for model in models[0] + models[1][:2]]
+        seen = set()
+        sizes = [deepSizeOf(nGramCounts, seen) for nGramCounts in counts]
+        print('  compact = %s: %s, total %d bytes' % (compact, ', '.join(
+            '%s %d' % (name, size) for name, size in zip(names, sizes)), sum(sizes)))
+
+def benchmarkSnapshot(lyricsDirectory, snapshotFile='benchmark.snapshot'):
+    """
+    Requires: nothing
+    Modifies: the file snapshotFile, which is removed afterwards
+    Effects:  prints how long trainLyricsModels takes to train and save
+              a snapshot, and then to start again from that snapshot
+    """
+    if os.path.exists(snapshotFile):
+        os.remove(snapshotFile)
+
+    print('Snapshot:')
+    for label in ['cold start (train and save)', 'warm start (load)']:
+        start = time.time()
+        trainLyricsModels(lyricsDirectory, snapshotFile=snapshotFile)
+        print('  %s: %.3fs' % (label, time.time() - start))
+    print('  snapshot size = %d bytes' % os.path.getsize(snapshotFile))
+
+    os.remove(snapshotFile)
+
+def benchmarkStreaming(lyricsDirectory):
+    """
+    Requires: nothing
+    Modifies: nothing
+    Effects:  prints the peak memory used while training the lyrics
+              models from the fully loaded dataLoader.lyrics list, and
+              while training them from the streamed lines the way
+              trainLyricsModels does
+    """
+    print('Streaming:')
+
+    tracemalloc.start()
+    dataLoader = DataLoader()
+    dataLoader.loadLyrics(lyricsDirectory)
+    trainModels(dataLoader.lyrics, [UnigramModel(), BigramModel(), TrigramModel()],
+                [BigramModel(), TrigramModel()])
+    print('  loadLyrics: peak %d bytes' % tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    trainLyricsModels(lyricsDirectory)
+    print('  iterLines:  peak %d bytes' % tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+def benchmarkParallel(lyricsDirectory, processCounts=(1, 2, 4)):
+    """
+    Requires: nothing
+    Modifies: nothing
+    Effects:  prints how long trainLyricsModels takes with each number of
+              worker processes in processCounts, where 1 is the serial path
+    """
+    print('Parallel training: cores =', multiprocessing.cpu_count())
+    for processes in processCounts:
+        start = time.time()
+        trainLyricsModels(lyricsDirectory, processes=processes)
+        print('  processes = %d: %.3fs' % (processes, time.time() - start))
+
+def main():
+    lyricsDirectory = sys.argv[1] if len(sys.argv) > 1 else 'Coldplay'
+
+    start = time.time()
+    lyricsModels = trainLyricsModels(lyricsDirectory)
+    print('trainLyricsModels: %.3fs' % (time.time() - start))
+
+    benchmarkRhymeIndex(lyricsModels)
+    benchmarkCompactStorage(lyricsDirectory)
+    benchmarkSnapshot(lyricsDirectory)
+    benchmarkStreaming(lyricsDirectory)
+    benchmarkParallel(lyricsDirectory)
+
+
+if __name__ == '__main__':
+    main()
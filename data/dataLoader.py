@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import os
 import re
+import hashlib
 from unicodedata import normalize
 
 
@@ -17,7 +18,9 @@ class DataLoader(object):
         for the lyrics to be loaded into, which will become a list
         of lists of words to be used in NGramModels. It also
         instantiates regular expression member variables for
-        patterns to be found in the raw data.
+        patterns to be found in the raw data. self.manifest maps
+        the file name of each song loaded to its content hash and
+        cleaned lines.
 
         The music portion sets up a blank list, self.songs, which
         will become a list of lists of PySynth tuples to be
@@ -26,13 +29,43 @@ class DataLoader(object):
         """
         # Lyrics
         self.lyrics = []
+        self.manifest = {}
         self.spaceRegex = re.compile("\s+")
         self.punctuationRegex = re.compile("[,.;:!\*?\\/()'\"\-_]")
         self.bracketRegex = re.compile("\[.*?\]")
+        self.cleaningRegex = re.compile(self.bracketRegex.pattern + "|" +
+                                        self.punctuationRegex.pattern)
 
         # Music
         self.songs = []
 
+    def listArtists(self):
+        """
+        Returns the sorted names of every artist directory in the
+        lyrics directory, i.e. every dirName loadLyrics accepts.
+        """
+        scriptDir = os.path.dirname(os.path.abspath(__file__))
+        musicDir = os.path.join(scriptDir, "lyrics/")
+        return sorted(item for item in os.listdir(musicDir)
+                      if os.path.isdir(os.path.join(musicDir, item)))
+
+    def getArtistDir(self, dirName):
+        """
+        Returns the path of the data/lyrics/<dirName> directory, ending
+        in "/", or None after printing a message if there is no artist
+        named dirName in the lyrics directory.
+        """
+        scriptDir = os.path.dirname(os.path.abspath(__file__))
+        musicDir = os.path.join(scriptDir, "lyrics/")
+        dirs = [normalize('NFC', item) for item in os.listdir(musicDir)]
+
+        if normalize('NFC', dirName) not in dirs:
+        # check if this artist has a directory in the lyrics directory
+            print("No artist named", dirName, "in directory", musicDir)
+            return None
+
+        return musicDir + dirName + "/"
+
     def loadLyrics(self, dirName):
         """
         Loads the lyrics files from the directory specified by dirName,
@@ -40,35 +73,142 @@ class DataLoader(object):
         cleans that line by removing punctuation and extraneous
         whitespaces, and lowercasing all words in the line. Finally, adds
         the line to the self.lyrics list, where a line is a list of words.
+
+        Also records each song's content hash and cleaned lines in
+        self.manifest (see readSong), which is what the models need to
+        be updated incrementally when songs change.
+
+        To train on a corpus too large to hold in memory, use iterLines
+        instead, which yields the same lines one song at a time.
         """
-        scriptDir = os.path.dirname(os.path.abspath(__file__))
-        musicDir = os.path.join(scriptDir, "lyrics/")
-        dirs = [normalize('NFC', str(item, 'utf-8')) for \
-            item in os.listdir(musicDir)]
-        dirName = str(dirName, 'utf-8')
+        self.lyrics.extend(self.iterLines(dirName, self.manifest))
 
-        if normalize('NFC', dirName) not in dirs:
-        # check if this artist has a directory in the lyrics directory
-            print("No artist named", dirName, "in directory", musicDir)
+    def listSongs(self, dirName):
+        """
+        Returns the file names of the songs in the directory specified by
+        dirName, in the order loadLyrics reads them, or an empty list if
+        the directory doesn't exist.
+        """
+        artistDir = self.getArtistDir(dirName)
+        if artistDir is None:
+            return []
+        return os.listdir(artistDir)
+
+    def iterSongs(self, dirName, songs=None):
+        """
+        Generator over the lyrics files in the directory specified by
+        dirName, if that directory exists. Yields a (song, hash, lines)
+        tuple for each file, where song is the file name and hash and
+        lines are as returned by readSong. Only one song is read into
+        memory at a time. If songs is given, only the files named in
+        songs are read, in that order.
+        """
+        artistDir = self.getArtistDir(dirName)
+        if artistDir is None:
             return
 
-        artistDir = musicDir + dirName + "/"
-        songs = os.listdir(artistDir)
+        if songs is None:
+            songs = os.listdir(artistDir)
         for song in songs:
-            songFile = open(artistDir + song)
-            songLines = songFile.readlines()
-            songFile.close()
+            songHash, songLines = self.readSong(artistDir + song)
+            yield song, songHash, songLines
 
-            # clean each line in each song and add it to self.lyrics
+    def iterLines(self, dirName, manifest=None, songs=None):
+        """
+        Generator over the cleaned lines of every song in the directory
+        specified by dirName (or only of songs, see iterSongs), in the
+        same order loadLyrics would add them to self.lyrics. Nothing is
+        kept after a song has been yielded, so memory use is bounded by
+        the longest song, unless manifest is given: then each song's
+        (hash, lines) is recorded in it, as loadLyrics does in
+        self.manifest.
+        """
+        for song, songHash, songLines in self.iterSongs(dirName, songs):
+            if manifest is not None:
+                manifest[song] = (songHash, songLines)
             for line in songLines:
-                line = re.sub(self.bracketRegex, "", line)
-                line = re.sub(self.punctuationRegex, "", line)
-                line = re.sub(self.spaceRegex, " ", line)
-                line = line.lower()
-                line = line.strip().split()
-                line = [word for word in line if word != ""]
-                if line:
-                    self.lyrics.append(line)
+                yield line
+
+    def cleanLine(self, line):
+        """
+        Cleans line by removing bracketed text like [Chorus],
+        punctuation and extraneous whitespaces, and lowercasing all
+        words in the line. Returns the line as a list of words.
+        """
+
+        # self.cleaningRegex removes brackets and punctuation in one
+        # pass, and split() takes care of the whitespace
+        return self.cleaningRegex.sub("", line).lower().split()
+
+    def readSong(self, songPath):
+        """
+        Reads the song file at songPath and returns a (hash, lines) tuple,
+        where hash is the sha1 hex digest of the file's contents and lines
+        is the list of its non-empty cleaned lines.
+        """
+        songFile = open(songPath, 'rb')
+        contents = songFile.read()
+        songFile.close()
+
+        # splits lines the same way reading the file as text would
+        text = contents.decode('utf-8').replace("\r\n", "\n").replace("\r", "\n")
+        lines = [self.cleanLine(line) for line in text.split("\n")]
+        return hashlib.sha1(contents).hexdigest(), [line for line in lines if line]
+
+    def loadSong(self, dirName, song):
+        """
+        Returns readSong of the file named song in the directory specified
+        by dirName, or None if the directory or the song doesn't exist,
+        e.g. because the song was removed.
+        """
+        artistDir = self.getArtistDir(dirName)
+        if artistDir is None or not os.path.isfile(artistDir + song):
+            return None
+        return self.readSong(artistDir + song)
+
+    def changedSongs(self, dirName, manifest):
+        """
+        Compares manifest, a {song: (hash, lines)} dictionary like
+        self.manifest, against the songs currently in the directory
+        specified by dirName. Returns the sorted list of the songs that
+        were added, changed or removed since manifest was made.
+        """
+        hashes = self.hashSongs(dirName)
+        songs = set(hashes) | set(manifest)
+        return sorted(song for song in songs
+                      if song not in hashes or song not in manifest
+                      or hashes[song] != manifest[song][0])
+
+    def hashSongs(self, dirName):
+        """
+        Returns a dictionary mapping the file name of each song in the
+        directory specified by dirName to the sha1 hex digest of that
+        file's contents, or an empty dictionary if the directory
+        doesn't exist.
+        """
+        artistDir = self.getArtistDir(dirName)
+        if artistDir is None:
+            return {}
+
+        hashes = {}
+        for song in os.listdir(artistDir):
+            songFile = open(artistDir + song, 'rb')
+            hashes[song] = hashlib.sha1(songFile.read()).hexdigest()
+            songFile.close()
+        return hashes
+
+    def hashLyrics(self, dirName):
+        """
+        Returns a single sha1 hex digest of every song file name and
+        its contents in the directory specified by dirName. The digest
+        changes whenever a song is added, removed, renamed or edited,
+        so it can be used to tell whether models trained on the
+        directory are out of date.
+        """
+        digest = hashlib.sha1()
+        for song, songHash in sorted(self.hashSongs(dirName).items()):
+            digest.update(song.encode('utf-8') + b"\0" + songHash.encode('ascii') + b"\n")
+        return digest.hexdigest()
 
 if __name__ == "__main__":
     dataLoader = DataLoader()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import re
+import sys
+
+# default location of the pronunciation dictionary, in the format of the
+# CMU Pronouncing Dictionary (cmudict.dict): one pronunciation per line,
+# the word followed by its ARPAbet phones, with stress marked on vowels
+#
+#     yellow Y EH1 L OW0
+#     don't D OW1 N T
+#     a(2) EY1
+#
+# older releases write the words in upper case and comment lines with ;;;
+PRONUNCIATION_DICTIONARY = 'cmudict.dict'
+
+# the ARPAbet vowels, which carry the stress digits
+VOWELS = frozenset(['AA', 'AE', 'AH', 'AO', 'AW', 'AY', 'EH', 'ER', 'EY',
+                    'IH', 'IY', 'OW', 'OY', 'UH', 'UW'])
+
+# the unstressed vowels that end too many words for a last syllable with
+# one of them to count as a rhyme, as in the -ment, -ing, -er and -y of
+# abandonment, going, longer and happy
+WEAK_VOWELS = frozenset(['AH0', 'IH0', 'ER0', 'IY0'])
+
+# the consonants grouped by how they are said. near rhymes only need their
+# consonants to be of the same kind, e.g. time and line, or cup and cut
+CONSONANT_CLASSES = {
+    'P': 'stop', 'B': 'stop', 'T': 'stop', 'D': 'stop', 'K': 'stop', 'G': 'stop',
+    'F': 'fricative', 'V': 'fricative', 'TH': 'fricative', 'DH': 'fricative',
+    'S': 'fricative', 'Z': 'fricative', 'SH': 'fricative', 'ZH': 'fricative',
+    'HH': 'fricative', 'CH': 'affricate', 'JH': 'affricate',
+    'M': 'nasal', 'N': 'nasal', 'NG': 'nasal',
+    'L': 'liquid', 'R': 'liquid', 'W': 'glide', 'Y': 'glide'
+}
+
+# how the last syllable of a word that isn't in the dictionary is guessed
+# to sound, from its spelling. vowel spellings are looked up longest first,
+# and iy is said as in the lie of lalalaiy
+GRAPHEME_VOWELS = {
+    'a': 'AE', 'e': 'EH', 'i': 'IH', 'o': 'AA', 'u': 'AH', 'y': 'IY',
+    'ai': 'EY', 'ay': 'EY', 'ei': 'EY', 'ey': 'EY', 'ee': 'IY', 'ea': 'IY',
+    'ie': 'IY', 'iy': 'AY', 'oo': 'UW', 'ou': 'AW', 'ow': 'OW', 'oa': 'OW',
+    'oe': 'OW', 'oi': 'OY', 'oy': 'OY', 'au': 'AO', 'aw': 'AO', 'ue': 'UW',
+    'ui': 'UW', 'ew': 'UW', 'eu': 'UW'
+}
+
+# how a vowel sounds when it ends the word, as in go, la, me, flu and
+# happy, or comes before a consonant and a silent e, as in time and hope.
+# a y that ends a word with no other vowel sounds long, as in my and sky
+GRAPHEME_OPEN_VOWELS = {'a': 'AA', 'e': 'IY', 'i': 'IY', 'o': 'OW', 'u': 'UW', 'y': 'IY'}
+GRAPHEME_LONG_VOWELS = {'a': 'EY', 'e': 'IY', 'i': 'AY', 'o': 'OW', 'u': 'UW', 'y': 'AY'}
+
+GRAPHEME_CONSONANTS = {
+    'ng': ['NG'], 'nk': ['NG', 'K'], 'ck': ['K'], 'sh': ['SH'], 'ch': ['CH'],
+    'tch': ['CH'], 'th': ['TH'], 'ph': ['F'], 'gh': [], 'dg': ['JH'],
+    'b': ['B'], 'c': ['K'], 'd': ['D'], 'f': ['F'], 'g': ['G'], 'h': [],
+    'j': ['JH'], 'k': ['K'], 'l': ['L'], 'm': ['M'], 'n': ['N'], 'p': ['P'],
+    'q': ['K'], 'r': ['R'], 's': ['S'], 't': ['T'], 'v': ['V'], 'w': [],
+    'x': ['K', 'S'], 'z': ['Z']
+}
+
+
+class PhoneticRhymes(object):
+
+    def __init__(self, fileName=PRONUNCIATION_DICTIONARY):
+        """
+        Requires: fileName is the path of a pronunciation dictionary,
+                  which does not need to exist
+        Modifies: self (this instance of the PhoneticRhymes object)
+        Effects:  this is the PhoneticRhymes constructor. like RhymeIndex,
+                  it does not read the dictionary until the first lookup.
+
+                  once loaded, self.pronunciations[word] is the list of
+                  ways word is pronounced, each a tuple of phones, and
+                  self.perfectWords[key] and self.nearWords[key] are the
+                  words whose rhyme keys include key, so finding the
+                  rhymes of a word is one hash lookup per key. without a
+                  dictionary every word is pronounced from its spelling.
+        """
+        self.fileName = fileName
+        self.pronunciations = None
+        self.perfectWords = {}
+        self.nearWords = {}
+
+    def load(self):
+        """
+        Requires: nothing
+        Modifies: self
+        Effects:  reads the pronunciation dictionary, if it exists, and
+                  indexes every word in it by its rhyme keys
+        """
+        if os.path.exists(self.fileName):
+            self.pronunciations = readPronunciations(self.fileName)
+        else:
+            self.pronunciations = {}
+        self.perfectWords, self.nearWords = indexRhymeKeys(self.pronunciations,
+                                                           self.pronunciations)
+
+    def isLoaded(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns True if the dictionary has already been loaded
+        """
+        return self.pronunciations is not None
+
+    def pronounce(self, word):
+        """
+        Requires: word is a lowercase string
+        Modifies: self, if the dictionary has not been loaded yet
+        Effects:  returns the list of ways word is pronounced, as tuples
+                  of phones. words that aren't in the dictionary are
+                  looked up with an apostrophe put back (dont, youre),
+                  then with their repeated letters and syllables cut
+                  down (oooon, ohohoh), and are otherwise pronounced
+                  from the spelling of their last syllable.
+        """
+        if self.pronunciations is None:
+            self.load()
+        pronunciations = self.pronunciations.get(word)
+        if pronunciations:
+            return pronunciations
+
+        for spelling in spellingVariants(word):
+            pronunciations = self.pronunciations.get(spelling)
+            if pronunciations:
+                return pronunciations
+
+        phones = graphemePhones(word)
+        return [phones] if phones else []
+
+    def rhymeKeys(self, word):
+        """
+        Requires: word is a lowercase string
+        Modifies: self, if the dictionary has not been loaded yet
+        Effects:  returns (perfect keys, near keys) of word, the sets of
+                  perfectKey and nearKeys of every way it is pronounced
+        """
+        perfect = set()
+        near = set()
+        for phones in self.pronounce(word):
+            perfect.add(perfectKey(phones))
+            near.update(nearKeys(phones))
+        return perfect, near
+
+    def perfectRhymes(self, word):
+        """
+        Requires: word is a lowercase string
+        Modifies: self, if the dictionary has not been loaded yet
+        Effects:  returns the sorted list of words in the dictionary that
+                  sound the same as word from their last stressed vowel on
+        """
+        perfect = self.rhymeKeys(word)[0]
+        return sorted(set(rhyme for key in perfect
+                          for rhyme in self.perfectWords.get(key, ())) - set([word]))
+
+    def nearRhymes(self, word):
+        """
+        Requires: word is a lowercase string
+        Modifies: self, if the dictionary has not been loaded yet
+        Effects:  returns the sorted list of words in the dictionary that
+                  are slant rhymes of word but not perfect rhymes
+        """
+        near = self.rhymeKeys(word)[1]
+        rhymes = set(rhyme for key in near for rhyme in self.nearWords.get(key, ()))
+        return sorted(rhymes - set(self.perfectRhymes(word)) - set([word]))
+
+    def rhymes(self, word):
+        """
+        Requires: word is a lowercase string
+        Modifies: self, if the dictionary has not been loaded yet
+        Effects:  returns the perfect rhymes of word followed by its near
+                  rhymes, like rhymeApi.api but without the network
+        """
+        return self.perfectRhymes(word) + self.nearRhymes(word)
+
+    def rhymeLibrary(self, vocabulary):
+        """
+        Requires: vocabulary is a list of lowercase strings
+        Modifies: self, if the dictionary has not been loaded yet
+        Effects:  returns a {word: list of rhymes} dictionary for every
+                  word in vocabulary, in the format of rhymeLibrary.txt.
+                  only the words in vocabulary are listed as rhymes,
+                  since buildIndex leaves out every other word anyway,
+                  so the library is built from one pass over vocabulary.
+        """
+        pronunciations = dict((word, self.pronounce(word)) for word in vocabulary)
+        perfectWords, nearWords = indexRhymeKeys(vocabulary, pronunciations)
+
+        rhyme_dict = {}
+        for word in vocabulary:
+            perfect = set()
+            near = set()
+            for phones in pronunciations[word]:
+                perfect.update(perfectWords[perfectKey(phones)])
+                for key in nearKeys(phones):
+                    near.update(nearWords[key])
+            perfect.discard(word)
+            near.difference_update(perfect)
+            near.discard(word)
+            rhyme_dict[word] = sorted(perfect) + sorted(near)
+        return rhyme_dict
+
+    def rhymeBuckets(self, vocabulary):
+        """
+        Requires: vocabulary is a list of lowercase strings
+        Modifies: self, if the dictionary has not been loaded yet
+        Effects:  returns the words of vocabulary grouped by rhyme key,
+                  as a list of lists, one for every key more than one of
+                  them shares. two words are in a list together exactly
+                  when rhymeLibrary lists them as rhymes of each other,
+                  so the lists are the buckets of rhymeIndex's
+                  buildBucketIndex
+        """
+        pronunciations = dict((word, self.pronounce(word)) for word in vocabulary)
+        perfectWords, nearWords = indexRhymeKeys(vocabulary, pronunciations)
+        return [words for keys in [perfectWords, nearWords] for words in keys.values()
+                if len(set(words)) > 1]
+
+
+# -----------------------------------------------------------------------------
+# Helpers ---------------------------------------------------------------------
+
+def readPronunciations(fileName):
+    """
+    Requires: fileName is the path of a pronunciation dictionary
+    Modifies: nothing
+    Effects:  returns a {word: list of phone tuples} dictionary of every
+              pronunciation in fileName, with the words lowercased and
+              the numbers of alternate pronunciations like a(2) removed
+    """
+    pronunciations = {}
+    with open(fileName, encoding='latin-1') as dictionary:
+        for line in dictionary:
+            if line.startswith(';;;'):
+                continue
+            line = line.split('#', 1)[0].split()
+            if len(line) < 2:
+                continue
+            word = line[0].lower()
+            if word.endswith(')'):
+                word = word[:word.rfind('(')]
+            pronunciations.setdefault(word, []).append(tuple(line[1:]))
+    return pronunciations
+
+def indexRhymeKeys(words, pronunciations):
+    """
+    Requires: pronunciations has the list of phone tuples of every word
+              in words
+    Modifies: nothing
+    Effects:  returns (perfectWords, nearWords), which map every rhyme
+              key of a word in words to the list of those words
+    """
+    perfectWords = {}
+    nearWords = {}
+    for word in words:
+        for phones in pronunciations[word]:
+            perfectWords.setdefault(perfectKey(phones), []).append(word)
+            for key in nearKeys(phones):
+                nearWords.setdefault(key, []).append(word)
+    return perfectWords, nearWords
+
+def isVowel(phone):
+    return phone.rstrip('012') in VOWELS
+
+def rhymingPart(phones):
+    """
+    Requires: phones is a tuple of ARPAbet phones
+    Modifies: nothing
+    Effects:  returns the phones from the last vowel with primary stress
+              to the end of the word (or from the last stressed vowel, or
+              the last vowel, if there isn't one), without their stress
+    """
+    start = None
+    for stress in ['1', '2', '0']:
+        for i in range(len(phones) - 1, -1, -1):
+            if phones[i].endswith(stress) and isVowel(phones[i]):
+                start = i
+                break
+        if start is not None:
+            break
+    if start is None:
+        start = 0
+    return tuple(phone.rstrip('012') for phone in phones[start:])
+
+def perfectKey(phones):
+    """
+    Requires: phones is a tuple of ARPAbet phones
+    Modifies: nothing
+    Effects:  returns the key two pronunciations share if they are
+              perfect rhymes: everything from the last stressed vowel on
+    """
+    return rhymingPart(phones)
+
+def nearKeys(phones):
+    """
+    Requires: phones is a tuple of ARPAbet phones
+    Modifies: nothing
+    Effects:  returns the keys two pronunciations share if they are slant
+              rhymes: the rhyming part with every consonant replaced by
+              its kind, and the last syllable alone, so that yellow and
+              hello, whose stress falls differently, are near rhymes.
+              there is no last syllable key if its vowel is weak
+    """
+    part = rhymingPart(phones)
+    classes = ('near',) + tuple(CONSONANT_CLASSES.get(phone, phone) for phone in part)
+
+    last = len(phones)
+    for i in range(len(phones) - 1, -1, -1):
+        if isVowel(phones[i]):
+            last = i
+            break
+    if last == len(phones) or phones[last] in WEAK_VOWELS:
+        return [classes]
+    final = ('final',) + tuple(phone.rstrip('012') for phone in phones[last:])
+    return [classes, final]
+
+def spellingVariants(word):
+    """
+    Requires: word is a lowercase string
+    Modifies: nothing
+    Effects:  returns the other spellings word might be in the dictionary
+              under: with an apostrophe put back, as lyrics are cleaned of
+              them (dont, youre, theyll), and with runs of a letter and
+              repeated syllables cut down (oooon, lalala, ohohoh)
+    """
+    variants = []
+    for i in [1, 2]:
+        if len(word) > i:
+            variants.append(word[:-i] + "'" + word[-i:])
+
+    collapsed = re.sub(r'(.)\1+', r'\1', word)
+    repeated = re.sub(r'^(.{1,4}?)\1+', r'\1', collapsed)
+    for spelling in [collapsed, repeated, re.sub(r'^(.{1,4}?)\1+$', r'\1', collapsed)]:
+        if spelling != word and spelling not in variants:
+            variants.append(spelling)
+    return variants
+
+def graphemePhones(word):
+    """
+    Requires: word is a lowercase string
+    Modifies: nothing
+    Effects:  returns a guess at the phones of the last syllable of word
+              from its spelling, with the vowel stressed, or () if word
+              has no vowel. only the last syllable is guessed, since it
+              is all the rhyme keys need
+    """
+    word = re.sub(r'(.)\1+', r'\1', re.sub(r'[^a-z]', '', word))
+
+    # consonant and silent e, as in time
+    match = re.search(r'([aeiouy])([^aeiouy]{1,2})e$', word)
+    if match and len(word) > 3:
+        vowel = GRAPHEME_LONG_VOWELS[match.group(1)]
+        coda = match.group(2)
+    else:
+        match = re.search(r'([aeiou][aeiouwy]*|y)([^aeiouy]*)$', word)
+        if match is None:
+            return ()
+        letters, coda = match.group(1), match.group(2)
+        if coda in ['', 'h']:
+            coda = ''
+            vowel = GRAPHEME_VOWELS.get(letters[-2:]) if len(letters) > 1 else None
+            if vowel is None and re.match(r'[^aeiouy]+y$', word):
+                vowel = GRAPHEME_LONG_VOWELS['y']
+            elif vowel is None:
+                vowel = GRAPHEME_OPEN_VOWELS[letters[-1]]
+        else:
+            vowel = (GRAPHEME_VOWELS.get(letters[-2:]) or GRAPHEME_VOWELS[letters[-1]])
+
+    phones = [vowel + '1']
+    i = 0
+    while i < len(coda):
+        for size in [3, 2, 1]:
+            if coda[i:i + size] in GRAPHEME_CONSONANTS:
+                phones.extend(GRAPHEME_CONSONANTS[coda[i:i + size]])
+                i += size
+                break
+        else:
+            i += 1
+    return tuple(phones)
+
+
+# -----------------------------------------------------------------------------
+# Testing code ----------------------------------------------------------------
+
+if __name__ == '__main__':
+    rhymer = PhoneticRhymes(sys.argv[1] if len(sys.argv) > 1 else PRONUNCIATION_DICTIONARY)
+    for word in ['yellow', 'time', 'dont', 'oooon', 'lalalalalalalalaiy',
+                 'sky', 'fly', 'my', 'why', 'cry', 'happy', 'me']:
+        print(word, rhymer.pronounce(word), rhymer.rhymes(word)[:20])
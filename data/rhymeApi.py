@@ -8,25 +8,66 @@ from trigramModel import *
 from datamuse import datamuse
 import time
 
+# the Datamuse client shared by every call that isn't given one, so that
+# its pooled connections are reused from word to word
+_rhymer = None
 
-def api(word):
+
+def getRhymer():
+    """
+    Requires: nothing
+    Modifies: _rhymer
+    Effects:  returns the shared datamuse.Datamuse client, making it
+              the first time it is asked for
+    """
+    global _rhymer
+    if _rhymer is None:
+        _rhymer = datamuse.Datamuse()
+    return _rhymer
+
+def api(word, rhymer=None):
     """
-    Requires: word is a string
+    Requires: word is a string. rhymer is None or a datamuse.Datamuse,
+              e.g. one whose api_root points at a local stand-in server
     Modifies: nothing
     Effects:  uses datamuse api to return list
               of words that rhyme with word
     """
 
-    # makes rhymer an instance of Datamuse class
-    rhymer = datamuse.Datamuse()
+    # uses the shared Datamuse client unless given one
+    if rhymer is None:
+        rhymer = getRhymer()
 
     # makes rhymes_dict a list of dictionaries
     # that contain the rhyming words and some
     # extra info that we don't need
     perfect_rhymes = rhymer.words(rel_rhy=word)
     near_rhymes = rhymer.words(rel_nry=word)
-    rhymes_dict = perfect_rhymes
-    rhymes_dict += near_rhymes
+    return rhymeList(perfect_rhymes + near_rhymes)
+
+def apiBulk(words, rhymer=None, workers=None):
+    """
+    Requires: words is a list of strings. rhymer is the same as for api,
+              and workers is None or a positive int
+    Modifies: nothing
+    Effects:  returns a dictionary of the list of words that rhyme with
+              each word in words, the same lists api returns. the perfect
+              and near rhymes of every word are fetched up to workers at
+              a time (the rhymer's max_connections if None)
+    """
+    if rhymer is None:
+        rhymer = getRhymer()
+    responses = rhymer.bulk_words(words, ('rel_rhy', 'rel_nry'), workers)
+    return dict((word, rhymeList(response['rel_rhy'] + response['rel_nry']))
+                for word, response in responses.items())
+
+def rhymeList(rhymes_dict):
+    """
+    Requires: rhymes_dict is a list of dictionaries returned by the
+              datamuse api, each with a 'word'
+    Modifies: rhymes_dict
+    Effects:  returns the words in rhymes_dict as a list of UTF8 strings
+    """
 
     # removes unneeded key/value pairs from rhymes_dict
     exclude1 = 'score'
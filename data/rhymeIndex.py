@@ -0,0 +1,458 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import pickle
+from array import array
+from bisect import bisect_left
+
+# default location of the pickled rhyme dictionary written
+# by rhymeLibraryWriter.py. see README for more info
+RHYME_LIBRARY = 'rhymeLibrary.txt'
+
+# default location of the compact bucketed index of rhymeLibrary,
+# also written by rhymeLibraryWriter.py
+RHYME_LIBRARY_INDEX = 'rhymeLibraryIndex.txt'
+INDEX_VERSION = 2
+
+
+class RhymeIndex(object):
+
+    def __init__(self, fileName=RHYME_LIBRARY, indexFileName=RHYME_LIBRARY_INDEX):
+        """
+        Requires: fileName is the path of a txt file containing
+                  a pickle dictionary. see README for more info
+                  on rhymeLibrary. indexFileName is the path of
+                  the compact index of that library, which does
+                  not need to exist
+        Modifies: self (this instance of the RhymeIndex object)
+        Effects:  this is the RhymeIndex constructor. it does not
+                  open the library; the library is loaded the first
+                  time a rhyme is looked up, and only that once.
+
+                  once loaded, every word in the library has an
+                  integer id and self.words[id] is the word with that
+                  id. the rhymes are kept in buckets of words, each
+                  stored once however many words rhyme with them: the
+                  members of bucket b are self.bucketMembers[
+                  self.bucketOffsets[b]:self.bucketOffsets[b + 1]],
+                  the words that rhyme with word id are the members of
+                  its query buckets self.queryBuckets[
+                  self.queryOffsets[id]:self.queryOffsets[id + 1]], and
+                  the buckets word id is a member of are self.memberBuckets[
+                  self.memberOffsets[id]:self.memberOffsets[id + 1]].
+                  a word is never its own rhyme unless self.selfRhymes[id].
+                  every list of ids is in ascending order.
+        """
+        self.fileName = fileName
+        self.indexFileName = indexFileName
+        self.words = None
+        self.wordIds = {}
+        self.selfRhymes = array('b')
+        self.queryOffsets = array('i')
+        self.queryBuckets = array('i')
+        self.memberOffsets = array('i')
+        self.memberBuckets = array('i')
+        self.bucketOffsets = array('i')
+        self.bucketMembers = array('i')
+        self.rhymeSets = {}
+
+        # number of times the library has been read from disk,
+        # used by benchmark.py to check that it only happens once
+        self.loadCount = 0
+
+    def load(self):
+        """
+        Requires: nothing
+        Modifies: self
+        Effects:  reads the compact index if it exists and is at least
+                  as new as the library. otherwise unpickles the library
+                  and builds the index from it in memory.
+        """
+        if indexIsCurrent(self.fileName, self.indexFileName):
+            index = readIndex(self.indexFileName)
+        else:
+            index = buildIndex(readLibrary(self.fileName))
+
+        self.words = index['words']
+        self.wordIds = dict((word, i) for i, word in enumerate(self.words))
+        self.selfRhymes = index['selfRhymes']
+        self.queryOffsets = index['queryOffsets']
+        self.queryBuckets = index['queryBuckets']
+        self.bucketOffsets = index['bucketOffsets']
+        self.bucketMembers = index['bucketMembers']
+        self.memberOffsets, self.memberBuckets = invertBuckets(
+            len(self.words), self.bucketOffsets, self.bucketMembers)
+        self.rhymeSets = {}
+        self.loadCount += 1
+
+    def isLoaded(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns True if the library has already been loaded
+        """
+        return self.words is not None
+
+    def wordId(self, word):
+        """
+        Requires: word is a string
+        Modifies: self, if the library has not been loaded yet
+        Effects:  returns the integer id of word, or None if word
+                  is not in the library
+        """
+        if self.words is None:
+            self.load()
+        return self.wordIds.get(word)
+
+    def rhymingIds(self, i):
+        """
+        Requires: i is the id of a word in the library
+        Modifies: nothing
+        Effects:  returns the ids of the words that rhyme with word i, in
+                  ascending order. a word with one query bucket, the
+                  usual case, gets a slice of that bucket
+        """
+        start, end = self.queryOffsets[i], self.queryOffsets[i + 1]
+        bucketOffsets = self.bucketOffsets
+        bucketMembers = self.bucketMembers
+        if end - start == 1:
+            b = self.queryBuckets[start]
+            ids = bucketMembers[bucketOffsets[b]:bucketOffsets[b + 1]]
+        else:
+            merged = set()
+            for b in self.queryBuckets[start:end]:
+                merged.update(bucketMembers[bucketOffsets[b]:bucketOffsets[b + 1]])
+            ids = sorted(merged)
+        if self.selfRhymes[i]:
+            return ids
+        return [j for j in ids if j != i]
+
+    def rhymingList(self, word):
+        """
+        Requires: word is a string
+        Modifies: self, if the library has not been loaded yet
+        Effects:  returns the words that rhyme with word, in id order.
+                  use this instead of rhymesOf when iterating, so that
+                  candidate dictionaries are built in the same order
+                  every run
+        """
+        i = self.wordId(word)
+        if i is None:
+            return ()
+        words = self.words
+        return tuple(words[j] for j in self.rhymingIds(i))
+
+    def rhymesOf(self, word):
+        """
+        Requires: word is a string
+        Modifies: self.rhymeSets
+        Effects:  returns a frozenset of the words that rhyme with word,
+                  including slant rhymes. words that are not in the
+                  library have no rhymes. the set is built once per
+                  word and reused after that.
+        """
+        rhymes = self.rhymeSets.get(word)
+        if rhymes is None:
+            rhymes = frozenset(self.rhymingList(word))
+            self.rhymeSets[word] = rhymes
+        return rhymes
+
+    def rhymes(self, word1, word2):
+        """
+        Requires: word1 and word2 are strings
+        Modifies: self, if the library has not been loaded yet
+        Effects:  returns True if word2 is one of word1's rhymes, which
+                  is when one of word1's query buckets is one of the
+                  buckets word2 is a member of. each query bucket is
+                  binary searched for among word2's sorted member
+                  buckets, so nothing is allocated and the cost doesn't
+                  depend on how many words rhyme with word1
+        """
+        i = self.wordId(word1)
+        j = self.wordIds.get(word2)
+        if i is None or j is None:
+            return False
+        if i == j:
+            return bool(self.selfRhymes[i])
+
+        memberBuckets = self.memberBuckets
+        lo = self.memberOffsets[j]
+        hi = self.memberOffsets[j + 1]
+        queryBuckets = self.queryBuckets
+        for k in range(self.queryOffsets[i], self.queryOffsets[i + 1]):
+            b = queryBuckets[k]
+            lo = bisect_left(memberBuckets, b, lo, hi)
+            if lo == hi:
+                return False
+            if memberBuckets[lo] == b:
+                return True
+        return False
+
+
+def decodeWord(word):
+    """
+    Requires: word is a string or bytes
+    Modifies: nothing
+    Effects:  returns word as a string
+    """
+    if isinstance(word, bytes):
+        return word.decode('utf-8')
+    return word
+
+def readLibrary(fileName):
+    """
+    Requires: fileName is the path of a rhymeLibrary pickle
+    Modifies: nothing
+    Effects:  returns the {word: list of rhymes} dictionary stored in
+              fileName. rhymeLibrary was written with Python 2, so the
+              rhyming words may come back as bytes; they are decoded to
+              strings so that they compare equal to the words in the
+              nGramModels.
+    """
+    rhyme_library = open(fileName, 'rb')
+    rhyme_dict = pickle.load(rhyme_library, encoding='utf-8')
+    rhyme_library.close()
+
+    decoded = {}
+    for word, rhyming_list in rhyme_dict.items():
+        decoded[decodeWord(word)] = [decodeWord(rhyme) for rhyme in rhyming_list]
+
+    return decoded
+
+def buildIndex(rhymeDict):
+    """
+    Requires: rhymeDict is a {word: list of rhymes} dictionary
+    Modifies: nothing
+    Effects:  returns the index described in the RhymeIndex constructor,
+              as a dictionary of its arrays. only the keys of rhymeDict,
+              i.e. the vocabulary the library was written for, get ids,
+              so rhymes that never occur in the lyrics are left out.
+
+              the words are split into groups that all rhyme with each
+              other both ways (see rhymeGroups), and each group is one
+              bucket that is the first query bucket of all its words. so
+              a group of n words is stored once, in n ids, instead of n
+              times, in n * (n - 1) ids. the rhymes of a word that aren't
+              in its group, e.g. near rhymes that don't rhyme back, make
+              up a second query bucket, which is shared too if another
+              word has the same ones. a word in no group has one bucket
+              of itself and its rhymes.
+    """
+    decoded = dict((decodeWord(word), rhymes) for word, rhymes in rhymeDict.items())
+    words = sorted(decoded)
+    wordIds = dict((word, i) for i, word in enumerate(words))
+
+    selfRhymes = array('b')
+    rhymeIds = []
+    for i, word in enumerate(words):
+        ids = set()
+        for rhyme in decoded[word]:
+            j = wordIds.get(decodeWord(rhyme))
+            if j is not None:
+                ids.add(j)
+        selfRhymes.append(i in ids)
+        ids.discard(i)
+        rhymeIds.append(ids)
+
+    groups = []
+    for i, group in enumerate(rhymeGroups(rhymeIds)):
+        extra = rhymeIds[i].difference(group)
+        if len(group) > 1:
+            word_groups = [group] + ([tuple(sorted(extra))] if extra else [])
+        elif extra or selfRhymes[i]:
+            word_groups = [tuple(sorted(extra | {i}))]   # its own bucket, as it rhymes with no group
+        else:
+            word_groups = []
+        groups.append(word_groups)
+
+    return packIndex(words, selfRhymes, groups)
+
+def rhymeGroups(rhymeIds):
+    """
+    Requires: rhymeIds[i] is the set of ids of the words that word i
+              rhymes with, not including i
+    Modifies: nothing
+    Effects:  returns a list of the sorted tuple of ids of the group of
+              each word, where every word in a group rhymes with every
+              other one both ways. the groups are built greedily, in id
+              order: a word starts a group if it isn't in one yet, and
+              each of its rhymes that isn't either joins it if it rhymes
+              both ways with every word already in it. words whose rhymes
+              are all the same, as with exact rhymes, end up in one group.
+    """
+    groupOf = [None] * len(rhymeIds)
+    for i, rhymes in enumerate(rhymeIds):
+        if groupOf[i] is not None:
+            continue
+        members = [i]
+        for j in sorted(rhymes):
+            if groupOf[j] is None and all(j in rhymeIds[k] and k in rhymeIds[j] for k in members):
+                members.append(j)
+        group = tuple(sorted(members))
+        for j in members:
+            groupOf[j] = group
+
+    return groupOf
+
+def buildBucketIndex(buckets, vocabulary):
+    """
+    Requires: buckets is a list of lists of words that all rhyme with
+              each other, e.g. the words sharing a rhyme key, and
+              vocabulary is a list of words
+    Modifies: nothing
+    Effects:  returns the index of the rhymes in buckets, as buildIndex
+              does, where two different words rhyme if they share a
+              bucket. every word in vocabulary gets an id, and each
+              bucket is stored once
+    """
+    words = sorted(set(vocabulary))
+    wordIds = dict((word, i) for i, word in enumerate(words))
+
+    groups = [[] for word in words]
+    for bucket in buckets:
+        ids = tuple(sorted(set(wordIds[word] for word in bucket if word in wordIds)))
+        if len(ids) > 1:
+            for i in ids:
+                groups[i].append(ids)
+
+    return packIndex(words, array('b', [0]) * len(words), groups)
+
+def packIndex(words, selfRhymes, groups):
+    """
+    Requires: groups[i] is the list of query buckets of word i, each a
+              sorted tuple of word ids
+    Modifies: nothing
+    Effects:  numbers the distinct buckets in groups and returns the
+              index dictionary of buildIndex, with every bucket stored
+              once in bucketMembers
+    """
+    bucketIds = {}
+    bucketOffsets = array('i', [0])
+    bucketMembers = array('i')
+    queryOffsets = array('i', [0])
+    queryBuckets = array('i')
+    for word_groups in groups:
+        ids = set()
+        for members in word_groups:
+            b = bucketIds.get(members)
+            if b is None:
+                b = bucketIds[members] = len(bucketIds)
+                bucketMembers.extend(members)
+                bucketOffsets.append(len(bucketMembers))
+            ids.add(b)
+        queryBuckets.extend(sorted(ids))
+        queryOffsets.append(len(queryBuckets))
+
+    return {'words': words, 'selfRhymes': selfRhymes,
+            'queryOffsets': queryOffsets, 'queryBuckets': queryBuckets,
+            'bucketOffsets': bucketOffsets, 'bucketMembers': bucketMembers}
+
+def invertBuckets(numWords, bucketOffsets, bucketMembers):
+    """
+    Requires: bucketOffsets and bucketMembers are as in the RhymeIndex
+              constructor, for numWords words
+    Modifies: nothing
+    Effects:  returns (memberOffsets, memberBuckets), where the buckets
+              word id is a member of are memberBuckets[
+              memberOffsets[id]:memberOffsets[id + 1]] in ascending order.
+              they are worked out when the index is loaded rather than
+              stored in it
+    """
+    counts = [0] * (numWords + 1)
+    for j in bucketMembers:
+        counts[j + 1] += 1
+    for i in range(numWords):
+        counts[i + 1] += counts[i]
+    memberOffsets = array('i', counts)
+
+    memberBuckets = array('i', [0]) * len(bucketMembers)
+    position = counts[:-1]
+    for b in range(len(bucketOffsets) - 1):
+        for k in range(bucketOffsets[b], bucketOffsets[b + 1]):
+            j = bucketMembers[k]
+            memberBuckets[position[j]] = b
+            position[j] += 1
+
+    return memberOffsets, memberBuckets
+
+def writeIndex(fileName, index):
+    """
+    Requires: index was returned by buildIndex or buildBucketIndex
+    Modifies: the file fileName
+    Effects:  pickles the index to fileName. its arrays are pickled as
+              raw machine integers, so loading it is a few large reads
+    """
+    index_file = open(fileName, 'wb')
+    index = dict(index)
+    index['version'] = INDEX_VERSION
+    pickle.dump(index, index_file, pickle.HIGHEST_PROTOCOL)
+    index_file.close()
+
+def readIndex(fileName):
+    """
+    Requires: fileName was written by writeIndex
+    Modifies: nothing
+    Effects:  returns the index dictionary read from fileName. an index
+              written before rhymes were bucketed is converted
+    """
+    index_file = open(fileName, 'rb')
+    index = pickle.load(index_file)
+    index_file.close()
+
+    if index.get('version') == 1:
+        words, offsets, rhymeIds = index['words'], index['offsets'], index['rhymeIds']
+        return buildIndex(dict((word, [words[j] for j in rhymeIds[offsets[i]:offsets[i + 1]]])
+                               for i, word in enumerate(words)))
+    if index.get('version') != INDEX_VERSION:
+        raise ValueError('{0} has an unsupported index version.'.format(fileName))
+
+    del index['version']
+    return index
+
+def indexIsCurrent(fileName, indexFileName):
+    """
+    Requires: nothing
+    Modifies: nothing
+    Effects:  returns True if indexFileName exists and the library at
+              fileName either doesn't exist or isn't newer than it
+    """
+    if not os.path.exists(indexFileName):
+        return False
+    if not os.path.exists(fileName):
+        return True
+    return os.path.getmtime(indexFileName) >= os.path.getmtime(fileName)
+
+
+# the RhymeIndex shared by every model and every function in generate.py
+_rhymeIndex = None
+
+def getRhymeIndex():
+    """
+    Requires: nothing
+    Modifies: _rhymeIndex
+    Effects:  returns the process-wide RhymeIndex, creating it on the
+              first call. the library itself is still only read the
+              first time a rhyme is looked up.
+    """
+    global _rhymeIndex
+    if _rhymeIndex is None:
+        _rhymeIndex = RhymeIndex()
+    return _rhymeIndex
+
+def setRhymeIndex(rhymeIndex):
+    """
+    Requires: rhymeIndex is a RhymeIndex
+    Modifies: _rhymeIndex
+    Effects:  replaces the process-wide RhymeIndex, e.g. to read
+              a library from somewhere other than the working directory
+    """
+    global _rhymeIndex
+    _rhymeIndex = rhymeIndex
+
+
+if __name__ == '__main__':
+    # writes the compact index for an existing rhymeLibrary.txt
+    writeIndex(RHYME_LIBRARY_INDEX, buildIndex(readLibrary(RHYME_LIBRARY)))
+    rhymeIndex = getRhymeIndex()
+    print(rhymeIndex.rhymesOf('yellow'))
+    print(rhymeIndex.rhymes('yellow', 'hello'))
@@ -1,10 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import os
+import sys
 import pickle
 from dataLoader import *
 import rhymeApi
-from requests.exceptions import ConnectionError
-import copy
+from datamuse import datamuse
+from rhymeIndex import *
+from phoneticRhymes import *
+from requests.exceptions import RequestException
 
 # both lists will not return any rhymes. dealt with in fixIt(word)
 contractions = ['wont', 'dont', 'cant', 'wouldnt', 'shouldnt',
@@ -12,61 +16,173 @@ contractions = ['wont', 'dont', 'cant', 'wouldnt', 'shouldnt',
 exceptions = ['oooon', 'oooo', 'oooooo', 'oh', 'ohoh', 'ooooooooh', 'oooohooohoooohoh',
               'youooooooooooh', 'lalalalalalalalaiy', 'ahahahahahahahah']
 
-def libraryWriter(LyricsDirectory):
-    """
-    What it does: loops through ever word in the Coldplay
-                  lyrics directory, creates a rhyme list,
-                  then writes that rhyme list and corresponding
-                  word to rhymeLibrary.txt
-    """
-
-    dataLoader = DataLoader() # makes dataLoader an instance of the DataLoader class
-    dataLoader.loadLyrics(LyricsDirectory)  # lyrics stored in dataLoader.
-
-    # makes text_copy a copy of list text
-    text_copy = copy.deepcopy(dataLoader.lyrics)
-
-    # makes rhyme_dict an empty dictionary
-    rhyme_dict = {}
-
-    # assigns update function to update to avoid calling
-    # dot operator in every loop, which enhances efficiency
-    update = rhyme_dict.update
-
-    # opens rhymeLibrary.txt to be written
-    file_name = open('rhymeLibrary.txt', 'wb')
-
-    # loops through text_copy. every word in text_copy
-    # is created as a key in rhyme_dict. each keys' value
-    # is a list of words that rhyme with that key
-    for i in range(len(text_copy)):
-        print(i)
-        for j in range(len(text_copy[i])):
-            word = text_copy[i][j]
-            if word in rhyme_dict:
-                continue
-            elif checkWordNeedsFixing(word):
-                try:
-                    rhyme_list = rhymeApi.api(fixIt(word))
-                    update({word: rhyme_list})
-                except ConnectionError:
-                    pickle.dump(rhyme_dict, file_name)
-                    file_name.close()
-                    print(i)
-                    exit(1)
-            else:
-                try:
-                    rhyme_list = rhymeApi.api(word)
-                    update({word: rhyme_list})
-                except ConnectionError:
-                    pickle.dump(rhyme_dict, file_name)
-                    file_name.close()
-                    print(i)
-                    exit(1)
-
-    # writes rhyme_dict to rhymeLibrary.txt then closes the file
-    pickle.dump(rhyme_dict, file_name)
-    file_name.close()
+# how many requests are sent to the Datamuse API at once, which is also
+# the most connections open to it at once
+DEFAULT_WORKERS = 8
+
+# the most requests per second sent to the Datamuse API by all workers
+# together. every word takes two requests
+DEFAULT_RATE = 10.0
+
+# the rhymes are fetched CHECKPOINT_EVERY words at a time, and the rhymes
+# fetched so far are saved to CHECKPOINT_FILE after every batch, so that
+# libraryWriter can pick up from there
+CHECKPOINT_FILE = 'rhymeLibrary.checkpoint'
+CHECKPOINT_EVERY = 100
+
+# every Datamuse response is kept in RESPONSE_CACHE, which every artist's
+# rebuild shares, so only words no earlier rebuild looked up are fetched
+RESPONSE_CACHE = 'datamuse.cache'
+
+
+def libraryWriter(LyricsDirectory, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, apiRoot=None,
+                  checkpointFile=CHECKPOINT_FILE, libraryFile=RHYME_LIBRARY,
+                  indexFile=RHYME_LIBRARY_INDEX, cacheFile=RESPONSE_CACHE):
+    """
+    What it does: collects every distinct word in the lyrics directory,
+                  fetches the rhyme list of each one from the Datamuse
+                  API, then writes every word and its rhyme list to
+                  libraryFile (rhymeLibrary.txt), and the compact index
+                  of the whole library to indexFile (rhymeLibraryIndex.txt)
+
+                  the rhymes are fetched with rhymeApi.apiBulk, in
+                  batches of CHECKPOINT_EVERY words, up to workers
+                  requests at a time and at most rate requests per second
+                  in all. apiRoot replaces
+                  the address of the API, e.g. with a local stand-in
+                  server for testing.
+
+                  progress is saved to checkpointFile after every batch.
+                  if a request fails for good (a connection error, a
+                  timeout or an error status, once the client's retries
+                  run out), the requests' RequestException is raised, and
+                  calling libraryWriter again only fetches the words that
+                  are still missing: those of the batch that failed and
+                  the ones after it. the checkpoint is deleted once the
+                  library is written.
+
+                  the responses of the API are cached in cacheFile,
+                  unless it is None, and the rate limit only applies to
+                  the requests that aren't in it.
+    """
+
+    # every word once, in the order the lyrics first use it
+    vocabulary = collectVocabulary(LyricsDirectory)
+
+    # starts from the words fetched by the last run, if it didn't finish
+    rhyme_dict = loadCheckpoint(checkpointFile)
+    remaining = [word for word in vocabulary if word not in rhyme_dict]
+    print('%d words, %d left to fetch' % (len(vocabulary), len(remaining)))
+
+    rhymer = datamuse.Datamuse(max_connections=workers, cache=cacheFile, rate=rate)
+    if apiRoot is not None:
+        rhymer.api_root = apiRoot
+
+    try:
+        for start in range(0, len(remaining), CHECKPOINT_EVERY):
+            batch = remaining[start:start + CHECKPOINT_EVERY]
+
+            # asks for the rhymes of the substitutes of the words
+            # the API has none for
+            queries = dict((word, fixIt(word) if checkWordNeedsFixing(word) else word)
+                           for word in batch)
+            rhymes = rhymeApi.apiBulk(list(queries.values()), rhymer, workers)
+            for word in batch:
+                rhyme_dict[word] = rhymes[queries[word]]
+
+            saveCheckpoint(checkpointFile, rhyme_dict)
+            print(start + len(batch))
+    finally:
+        rhymer.close()
+
+    rhyme_dict = writeLibrary(vocabulary, rhyme_dict, libraryFile, indexFile)
+
+    if os.path.exists(checkpointFile):
+        os.remove(checkpointFile)
+
+    return rhyme_dict
+
+def phoneticLibraryWriter(LyricsDirectory, dictionaryFile=PRONUNCIATION_DICTIONARY,
+                          libraryFile=RHYME_LIBRARY, indexFile=RHYME_LIBRARY_INDEX):
+    """
+    What it does: writes the same files as libraryWriter without the
+                  network, from the rhymes PhoneticRhymes finds with the
+                  pronunciation dictionary dictionaryFile. words it
+                  doesn't know, like the ones in contractions and
+                  exceptions, are pronounced from their spelling, so
+                  nothing has to be fixed by hand
+    """
+    vocabulary = collectVocabulary(LyricsDirectory)
+    rhymer = PhoneticRhymes(dictionaryFile)
+    rhyme_dict = rhymer.rhymeLibrary(vocabulary)
+
+    # the index is built straight from the rhyme keys the words share,
+    # so each group of rhyming words is one bucket
+    index = buildBucketIndex(rhymer.rhymeBuckets(vocabulary), vocabulary)
+    return writeLibrary(vocabulary, rhyme_dict, libraryFile, indexFile, index)
+
+def writeLibrary(vocabulary, rhyme_dict, libraryFile, indexFile, index=None):
+    """
+    Requires: rhyme_dict has the rhyme list of every word in vocabulary,
+              and index is None or the index of rhyme_dict
+    Modifies: the files libraryFile and indexFile
+    Effects:  writes rhyme_dict to libraryFile and its compact index to
+              indexFile, building the index from rhyme_dict if it isn't
+              given, and returns rhyme_dict in the order of vocabulary
+    """
+
+    # writes rhyme_dict to rhymeLibrary.txt in the order of
+    # the vocabulary, however the rhymes came back
+    rhyme_dict = dict((word, rhyme_dict[word]) for word in vocabulary)
+    with open(libraryFile, 'wb') as file_name:
+        pickle.dump(rhyme_dict, file_name)
+
+    # writes the compact bucketed index of rhyme_dict to
+    # rhymeLibraryIndex.txt so that RhymeIndex can check
+    # rhymes without scanning lists
+    if index is None:
+        index = buildIndex(rhyme_dict)
+    writeIndex(indexFile, index)
+
+    return rhyme_dict
+
+def collectVocabulary(LyricsDirectory):
+    """
+    Requires: LyricsDirectory is a directory in data/lyrics
+    Modifies: nothing
+    Effects:  returns a list of every distinct word in the lyrics, in the
+              order they first appear, so each one is only fetched once
+    """
+    vocabulary = {}
+    for line in DataLoader().iterLines(LyricsDirectory):
+        for word in line:
+            vocabulary[word] = None
+    return list(vocabulary)
+
+def loadCheckpoint(checkpointFile):
+    """
+    Requires: nothing
+    Modifies: nothing
+    Effects:  returns the {word: rhyme list} dictionary saved to
+              checkpointFile, or an empty dictionary if there is none
+    """
+    if not os.path.exists(checkpointFile):
+        return {}
+    with open(checkpointFile, 'rb') as checkpoint:
+        return pickle.load(checkpoint)
+
+def saveCheckpoint(checkpointFile, rhyme_dict):
+    """
+    Requires: rhyme_dict is a {word: rhyme list} dictionary
+    Modifies: the file checkpointFile
+    Effects:  saves rhyme_dict to checkpointFile. it is written to a
+              temporary file first, so a checkpoint is never left half
+              written
+    """
+    temporary = checkpointFile + '.tmp'
+    with open(temporary, 'wb') as checkpoint:
+        pickle.dump(rhyme_dict, checkpoint)
+    os.replace(temporary, checkpointFile)
 
 def fixIt(word):
     """
@@ -128,5 +244,23 @@ def checkWordNeedsFixing(word):
         return True
     return False
 
-if __name__ == '__main__':
-    libraryWriter('Coldplay')
+
+# -----------------------------------------------------------------------------
+# Main ------------------------------------------------------------------------
+# Usage: python rhymeLibraryWriter.py [artist] [workers] [requests per second]
+#        python rhymeLibraryWriter.py --offline [artist] [pronunciation dictionary]
+
+if __name__ == '__main__' and sys.argv[1:2] == ['--offline']:
+    lyricsDirectory = sys.argv[2] if len(sys.argv) > 2 else 'Coldplay'
+    dictionaryFile = sys.argv[3] if len(sys.argv) > 3 else PRONUNCIATION_DICTIONARY
+    phoneticLibraryWriter(lyricsDirectory, dictionaryFile)
+
+elif __name__ == '__main__':
+    lyricsDirectory = sys.argv[1] if len(sys.argv) > 1 else 'Coldplay'
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_WORKERS
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_RATE
+    try:
+        libraryWriter(lyricsDirectory, workers, rate)
+    except RequestException as error:
+        print('request failed ({0}), run again to resume from'.format(error), CHECKPOINT_FILE)
+        exit(1)
@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import pickle
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [here, os.path.join(here, '..', 'language-models'),
+                os.path.join(here, '..', 'python-datamuse-master')]
+
+import rhymeLibraryWriter
+from rhymeLibraryWriter import libraryWriter, collectVocabulary, loadCheckpoint
+from requests.exceptions import ConnectionError
+
+LYRICS = """Look at the stars
+Look how they shine for you
+[Chorus]
+And everything you do
+Yeah they were all yellow
+"""
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers /words like the API, with one made up word per query.
+    Once the server is down, connections are closed without an answer.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            if server.down:
+                self.close_connection = True
+                return
+            server.requests += 1
+            if server.requests == server.fail_after:
+                server.down = True
+        query = parse_qs(urlparse(self.path).query)
+        relation = 'rel_rhy' if 'rel_rhy' in query else 'rel_nry'
+        word = query[relation][0]
+        body = json.dumps([{'word': word + '-' + relation, 'score': 100}]).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # the client hangs up on the connections closed while down
+        pass
+
+
+class LibraryWriterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer(('127.0.0.1', 0), StandInHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.fail_after = None
+        self.server.down = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api_root = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+
+        # DataLoader only reads artists from data/lyrics
+        self.artist_dir = tempfile.mkdtemp(prefix='test', dir=os.path.join(here, 'lyrics'))
+        self.artist = os.path.basename(self.artist_dir)
+        with open(os.path.join(self.artist_dir, 'yellow.txt'), 'w') as song:
+            song.write(LYRICS)
+        self.vocabulary = collectVocabulary(self.artist)
+
+        self.directory = tempfile.mkdtemp()
+        self.files = dict((name, os.path.join(self.directory, name))
+                          for name in ('checkpointFile', 'libraryFile', 'indexFile'))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.artist_dir)
+        shutil.rmtree(self.directory)
+
+    def write(self, cacheFile=None, workers=4):
+        return libraryWriter(self.artist, workers, None, self.api_root,
+                             cacheFile=cacheFile, **self.files)
+
+    def assertLibraryComplete(self):
+        with open(self.files['libraryFile'], 'rb') as library:
+            rhyme_dict = pickle.load(library)
+        self.assertEqual(list(rhyme_dict), self.vocabulary)
+        for word, rhymes in rhyme_dict.items():
+            self.assertEqual(rhymes, [(word + '-rel_rhy').encode('utf-8'),
+                                      (word + '-rel_nry').encode('utf-8')])
+        self.assertTrue(os.path.exists(self.files['indexFile']))
+        self.assertFalse(os.path.exists(self.files['checkpointFile']))
+
+    def test_full_rebuild(self):
+        self.write()
+        self.assertEqual(self.server.requests, 2 * len(self.vocabulary))
+        self.assertLibraryComplete()
+
+    def test_resume(self):
+        # two requests a word, so the server goes down in the second batch
+        checkpoint_every = rhymeLibraryWriter.CHECKPOINT_EVERY
+        rhymeLibraryWriter.CHECKPOINT_EVERY = 4
+        self.addCleanup(setattr, rhymeLibraryWriter, 'CHECKPOINT_EVERY', checkpoint_every)
+        self.server.fail_after = 10
+        with self.assertRaises(ConnectionError):
+            self.write(workers=1)
+        done = loadCheckpoint(self.files['checkpointFile'])
+        self.assertEqual(list(done), self.vocabulary[:4])
+
+        self.server.fail_after = None
+        self.server.down = False
+        self.server.requests = 0
+        self.write()
+        self.assertEqual(self.server.requests, 2 * (len(self.vocabulary) - len(done)))
+        self.assertLibraryComplete()
+
+    def test_cached_rebuild(self):
+        cache = os.path.join(self.directory, 'datamuse.cache')
+        self.write(cache)
+        self.assertEqual(self.server.requests, 2 * len(self.vocabulary))
+
+        os.remove(self.files['libraryFile'])
+        self.server.requests = 0
+        self.write(cache)
+        self.assertEqual(self.server.requests, 0)
+        self.assertLibraryComplete()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,37 +3,126 @@
 import sys
 sys.path.append('./language-models')
 sys.path.append('./data')
+import time
 import random
+import hashlib
+import multiprocessing
 from dataLoader import *
 
 from unigramModel import *
 from bigramModel import *
 from trigramModel import *
+from modelSnapshot import *
+from reachability import *
+from modelChain import *
 
 from rhymeData import *
-
-import pickle
+from rhymeIndex import *
+from song import *
+from generationStats import *
 
 # -----------------------------------------------------------------------------
 # Core ------------------------------------------------------------------------
 # Functions to implement: trainLyricsModels, selectNGramModel,
 # generateSentence, and runLyricsGenerator
 
-def trainLyricsModels(lyricsDirectory):
+# the most words generateSentence draws for a
+# single line before giving up on it. a line almost always takes under 20,
+# but a few models and seeds would otherwise keep rejecting words forever
+MAX_LINE_ATTEMPTS = 200
+
+# the fewest words in a rhyming line
+MIN_RHYMING_LENGTH = 2
+
+# how many words generateSong aims for in every line
+SONG_LINE_LENGTH = 6
+
+def trainLyricsModels(lyricsDirectory, compact=False, snapshotFile=None, manifest=None,
+                      processes=1):
     """
-    Requires: nothing
-    Modifies: nothing
-    Effects:  loads lyrics data from the data/lyrics/<lyricsDirectory> folder
-              using the pre-written DataLoader class, then creates an
+    Requires: manifest is None or an empty dictionary
+    Modifies: the file snapshotFile, if it is given and out of date,
+              and manifest
+    Effects:  streams lyrics data from the data/lyrics/<lyricsDirectory>
+              folder using the pre-written DataLoader class, and creates an
               instance of each of the NGramModel child classes and trains
-              them using the text loaded from the data loader. The list
+              them on the lines as the data loader yields them. The list
               should be in tri-, then bi-, then unigramModel order.
 
+              If compact is True, the trained models' counts are packed
+              into integer arrays over one shared Vocabulary (see
+              NGramModel.compact), which takes far less memory on
+              large corpora.
+
+              If snapshotFile is given and was saved with the same rhyme
+              library, the models are loaded from it instead (see
+              modelSnapshot.py), and only the songs that were added,
+              changed or removed since then are trained in or out with
+              updateLyricsModels. Otherwise the models are trained as
+              usual. Either way, if anything changed the models are saved
+              back to snapshotFile with their rhyme tables filled in.
+
+              If manifest is given, it is filled in with the DataLoader
+              manifest of the songs the models were trained on, which
+              updateLyricsModels needs later. The manifest holds every
+              line, so without one (and without snapshotFile) only a
+              single song is ever held in memory while training.
+
+              If processes is more than 1, the songs are counted in that
+              many worker processes (see trainLyricsParallel).
+
               Returns the list of trained models.
     """
 
     dataLoader = DataLoader() # makes dataLoader an instance of the DataLoader class
-    dataLoader.loadLyrics(lyricsDirectory)  # lyrics stored in dataLoader.lyrics
+    if manifest is None and snapshotFile is not None:
+        manifest = {}   # the snapshot needs one even if the caller doesn't
+
+    # starts from the snapshot and only retrains
+    # the songs that changed since it was saved
+    if snapshotFile is not None:
+        key = snapshotKey()
+        snapshot = loadSnapshot(snapshotFile, key)
+        if snapshot is not None:
+            models, saved_manifest = snapshot
+            manifest.update(saved_manifest)
+            changed = dataLoader.changedSongs(lyricsDirectory, manifest)
+            if changed:
+                updateLyricsModels(models, manifest, lyricsDirectory, changed)
+            compactLyricsModels(models, compact)
+            if changed:
+                saveLyricsSnapshot(snapshotFile, models, manifest, key)
+            return models
+
+    # counts the lyrics in this process, or in
+    # shards across a pool of worker processes
+    if processes > 1:
+        models = trainLyricsParallel(lyricsDirectory, processes, manifest)
+    else:
+        models = trainLyricsShard(lyricsDirectory, None, manifest)
+
+    compactLyricsModels(models, compact)
+
+    if snapshotFile is not None:
+        saveLyricsSnapshot(snapshotFile, models, manifest, key)
+
+    return models
+
+def trainLyricsShard(lyricsDirectory, songs=None, manifest=None):
+    """
+    Requires: songs is None or a list of file names in
+              data/lyrics/<lyricsDirectory>
+    Modifies: manifest
+    Effects:  trains a fresh set of lyrics models on songs, or on every
+              song in the directory if songs is None, and returns them in
+              the same lists as trainLyricsModels. if manifest is given,
+              each song's hash and lines are recorded in it.
+    """
+
+    # streams the lyrics one song at a time rather than loading them
+    # all into dataLoader.lyrics. a song's lines are only kept after it
+    # has been counted if they are needed for the manifest
+    lyrics = DataLoader().iterLines(lyricsDirectory, manifest, songs)
 
     # creates both regular and rhyming instances of each nGramModel
     # except for unigramModel, it only requires one instance because
@@ -44,18 +133,152 @@ def trainLyricsModels(lyricsDirectory):
     trigramModel = TrigramModel()
     rhyming_trigramModel = TrigramModel()
 
-    # populates each nGramModel's dictionary
-    unigramModel.trainModel(dataLoader.lyrics)
-    bigramModel.trainModel(dataLoader.lyrics)
-    rhyming_bigramModel.trainRhymingModel(dataLoader.lyrics)
-    trigramModel.trainModel(dataLoader.lyrics)
-    rhyming_trigramModel.trainRhymingModel(dataLoader.lyrics)
+    # populates each nGramModel's dictionary in a single pass over
+    # the lyrics, the same as calling trainModel on each forward model
+    # and trainRhymingModel on each rhyming model
+    trainModels(lyrics, [unigramModel, bigramModel, trigramModel],
+                [rhyming_bigramModel, rhyming_trigramModel])
+
+    # creates two lists containing each model in priority order, as
+    # ModelChains so that choosing the model for each word is one lookup
+    models = [ModelChain([trigramModel, bigramModel, unigramModel]),
+              ModelChain([rhyming_trigramModel, rhyming_bigramModel, unigramModel])]
+
+    return models
+
+def countLyricsShard(lyricsDirectory, songs, keepManifest):
+    """
+    Requires: same as trainLyricsShard
+    Modifies: nothing
+    Effects:  the work done by each worker process of trainLyricsParallel.
+              returns (models, manifest), where models were trained by
+              trainLyricsShard on songs and manifest is their manifest,
+              or None if keepManifest is False
+    """
+    manifest = {} if keepManifest else None
+    return trainLyricsShard(lyricsDirectory, songs, manifest), manifest
 
-    # creates two lists containing each model in priority order
-    models = [[trigramModel, bigramModel, unigramModel], [rhyming_trigramModel, rhyming_bigramModel, unigramModel]]
+def trainLyricsParallel(lyricsDirectory, processes, manifest=None):
+    """
+    Requires: processes is a positive int
+    Modifies: manifest
+    Effects:  trains the lyrics models just like trainLyricsShard does
+              with songs=None, but splits the songs into shards that a
+              pool of processes counts at the same time. each worker
+              cleans, tokenizes and counts its shard into models of its
+              own, and the partial counts are then merged here, shard by
+              shard with NGramModel.mergeCounts.
+
+              the shards are consecutive runs of songs and are merged in
+              order, so every word is first seen in the same order as in
+              a single process, and the merged models are identical to
+              the ones trainLyricsShard would have trained.
+    """
+    songs = DataLoader().listSongs(lyricsDirectory)
+    if processes <= 1 or len(songs) < 2:
+        return trainLyricsShard(lyricsDirectory, songs, manifest)
+
+    # a few shards per process so that a process that finishes
+    # early can pick up more work
+    shard_size = max(1, -(-len(songs) // (processes * 4)))
+    shards = [songs[i:i + shard_size] for i in range(0, len(songs), shard_size)]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.starmap(countLyricsShard, [(lyricsDirectory, shard, manifest is not None)
+                                                  for shard in shards])
+    finally:
+        pool.close()
+        pool.join()
+
+    models = None
+    for shard_models, shard_manifest in results:
+        if models is None:
+            models = shard_models
+        else:
+            for model, shard_model in zip(models[0] + models[1][:2],
+                                          shard_models[0] + shard_models[1][:2]):
+                model.mergeCounts(shard_model)
+        if manifest is not None:
+            manifest.update(shard_manifest)
+
+    # counts changed, so cached rhyme tables and samplers are out of date
+    for model in models[0] + models[1][:2]:
+        model.clearCaches()
 
     return models
 
+def updateLyricsModels(models, manifest, lyricsDirectory, songs):
+    """
+    Requires: models were returned by trainLyricsModels(lyricsDirectory)
+              and manifest was filled in by that same call. songs is a
+              list of file names in data/lyrics/<lyricsDirectory> that
+              were added, changed or removed since then
+    Modifies: the models in models, and manifest
+    Effects:  brings the models up to date with the current contents of
+              songs without retraining the rest of the lyrics. the lines
+              each song had when it was trained are taken from manifest
+              and subtracted from the models, and its current lines (if
+              it still exists) are added, after which manifest records
+              the song's new hash and lines. songs whose hash matches
+              manifest are skipped.
+
+              the models are left expanded, see NGramModel.expand.
+              returns the list of songs that actually changed.
+    """
+    dataLoader = DataLoader()
+    added_text = []
+    removed_text = []
+    changed = []
+
+    for song in songs:
+        old_song = manifest.get(song)
+        new_song = dataLoader.loadSong(lyricsDirectory, song)   # None if it was removed
+        if old_song is not None and new_song is not None and old_song[0] == new_song[0]:
+            continue   # the song is the same as when it was trained
+
+        if old_song is not None:
+            removed_text.extend(old_song[1])
+            del manifest[song]
+        if new_song is not None:
+            added_text.extend(new_song[1])
+            manifest[song] = new_song
+        changed.append(song)
+
+    trigramModel, bigramModel, unigramModel = models[0]
+    rhyming_trigramModel, rhyming_bigramModel = models[1][:2]
+    updateModels(added_text, removed_text, [unigramModel, bigramModel, trigramModel],
+                 [rhyming_bigramModel, rhyming_trigramModel])
+
+    return changed
+
+def saveLyricsSnapshot(snapshotFile, models, manifest, key):
+    """
+    Requires: models and manifest are the same as for updateLyricsModels,
+              and key was returned by snapshotKey
+    Modifies: the file snapshotFile, and the rhyme tables of the models
+    Effects:  fills in the rhyme table of every model and then saves the
+              models and manifest to snapshotFile
+    """
+    for model in models[0] + models[1][:2]:
+        model.fillRhymeTable()
+    saveSnapshot(snapshotFile, (models, manifest), key)
+
+def compactLyricsModels(models, compact):
+    """
+    Requires: models is the list returned by trainLyricsModels
+    Modifies: the nGramCounts of every model in models
+    Effects:  if compact is True, packs every model's counts over the
+              same Vocabulary; otherwise makes sure none of them are
+              packed, e.g. after loading a compact snapshot
+    """
+    vocabulary = Vocabulary()
+    for model in models[0] + models[1][:2]:
+        if compact:
+            model.compact(vocabulary)
+        else:
+            model.expand()
+
 def selectNGramModel(models, sentence):
     """
     Requires: models is a list of NGramModel objects sorted by descending
@@ -68,41 +291,75 @@ def selectNGramModel(models, sentence):
               word for a sentence!)
     """
 
+    # a ModelChain looks the answer up in its backoff table
+    if isinstance(models, ModelChain):
+        return models.select(sentence)
+
     # iterates through the list of models and returns the one that returns true
     for i in range(len(models)):
         if models[i].trainingDataHasNGram(sentence):
             return models[i]
 
-def sentenceTooLong(desiredLength, currentLength):
+def selectNGramSampler(models, sentence):
     """
-    Requires: nothing
-    Modifies: nothing
+    Requires: same as selectNGramModel
+    Modifies: the samplers of the models, and the backoff tables of a
+              ModelChain
+    Effects:  returns the WeightedSampler of the word after sentence, from
+              the model selectNGramModel would pick, or None if there is
+              none. a ModelChain resolves it with a single lookup
+    """
+    if isinstance(models, ModelChain):
+        return models.resolve(sentence)
+    selected_model = selectNGramModel(models, sentence)
+    if selected_model is None:
+        return None
+    return selected_model.getSampler(sentence)
+
+def sentenceTooLong(desiredLength, currentLength, rng=random):
+    """
+    Requires: rng is a random number generator, see weightedSampler.py
+    Modifies: the state of rng
     Effects:  returns a bool indicating whether or not this sentence should
               be ended based on its length. This function has been done for
               you.
     """
+    rng = asRandom(rng)
     STDEV = 1
-    val = random.gauss(currentLength, STDEV)
+    val = rng.gauss(currentLength, STDEV)
     return val > desiredLength
 
-def generateSentence(models, desiredLength, sentence1=None):
+def generateSentence(models, desiredLength, sentence1=None, rng=random,
+                     maxAttempts=MAX_LINE_ATTEMPTS, deadline=None, stats=None):
     """
     Requires: models is a list of trained NGramModel objects sorted by
               descending priority: tri-, then bi-, then unigrams.
               desiredLength is the desired length of the sentence.
-    Modifies: nothing
+              rng is a random number generator, see weightedSampler.py
+    Modifies: the state of rng, and stats
     Effects:  returns a list of strings where each string is a word in the
               generated sentence. The returned list should NOT include
               any of the special starting or ending symbols.
 
               For more details about generating a sentence using the
               NGramModels, see the spec.
+
+              every word drawn counts against maxAttempts. once they are
+              used up, or once time.time() is past deadline (if given),
+              the line is built by greedySentence instead, so a line
+              never takes more than maxAttempts draws. if stats is a
+              GenerationStats, what happened is added to it. a line cut
+              short by the deadline depends on when that happened, and
+              is counted in stats.timeouts.
     """
+    rng = asRandom(rng)
+    if stats is None:
+        stats = GenerationStats()
 
     # initializes sentence with starting symbols
-    # then assigns the proper nGramModel to selected_model
+    # then finds the sampler of the proper nGramModel
     sentence = ['^::^', '^:::^']
-    selected_model = selectNGramModel(models, sentence)
+    sampler = selectNGramSampler(models, sentence)
 
     # assigns functions to append/remove to avoid calling
     # dot operator in every loop, which enhances efficiency
@@ -111,9 +368,21 @@ def generateSentence(models, desiredLength, sentence1=None):
 
     # this loop generates a sentence up to the final word
     i = 0
+    attempts = 0
     while i <= desiredLength:
-        next_word = selected_model.getNextToken(sentence)   # chooses and appends next_word based on
-        append(next_word)                                   # selected nGramModel child class
+        attempts += 1
+        timed_out = deadline is not None and time.time() > deadline
+        if attempts > maxAttempts or timed_out:
+            stats.fallbacks += 1   # out of attempts or out of time, so
+            stats.timeouts += timed_out                     # gives up on sampling
+            return greedySentence(models, desiredLength, sentence1, rng)
+        if sampler is None:      # no model knows the context, so there
+            stats.noModel += 1   # is nothing to draw the next word from
+            stats.fallbacks += 1
+            return greedySentence(models, desiredLength, sentence1, rng)
+        next_word = sampler.choose(rng)   # chooses and appends next_word based on
+        append(next_word)                 # the selected nGramModel child class
+        stats.sampled += 1
         if i == 0:
             remove('^::^')   # removes symbol so it won't be counted in the line's length
         if i == 1:
@@ -125,33 +394,43 @@ def generateSentence(models, desiredLength, sentence1=None):
                     if sentence1 is not None:                        # ensures that lines rhyme
                         if not checkForRhyme(sentence1, sentence):   # according to rhyme scheme
                             return sentence
+                        stats.rejected += 1   # the line would rhyme with the wrong line, so goes
+                        continue              # back to the top to try the same position again
                     else:
                         return sentence
-                else:
-                    try:    # if subsequent lines can't rhyme, tries to choose a rhymable word to end the line
-                        selected_model = selectRhymingNGramModel(models, sentence)   # selects the nGramModel child
-                        next_word = selected_model.getNextRhymable(sentence)         # class that can select a rhymable
-                        append(next_word)                                            # word, then chooses the word
-                        if sentence1 is not None:
-                            if not checkForRhyme(sentence1, sentence):   # same as before
-                                return sentence
-                            else:
-                                remove(next_word)   # if getNextRhymable chose a word that rhymes with an incorrect
-                                i -= 1              # line according to the rhyme scheme, then removes that word
-                                continue            # and goes back to the top (in hopes that next_word won't be
-                        else:                       # '$:::$' again
-                            return sentence
-                    except IndexError or AttributeError:    # if there are no rhymable, next_word candidates, then
-                        del sentence[:]                     # we scrap the whole line and start over (this almost
-                        append('^::^')                      # never happens)
+                else:   # if subsequent lines can't rhyme, tries to choose a rhymable word to end the line
+                    next_word = chooseRhymable(models, sentence, rng, stats)
+                    if next_word is None:               # if there are no rhymable, next_word candidates, then
+                        stats.rejected += len(sentence)   # we scrap the whole line and start over (this almost
+                        stats.restarts += 1               # never happens)
+                        del sentence[:]
+                        append('^::^')
                         append('^:::^')
                         i = 0
+                        sampler = selectNGramSampler(models, sentence)
                         continue
+                    append(next_word)
+                    stats.sampled += 1
+                    if sentence1 is not None:
+                        if not checkForRhyme(sentence1, sentence):   # same as before
+                            return sentence
+                        else:
+                            del sentence[-1]    # if chooseRhymable chose a word that rhymes with an incorrect
+                            stats.rejected += 1   # line according to the rhyme scheme, then removes that word
+                            stats.backtracked += 1   # and goes back to the top (in hopes that next_word
+                            i -= 1                   # won't be '$:::$' again)
+                            sampler = selectNGramSampler(models, sentence)
+                            continue
+                    else:
+                        return sentence
             else:
+                stats.rejected += len(sentence)
+                stats.restarts += 1
                 del sentence[:]   # since the line is so short, and the symbols
                 append('^::^')    # have been removed, we can't successfully call
                 append('^:::^')   # getNextToken, see line 146
                 i = 0
+                sampler = selectNGramSampler(models, sentence)
                 continue
         if i == desiredLength - 1:   # catches line when it's one word from completion
             if checkRhymableSentence(models, sentence):           # performs the checkRhymableSentence sequence
@@ -159,34 +438,114 @@ def generateSentence(models, desiredLength, sentence1=None):
                     if not checkForRhyme(sentence1, sentence):
                         return sentence
                     else:
-                        remove(next_word)
+                        del sentence[-1]
+                        stats.rejected += 1
+                        stats.backtracked += 1
                         i -= 1
                         continue
                 else:
                     return sentence
-            else:
-                try:    # lines 192-204:  tries to complete the sentence with a rhymable word (see line 146)
-                    selected_model = selectRhymingNGramModel(models, sentence)
-                    next_word = selected_model.getNextRhymable(sentence)
-                    append(next_word)
-                    if sentence1 is not None:
-                        if not checkForRhyme(sentence1, sentence):
-                            return sentence
-                        else:
-                            remove(next_word)
-                            i -= 1
-                            continue
-                    else:
+            else:   # tries to complete the sentence with a rhymable word, as above
+                next_word = chooseRhymable(models, sentence, rng, stats)
+                if next_word is None:   # if a rhymable word can't be chosen, removes the last
+                    del sentence[-1]    # word on the line and returns to the top
+                    stats.rejected += 1
+                    stats.backtracked += 1
+                    i -= 1
+                    sampler = selectNGramSampler(models, sentence)
+                    continue
+                append(next_word)
+                stats.sampled += 1
+                if sentence1 is not None:
+                    if not checkForRhyme(sentence1, sentence):
                         return sentence
-                except IndexError or AttributeError:    # if a rhymable word can't be chosen, removes the last
-                        remove(sentence[-1])            # word on the line and returns to the top
+                    else:
+                        del sentence[-1]
+                        stats.rejected += 1
+                        stats.backtracked += 1
                         i -= 1
+                        sampler = selectNGramSampler(models, sentence)
                         continue
-        selected_model = selectNGramModel(models, sentence)   # selects an nGramModel child class based on the
-        i += 1                                                # new form of the current sentence and increments i
+                else:
+                    return sentence
+        sampler = selectNGramSampler(models, sentence)   # selects an nGramModel child class based on the
+        i += 1                                           # new form of the current sentence and increments i
 
     return sentence
 
+def chooseRhymable(models, sentence, rng, stats):
+    """
+    Requires: same as generateSentence, and sentence is a list of strings
+    Modifies: the state of rng, and stats
+    Effects:  returns a word to end sentence with that later lines can
+              rhyme with, drawn by the first model that has one (see
+              selectRhymingNGramModel), or None if there is none. when no
+              model has a rhymable word for the context, that is counted
+              in stats.noModel.
+    """
+    selected_model = selectRhymingNGramModel(models, sentence)
+    if selected_model is None:
+        stats.noModel += 1
+        return None
+    try:
+        return selected_model.getNextRhymable(sentence, rng)
+    except IndexError:   # the model has no rhymable word for this context
+        return None
+
+def greedySentence(models, desiredLength, sentence1=None, rng=random):
+    """
+    Requires: same as generateSentence
+    Modifies: the state of rng
+    Effects:  the fallback of generateSentence. draws the first word of
+              the line from rng, so that every line that falls back starts
+              somewhere different, then builds the rest of a line of at
+              most desiredLength words by always choosing the most frequent
+              next word (the first one, if there is a tie). nothing else
+              is random, so this always finishes after one draw.
+
+              if sentence1 is given, the last word is swapped for the most
+              frequent one that doesn't rhyme with sentence1, if there is
+              one, just as generateSentence doesn't let the line rhyme
+              with the wrong line.
+    """
+    rng = asRandom(rng)
+    sentence = ['^::^', '^:::^']
+    selected_model = selectNGramModel(models, sentence)
+    if selected_model is not None and desiredLength > 0:
+        candidates = selected_model.getCandidateDictionary(sentence)
+        candidates = dict((word, count) for word, count in candidates.items()
+                          if word not in ('^::^', '^:::^', '$:::$'))   # the line can't be empty
+        if candidates:
+            sentence.append(selected_model.weightedChoice(candidates, rng))
+
+    while 2 < len(sentence) < desiredLength + 2:
+        ranked = rankedCandidates(models, sentence)
+        if not ranked or ranked[0] == '$:::$':
+            break
+        sentence.append(ranked[0])
+
+    if sentence1 is not None and len(sentence) > 3 and checkForRhyme(sentence1, sentence):
+        for word in rankedCandidates(models, sentence[:-1]):
+            if word != '$:::$' and not checkForRhyme(sentence1, [word]):
+                sentence[-1] = word
+                break
+
+    return sentence[2:]
+
+def rankedCandidates(models, sentence):
+    """
+    Requires: same as generateSentence, and sentence is a list of strings
+    Modifies: nothing
+    Effects:  returns the words that can follow sentence, most frequent
+              first, without the symbols that start a line
+    """
+    selected_model = selectNGramModel(models, sentence)
+    if selected_model is None:
+        return []
+    candidates = selected_model.getCandidateDictionary(sentence)
+    ranked = sorted(candidates, key=candidates.get, reverse=True)   # sorted is stable, so ties keep their order
+    return [word for word in ranked if word not in ('^::^', '^:::^')]
+
 def printSongLyrics(verseOne, verseTwo, chorus):
     """
     Requires: verseOne, verseTwo, and chorus are lists of lists of strings
@@ -198,7 +557,7 @@ def printSongLyrics(verseOne, verseTwo, chorus):
     print('\n',)
     for verse in verses:
         for line in verse:
-            print(' '.join(line)).capitalize()
+            print(' '.join(line).capitalize())
         print('\n',)
 
 def selectRhymingNGramModel(models, sentence1, sentence2=None):
@@ -226,89 +585,65 @@ def selectReverseNGramModel(models, sentence):
               starting from the end
     """
 
+    # a ModelChain looks the answer up in its backoff table
+    if isinstance(models, ModelChain):
+        return models.selectReverse(sentence)
+
     # iterates through the list of models and returns the one that returns true
     for i in range(len(models)):
         if models[i].trainingDataHasReverseNGram(sentence):
             return models[i]
 
-def generateRhymingSentence(models, rhyme_scheme, sentence1, desiredLength, finalLine=False):
+def generateConstrainedRhymingSentence(models, sentence1, desiredLength, finalLine=False, rng=random,
+                                       minLength=MIN_RHYMING_LENGTH, stats=None):
     """
-    Requires: rhyme_scheme is a list of possible rhyme schemes,
-              and sentences 1 & 2 are lists of strings.
-    Modifies: nothing
-    Effect:   does the same thing as generateSentence, except
-              calls the rhyming functions so that the last
-              word of sentence2 rhymes with the last word
-              of sentence1
+    Requires: models is the list of rhyming models returned by
+              trainLyricsModels, sentence1 is a list of strings, and
+              desiredLength >= minLength >= 1.
+              rng is a random number generator, see weightedSampler.py
+    Modifies: the state of rng, stats, and the reachability table of
+              models[0] the first time it is needed
+    Effect:   generates a line whose last word rhymes with the last word
+              of sentence1, backwards from its last word with the
+              reverse models. every word is only chosen among the
+              candidates from which the line can still reach a word that
+              starts lines in the lyrics within minLength to
+              desiredLength words in all (see reachability.py), so no
+              word ever has to be taken back and the line is done after
+              at most desiredLength + 1 draws. that bounds its time as
+              well, so unlike generateSentence it needs no attempt budget
+              or deadline.
+
+              raises IndexError if no rhyme of sentence1 can end such a
+              line. stats is the same as for generateSentence.
     """
-
-    # initializes sentence with the ending symbol so that
-    # sentence2 can be generated in reverse order
-    sentence2 = ['$:::$']
-
-    # assigns functions to remove/insert to avoid calling
-    # dot operator in every loop, which enhances efficiency
-    remove = sentence2.remove
-    insert = sentence2.insert
-
-    # selected model must be bigramModel
-    # because sentence2 only contains one word
-    selected_model = models[1]
-    if not finalLine:
-        next_word = selected_model.getNextRhymingToken(sentence1, sentence2)   # chooses a word that rhymes with the
-        insert(0, next_word)                                                   # the last word of sentence1
-        selected_model = selectReverseNGramModel(models, sentence2)   # now the sentence has 2 words, and a reversed
-                                                                      # nGramModel child class can be chosen
-
-    else:  # this prevents the last word in the last line of a stanza from ending in a conjunction
-        next_word = selected_model.getNextRhymingToken(sentence1, sentence2, finalLine=True)
-        insert(0, next_word)
-        selected_model = selectReverseNGramModel(models, sentence2)
-
-    # This loop generates a line in reverse order
-    i = 0
-    while i <= desiredLength:
-        next_word = selected_model.getNextReverseToken(sentence2)   # chooses and appends next_word based on
-        insert(0, next_word)                                        # the selected nGramModel child class
-        if i == 1:            # once the sentence contains three
-            remove('$:::$')   # strings, '$:::$' can be removed
+    rng = asRandom(rng)
+    if stats is None:
+        stats = GenerationStats()
+    table = getReachability(models, desiredLength)
+
+    # chooses the last word among the rhymes of sentence1 that can end a
+    # line, as getNextRhymingToken would, keeping only the ones from
+    # which the start of a line can be reached in time
+    candidates = models[1].getRhymingCandidateDictionary(sentence1, ['$:::$'], finalLine)
+    allowed = {}
+    for word in candidates:
+        if table.canFinish(('$:::$', word), minLength - 1, desiredLength - 1):
+            allowed[word] = candidates[word]
+    next_word = models[1].weightedChoice(allowed, rng)
+    stats.sampled += 1
+
+    # then works backwards, one word at a time, until the start of the line
+    sentence2 = [next_word]
+    state = ('$:::$', next_word)
+    while True:
+        length = len(sentence2)
+        next_word = table.choices(state, minLength - length, desiredLength - length).choose(rng)
+        stats.sampled += 1
         if next_word == '$:::$':
-            if len(sentence2) > 2:   # prevents one word line since
-                remove(next_word)    # '$:::$' will be removed
-                if checkForRhyme(sentence1, sentence2):   # if sentence2 rhymes with
-                    return sentence2                      # sentence1, returns sentence2
-            else:
-                remove(next_word)                                           # if '$:::$' was chosen as the second word,
-                next_word = selected_model.getNextReverseToken(sentence2)   # removes it and selects and inserts a
-                insert(0, next_word)                                        # different next_word, then returns to top
-                i += 1
-                continue
-        if i == desiredLength - 1:   # catches line when it's one word from completion
-            if checkForRhyme(sentence1, sentence2):   # see line 333
-                if '$:::$' in sentence2:    # sometimes, for a reason we could not figure out,
-                    remove('$:::$')         # '$:::$' would be in the middle of the line
-                return sentence2
-            else:
-                remove(next_word)
-                try:    # lines 367-373: tries to choose and insert the first word of sentence2
-                    selected_model = selectNGramModel(models, sentence2)
-                    next_word = selected_model.getNextReverseToken(sentence2)
-                    insert(0, next_word)
-                    i += 1
-                    if '$:::$' in sentence2:
-                        remove('$:::$')
-                    return sentence2
-                except IndexError or AttributeError:    # if a word can't be chosen, removes
-                    remove(sentence2[0])                # the first word in sentence2, decrements
-                    i -= 1                              # i, and returns to the top
-                    continue
-        selected_model = selectReverseNGramModel(models, sentence2)  # selects an nGramModel child class based on the
-        i += 1                                                       # new form of the current sentence and increments i
-
-    if '$:::$' in sentence2:    # prevents sentence2 from being returned containing '$:::$'
-        remove('$:::$')
-
-    return sentence2
+            return sentence2
+        sentence2.insert(0, next_word)
+        state = (state[1], next_word)
 
 def checkRhymableSentence(models, sentence):
     """
@@ -320,22 +655,12 @@ def checkRhymableSentence(models, sentence):
               of sentence are in self.nGramCounts
     """
 
-    # opens rhymeLibrary and loads the dictionary into rhyme_dict
-    rhyme_library = open('rhymeLibrary.txt', 'r')
-    rhyme_dict = pickle.load(rhyme_library)
-
     # assigns proper nGramModel class to selected_model
     selected_model = selectNGramModel(models, sentence)
-    model_checker = selected_model.getDictionary()
-
-    # see "Effects" section of docstring
-    rhyming_list = rhyme_dict[sentence[-1]]
-    for i in range(len(rhyming_list)):
-        word = rhyming_list[i]
-        if word in model_checker:
-            return True
 
-    return False
+    # see "Effects" section of docstring. the model's rhyme table
+    # already holds only the rhymes that are in self.nGramCounts
+    return len(selected_model.getVocabularyRhymes(sentence[-1])) != 0
 
 def checkForRhyme(sentence1, sentence2):
     """
@@ -346,54 +671,73 @@ def checkForRhyme(sentence1, sentence2):
     Modifies: nothing
     Effects:  for creative part of reach. returns true if last words
               of sentence1 and sentence2 rhyme. this includes
-              slant rhymes. will be called in generateRhymingSentence
+              slant rhymes. will be called in generateSentence
               as a condition before a sentence is returned
     """
 
-    # opens rhymeLibrary and loads the dictionary into rhyme_dict
-    rhyme_library = open('rhymeLibrary.txt', 'r')
-    rhyme_dict = pickle.load(rhyme_library)
-
     # See effects section of docstring
-    rhyming_list = rhyme_dict[sentence1[-1]]
-    for i in range(len(rhyming_list)):
-        if sentence2[-1] in rhyming_list:
-            return True
-
-    return False
+    return getRhymeIndex().rhymes(sentence1[-1], sentence2[-1])
 
-def chooseRhymeScheme(rhyme_schemes):
+def chooseRhymeScheme(rhyme_schemes, rng=random):
     """
-    Requires: rhyme_schemes is a list of possible rhyme schemes
-    Modifies: nothing
+    Requires: rhyme_schemes is a list of possible rhyme schemes and rng
+              is a random number generator, see weightedSampler.py
+    Modifies: the state of rng
     Effects:  randomly selects a rhyme scheme that will
               be used in runLyricsGenerator to determine
               which sentences in a stanza will be assigned
               to sentence1 or sentence2
     """
-    return random.choice(rhyme_schemes)
+    rng = asRandom(rng)
+    return rng.choice(rhyme_schemes)
 
-def runRhymingLyricsGenerator(models): #### REMOVE 0110 ###
+def generateSong(models, seed=None, rng=None, timeout=None, deadline=None):
     """
-    Requires: models is a list of a trained nGramModel child class objects
-    Modifies: nothing
-    Effect:   exactly the same as runLyricsGenerator except that the verses
-              and chorus will rhyme according to a randomly selected
-              rhyme scheme
+    Requires: models is a list of a trained nGramModel child class objects.
+              rng is None, or a random number generator as accepted by
+              asRandom, see weightedSampler.py
+    Modifies: the state of rng
+    Effect:   generates a song whose verses and chorus rhyme according to
+              a randomly selected rhyme scheme, and returns it as a Song.
+              every random choice is made with rng. if rng is None and
+              seed is given, the song gets a random.Random(seed) of its
+              own, so the same seed and models always give the same song
+              whatever else is running. with neither, the random module
+              is used. rhyming lines are generated by
+              generateConstrainedRhymingSentence.
+
+              if timeout is given, lines that are still being generated
+              timeout seconds after the song was started fall back to
+              greedySentence, so the song is done soon after. deadline
+              does the same at a time.time() given up front, e.g. by a
+              caller that queued the song; the earlier of the two holds. the
+              GenerationStats of every line are kept in the Song's stats.
+              a song with lines cut short by the timeout depends on how
+              fast it was generated, so its seed may not give it again;
+              see Song.timedOut.
     """
+    if rng is None and seed is not None:
+        rng = random.Random(seed)
+    rng = asRandom(rng)
+    if timeout is not None:
+        timeout_at = time.time() + timeout
+        deadline = timeout_at if deadline is None else min(deadline, timeout_at)
 
     # selects rhyme scheme
-    rhyme_scheme = chooseRhymeScheme(RHYME_SCHEMES)
+    rhyme_scheme = chooseRhymeScheme(RHYME_SCHEMES, rng)
 
     # creates verse/chorus lists
     verseOne = []
     verseTwo = []
     chorus = []
 
-    # allows generateRhymingSentence to know which stanza
+    # allows generateConstrainedRhymingSentence to know which stanza
     # it is looking at in order to select sentence1
     stanzas = [verseOne, verseTwo, chorus]
 
+    # the GenerationStats of each line of each stanza
+    stats = [[], [], []]
+
     # assigns functions to append1,2,c to avoid calling
     # dot operator in every loop, which enhances efficiency
     append1 = verseOne.append
@@ -402,7 +746,7 @@ def runRhymingLyricsGenerator(models): #### REMOVE 0110 ###
     append = [append1, append2, append_c]
 
     # constant values for desiredLength and stanza_length
-    desiredLength = 6
+    desiredLength = SONG_LINE_LENGTH
     stanza_length = 4
 
     # generates each verse and chorus according to rhyme_scheme
@@ -412,26 +756,36 @@ def runRhymingLyricsGenerator(models): #### REMOVE 0110 ###
             if len(stanzas[i]) < stanza_length:   # ensures that a fifth line isn't generated
                 if len(stanzas[i]) == 0:
                     model = models[0]   # selects non-rhyming models
-                    new_line = generateSentence(model, desiredLength)   # assigns a generated sentence to new_line,
-                    append[i](new_line)                                 # appends it to the current stanza, and then
-                    new_line = []                                       # empties new_line to be repopulated
+                    line_stats = GenerationStats()
+                    new_line = generateSentence(model, desiredLength, rng=rng,     # assigns a generated sentence to new_line,
+                                                deadline=deadline, stats=line_stats)
+                    append[i](new_line)                                          # appends it to the current stanza, and then
+                    stats[i].append(line_stats)
+                    new_line = []                                                # empties new_line to be repopulated
                 elif rhyme_scheme[j] == rhyme_scheme[j - 1]:   # for '0011' rhyme scheme
                     while len(stanzas[i]) < stanza_length:
                         sentence1 = stanzas[i][line]    # indicates the rhyme-reference line
                         model = models[1]               # and then selects rhyming models
+                        line_stats = GenerationStats()
                         try:
-                            new_line = generateRhymingSentence(model, rhyme_scheme, sentence1, desiredLength)
+                            new_line = generateConstrainedRhymingSentence(model, sentence1, desiredLength, rng=rng,
+                                                                          stats=line_stats)
                             append[i](new_line)
                             new_line = []
                         except IndexError:      # if, for some reason, a rhyming sentence cannot be generated, then
                             model = models[0]   # goes ahead and generates a regular line, giving the stanza variety
-                            new_line = generateSentence(model, desiredLength)
+                            new_line = generateSentence(model, desiredLength, rng=rng,
+                                                        deadline=deadline, stats=line_stats)
                             append[i](new_line)
                             new_line = []
+                        stats[i].append(line_stats)
                         if len(stanzas[i]) < stanza_length - 1:   # ensures that a fifth line isn't generated
                             model = models[0]
-                            new_line = generateSentence(model, desiredLength, sentence1)
+                            line_stats = GenerationStats()
+                            new_line = generateSentence(model, desiredLength, sentence1, rng,
+                                                        deadline=deadline, stats=line_stats)
                             append[i](new_line)
+                            stats[i].append(line_stats)
                             new_line = []
                         if rhyme_scheme[0] != rhyme_scheme[-1]:   # maintains '0011'
                             line = 2
@@ -442,26 +796,89 @@ def runRhymingLyricsGenerator(models): #### REMOVE 0110 ###
                         while len(stanzas[i]) < stanza_length - 1:
                             sentence1 = stanzas[i][line]   # see lines 452-453
                             model = models[1]
+                            line_stats = GenerationStats()
                             try:
-                                new_line = generateRhymingSentence(model, rhyme_scheme, sentence1, desiredLength)
+                                new_line = generateConstrainedRhymingSentence(model, sentence1, desiredLength, rng=rng,
+                                                                              stats=line_stats)
                                 append[i](new_line)
                                 new_line = []
                                 line = 1
                             except IndexError:   # see lines 458-459
                                 model = models[0]
-                                new_line = generateSentence(model, desiredLength)
+                                new_line = generateSentence(model, desiredLength, rng=rng,
+                                                            deadline=deadline, stats=line_stats)
                                 append[i](new_line)
                                 new_line = []
                                 line = 1
+                            stats[i].append(line_stats)
                 else:   # for second line of '0110' or '0101' rhyme scheme
                     sentence1 = stanzas[i][line]
                     model = models[0]
-                    new_line = generateSentence(model, desiredLength, sentence1)   # second line doesn't need to rhyme
+                    line_stats = GenerationStats()
+                    new_line = generateSentence(model, desiredLength, sentence1, rng,   # second line doesn't need to rhyme
+                                                deadline=deadline, stats=line_stats)
                     append[i](new_line)
+                    stats[i].append(line_stats)
                     new_line = []
                     line = 1
 
-    return printSongLyrics(verseOne, verseTwo, chorus)
+    return Song(verseOne, verseTwo, chorus, rhyme_scheme, seed, stats)
+
+def runRhymingLyricsGenerator(models): #### REMOVE 0110 ###
+    """
+    Requires: models is a list of a trained nGramModel child class objects
+    Modifies: nothing
+    Effect:   exactly the same as runLyricsGenerator except that the verses
+              and chorus will rhyme according to a randomly selected
+              rhyme scheme
+    """
+    song = generateSong(models)
+    return printSongLyrics(song.verseOne, song.verseTwo, song.chorus)
+
+def songSeed(masterSeed, index):
+    """
+    Requires: masterSeed is an int or a string and index is an int
+    Modifies: nothing
+    Effects:  returns the seed of the song at position index of a batch
+              generated from masterSeed. every song's seed is derived from
+              masterSeed and index alone, so any song of a batch can be
+              generated again on its own, in any order or process.
+    """
+    digest = hashlib.sha256(('%s:%d' % (masterSeed, index)).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+def prepareModels(models):
+    """
+    Requires: models is a list returned by trainLyricsModels
+    Modifies: the rhyme tables of the models and the process-wide RhymeIndex
+    Effects:  does the setup that every song would otherwise repeat or do
+              lazily: loads the rhyme library, fills in the rhymable
+              endings of every word each model knows, and builds the
+              reachability table of the reverse models for lines of
+              SONG_LINE_LENGTH words. the samplers are cached on the
+              models too, so they carry over from one song to the next
+              without any help.
+    """
+    getRhymeIndex().wordId('')   # loads the library if it isn't already
+    for model in models[0] + models[1][:2]:
+        model.fillRhymeTable()
+    getReachability(models[1], SONG_LINE_LENGTH)
+
+def generateSongs(models, n, seed=None):
+    """
+    Requires: models is a list returned by trainLyricsModels and n is a
+              non-negative int
+    Modifies: the caches of the models
+    Effects:  returns a list of n Songs. the models are prepared once for
+              the whole batch (see prepareModels), and song i is generated
+              from songSeed(seed, i), so the same seed always gives the
+              same batch. if seed is None, a random master seed is used.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 63)
+
+    prepareModels(models)
+    return [generateSong(models, songSeed(seed, i)) for i in range(n)]
 
 
 # -----------------------------------------------------------------------------
@@ -494,7 +911,7 @@ def trainMusicModels(musicDirectory):
     trigramModel.trainModel(dataLoader.songs)
 
     # creates a list containing each model in priority order
-    models = [trigramModel, bigramModel, unigramModel]
+    models = ModelChain([trigramModel, bigramModel, unigramModel])
 
     return models
 
@@ -593,8 +1010,11 @@ def main():
     lyricsSource = 'Coldplay' #eliminate, make it work for everything
     lyricsDirectory = 'Coldplay'
 
+    # trained models are saved here so that the next start can skip training
+    snapshotFile = lyricsDirectory + 'Models.snapshot'
+
     print('Starting program and loading data...')
-    lyricsModels = trainLyricsModels(lyricsDirectory)
+    lyricsModels = trainLyricsModels(lyricsDirectory, snapshotFile=snapshotFile)
     print('Data successfully loaded\n')
 
     userInput = getUserInput(program_name, lyricsSource)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# GenerationStats class -------------------------------------------------------
+# Counts what generateSentence and generateConstrainedRhymingSentence did to
+# produce a line, so that slow or badly behaved models can be spotted. one
+# object can be passed to several calls to add up their counts.
+
+class GenerationStats(object):
+
+    def __init__(self):
+        """
+        Requires: nothing
+        Modifies: self (this instance of the GenerationStats object)
+        Effects:  this is the GenerationStats constructor. every count
+                  starts at 0:
+                      sampled:     words drawn from the models
+                      rejected:    drawn words that didn't end up in a line
+                      backtracked: times the last word of a line was taken
+                                   back to try again
+                      restarts:    times a whole line was thrown away
+                      fallbacks:   lines given up on because they ran out of
+                                   attempts or time
+                      timeouts:    the fallbacks caused by running out of
+                                   time. these depend on how fast the
+                                   machine was, so a line with any can't
+                                   be generated again from its seed
+                      noModel:     times no model could draw a word for the
+                                   context of the line
+        """
+        self.sampled = 0
+        self.rejected = 0
+        self.backtracked = 0
+        self.restarts = 0
+        self.fallbacks = 0
+        self.timeouts = 0
+        self.noModel = 0
+
+    def add(self, other):
+        """
+        Requires: other is a GenerationStats
+        Modifies: self
+        Effects:  adds the counts of other to the counts of self
+        """
+        self.sampled += other.sampled
+        self.rejected += other.rejected
+        self.backtracked += other.backtracked
+        self.restarts += other.restarts
+        self.fallbacks += other.fallbacks
+        self.timeouts += other.timeouts
+        self.noModel += other.noModel
+
+    def toDict(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns the counts as a dictionary, e.g. to be written
+                  out as JSON
+        """
+        return {'sampled': self.sampled, 'rejected': self.rejected,
+                'backtracked': self.backtracked, 'restarts': self.restarts,
+                'fallbacks': self.fallbacks, 'timeouts': self.timeouts,
+                'noModel': self.noModel}
+
+    def __repr__(self):
+        return 'GenerationStats(%s)' % ', '.join('%s=%d' % item for item in sorted(self.toDict().items()))
@@ -0,0 +1,236 @@
+import numpy as np
+from packedCounts import *
+
+# -----------------------------------------------------------------------------
+# BatchSampler class ----------------------------------------------------------
+# Generates many lines at once from the forward lyrics models. every line of
+# a batch advances by one word per step, and each step is a handful of NumPy
+# operations over the whole batch rather than a Python loop per line.
+#
+# The counts of all three models are flattened into one table: a row per
+# context (the unigram row, one row per bigram word1, and one per trigram
+# (word1, word2) pair), each holding the next word ids and the running total
+# of their counts across the whole table. drawing a number in a row's range
+# of that running total and searching for it picks the next word, so one
+# searchsorted call picks the next word of every line. the row each entry
+# leads to is worked out when the table is built, so the lines never look
+# their contexts up while they are being generated.
+
+class BatchSampler(object):
+
+    def __init__(self, models):
+        """
+        Requires: models is a list of trained NGramModel objects sorted by
+                  descending priority: tri-, then bi-, then unigrams, such
+                  as the first list returned by trainLyricsModels. their
+                  counts can be packed or not
+        Modifies: self (this instance of the BatchSampler object)
+        Effects:  this is the BatchSampler constructor. it copies the
+                  counts of models into the flat table described above.
+                  later changes to the models are not seen by the sampler.
+
+                  row r is self.nextIds[self.rowStarts[r]:self.rowEnds[r]],
+                  with the running totals in the same slice of
+                  self.cumulative. row 0 is the unigram row, row 1 + id is
+                  the bigram row of word id (empty if there is none), and
+                  self.pairRows[k] is the row of the trigram context
+                  self.pairKeys[k], which is
+                  word1 id * len(self.vocabulary) + word2 id.
+                  self.nextRows[k] is the row a line draws from after
+                  drawing entry k, or -1 after a draw from the unigram row,
+                  whose context isn't known.
+        """
+        trigramCounts = models[0].nGramCounts
+        bigramCounts = models[1].nGramCounts
+        unigramCounts = models[2].nGramCounts
+
+        # every word gets an id first, so
+        # that the pair keys can be computed
+        vocabulary = Vocabulary()
+        for word in ['^::^', '^:::^', '$:::$']:
+            vocabulary.intern(word)
+        for word in unigramCounts:
+            vocabulary.intern(word)
+        for word1 in bigramCounts:
+            vocabulary.intern(word1)
+            for word2 in bigramCounts[word1]:
+                vocabulary.intern(word2)
+        for word1 in trigramCounts:
+            vocabulary.intern(word1)
+            for word2 in trigramCounts[word1]:
+                vocabulary.intern(word2)
+        size = len(vocabulary)
+        intern = vocabulary.intern
+
+        nextIds = []
+        counts = []
+        rowStarts = []
+        rowEnds = []
+        rowLast = []   # the last word of each row's context
+
+        def addRow(candidates, last):
+            rowStarts.append(len(nextIds))
+            for word in candidates:
+                nextIds.append(intern(word))
+                counts.append(candidates[word])
+            rowEnds.append(len(nextIds))
+            rowLast.append(last)
+
+        addRow(unigramCounts, -1)
+        bigramRows = dict((intern(word1), bigramCounts[word1]) for word1 in bigramCounts)
+        for i in range(size):
+            addRow(bigramRows.get(i, {}), i)
+
+        pairs = []
+        for word1 in trigramCounts:
+            following = trigramCounts[word1]
+            for word2 in following:
+                pairs.append((intern(word1) * size + intern(word2), len(rowStarts)))
+                addRow(following[word2], intern(word2))
+        pairs.sort()
+
+        self.vocabulary = vocabulary
+        self.words = np.array(vocabulary.words, dtype=object)
+        self.nextIds = np.array(nextIds, dtype=np.int64)
+        self.cumulative = np.cumsum(np.array(counts, dtype=np.int64))
+        self.rowStarts = np.array(rowStarts, dtype=np.int64)
+        self.rowEnds = np.array(rowEnds, dtype=np.int64)
+        self.pairKeys = np.array([key for key, row in pairs], dtype=np.int64)
+        self.pairRows = np.array([row for key, row in pairs], dtype=np.int64)
+
+        # the running total just before each row and each row's total count
+        running = np.concatenate([np.zeros(1, dtype=np.int64), self.cumulative])
+        self.rowBases = running[self.rowStarts]
+        self.rowTotals = running[self.rowEnds] - self.rowBases
+
+        # the row after each entry is the row of the context made of
+        # the last word of the entry's row and the entry's word
+        entryRows = np.repeat(np.arange(len(rowStarts)), self.rowEnds - self.rowStarts)
+        last = np.array(rowLast, dtype=np.int64)[entryRows]
+        self.nextRows = np.full(len(nextIds), -1, dtype=np.int64)
+        known = last >= 0
+        self.nextRows[known] = self.selectRows(last[known], self.nextIds[known])
+
+    def selectRows(self, word1, word2):
+        """
+        Requires: word1 and word2 are NumPy arrays of word ids, the last
+                  two words of each line
+        Modifies: nothing
+        Effects:  returns the row each line draws its next word from, the
+                  same way selectNGramModel picks a model: the trigram row
+                  of (word1, word2) if there is one, otherwise the bigram
+                  row of word2 if it isn't empty, otherwise the unigram row
+        """
+        size = len(self.vocabulary)
+        rows = np.zeros(len(word2), dtype=np.int64)
+
+        bigram = 1 + word2
+        has_bigram = self.rowEnds[bigram] > self.rowStarts[bigram]
+        rows[has_bigram] = bigram[has_bigram]
+
+        if len(self.pairKeys):
+            keys = word1 * size + word2
+            k = np.minimum(np.searchsorted(self.pairKeys, keys), len(self.pairKeys) - 1)
+            has_trigram = self.pairKeys[k] == keys
+            rows[has_trigram] = self.pairRows[k[has_trigram]]
+
+        return rows
+
+    def sampleLines(self, n, desiredLength, rng=None, minLength=2, maxSteps=200):
+        """
+        Requires: same as sampleLineIds
+        Modifies: the state of rng
+        Effects:  the same as sampleLineIds, except that the lines are
+                  returned as a list of lists of strings
+        """
+        lines, lengths = self.sampleLineIds(n, desiredLength, rng, minLength, maxSteps)
+
+        # looks every word up at once, then cuts each line to its length
+        words = self.words[lines].tolist()
+        return [line[:length] for line, length in zip(words, lengths.tolist())]
+
+    def sampleLineIds(self, n, desiredLength, rng=None, minLength=2, maxSteps=200):
+        """
+        Requires: n, desiredLength, minLength and maxSteps are positive
+                  ints, and rng is None, an int seed, or a
+                  numpy.random.Generator
+        Modifies: the state of rng
+        Effects:  generates n lines at once and returns them as
+                  (lines, lengths), where line i is the word ids
+                  lines[i, :lengths[i]] (see self.vocabulary), so that
+                  they can be scored or filtered without leaving NumPy.
+                  each line ends where '$:::$' is drawn,
+                  once it has at least minLength words, or when it reaches
+                  desiredLength words, as in generateSentence. a line that
+                  draws '$:::$' too early starts over.
+
+                  lines are not checked for rhymes, so this is for bulk
+                  lines that are filtered or ranked afterwards. a line
+                  still unfinished after maxSteps draws is returned as it
+                  is.
+        """
+        if not isinstance(rng, np.random.Generator):
+            rng = np.random.default_rng(rng)
+
+        wordIds = self.vocabulary.wordIds
+        end = wordIds['$:::$']
+        start = self.selectRows(np.array([wordIds['^::^']]), np.array([wordIds['^:::^']]))[0]
+        rows = np.full(n, start, dtype=np.int64)
+        lines = np.zeros((n, desiredLength), dtype=np.int64)
+        lengths = np.zeros(n, dtype=np.int64)
+        active = np.arange(n)
+
+        for step in range(maxSteps):
+            if not len(active):
+                break
+
+            # draws the next word of every active line at once
+            current = rows[active]
+            draws = self.rowBases[current] + rng.integers(self.rowTotals[current])
+            entries = np.searchsorted(self.cumulative, draws, side='right')
+            next_ids = self.nextIds[entries]
+
+            # lines that drew '$:::$' are done if they are long enough,
+            # and start over otherwise. every other line takes its word
+            ended = next_ids == end
+            grows = ~ended
+            growing = active[grows]
+            lines[growing, lengths[growing]] = next_ids[grows]
+            lengths[growing] += 1
+            rows[growing] = self.nextRows[entries[grows]]
+
+            # after a draw from the unigram row the context is
+            # looked up from the line's last two words instead
+            unknown = growing[rows[growing] < 0]
+            if len(unknown):
+                previous = np.where(lengths[unknown] > 1,
+                                    lines[unknown, np.maximum(lengths[unknown] - 2, 0)],
+                                    wordIds['^:::^'])
+                rows[unknown] = self.selectRows(previous, lines[unknown, lengths[unknown] - 1])
+
+            short = ended & (lengths[active] < minLength)
+            restarting = active[short]
+            lengths[restarting] = 0
+            rows[restarting] = start
+
+            done = (ended & ~short) | (lengths[active] >= desiredLength)
+            active = active[~done]
+
+        return lines, lengths
+
+
+# -----------------------------------------------------------------------------
+# Testing code ----------------------------------------------------------------
+
+if __name__ == '__main__':
+    from unigramModel import *
+    from bigramModel import *
+    from trigramModel import *
+    text = [ ['the', 'quick', 'brown', 'fox'], ['the', 'lazy', 'dog'] ]
+    text.append(['let', 'it', 'be'])
+    text.append(['let', 'it', 'go'])
+    models = [TrigramModel(), BigramModel(), UnigramModel()]
+    trainModels(text, models)
+    sampler = BatchSampler(models)
+    for line in sampler.sampleLines(10, 4, rng=0):
+        print(line)
@@ -1,7 +1,5 @@
 import random
 from nGramModel import *
-import copy
-import pickle
 
 # -----------------------------------------------------------------------------
 # BigramModel class -----------------------------------------------------------
@@ -10,6 +8,9 @@ import pickle
 
 class BigramModel(NGramModel):
 
+    # see NGramModel.compact
+    packedCountsClass = PackedBigramCounts
+
     def __init__(self):
         """
         Requires: nothing
@@ -37,37 +38,59 @@ class BigramModel(NGramModel):
                   self.nGramCounts. For more details, see the spec.
         """
 
-        # makes a copy of text, then passes it through prepData
-        bigram_text = copy.deepcopy(text)
-        bigram_text = self.prepData(bigram_text)
-
-        # updates self.nGramCounts with known key value pairs
-        self.nGramCounts.update({'^::^': {'^:::^': len(bigram_text)}})
-
-        # prevents symbols from being counted again
-        exclude = {'^::^', '^:::^'}
-
-        # assigns update function to update to avoid calling
-        # dot operator in every loop, which enhances efficiency
-        update = self.nGramCounts.update
-
-        # updates self.nGramCounts with bigram frequencies
-        bigram_count = 1
-        for i in range(len(bigram_text)):
-            for j in range(len(bigram_text[i]) - 1):
-                word1 = bigram_text[i][j]       # makes words 1/2 a two-word sequence (a bigram) in text.
-                word2 = bigram_text[i][j + 1]   # loop ensures that every two-word sequence is checked
-                if word1 and word2 not in exclude:
-                    if word1 in self.nGramCounts:
-                        if word2 in self.nGramCounts[word1]:
-                            self.nGramCounts[word1][word2] += 1   # changes only an existing bigram's value
-                        else:   # adds a new second word to an existing unigram
-                            self.nGramCounts[word1].update({word2: bigram_count + 1})
-                    else:   # adds a brand new bigram
-                        update({word1: {word2: bigram_count + 1}})
+        # packed counts are read-only, so a compacted
+        # model goes back to dictionaries before counting
+        self.expand()
+
+        # counts each line once it has been padded by prepLine
+        for line in text:
+            self.countNGrams(prepLine(line))
+
+        # counts changed, so cached rhyme tables are out of date
+        self.clearCaches()
 
         return self.nGramCounts
 
+    def countNGrams(self, line, count=1):
+        """
+        Requires: line is a list of strings that has been through
+                  prepLine, or prepReverseLine for a rhyming model
+        Modifies: self.nGramCounts
+        Effects:  adds count to the count of every two-word sequence
+                  (a bigram) in line. a negative count takes line back
+                  out of the model, and bigrams whose count drops to
+                  zero are removed entirely
+        """
+        nGramCounts = self.nGramCounts
+        for j in range(len(line) - 1):
+            word1 = line[j]       # makes words 1/2 a two-word sequence (a bigram) in line.
+            word2 = line[j + 1]   # loop ensures that every two-word sequence is checked
+            following = nGramCounts.get(word1)
+            if following is None:   # adds a brand new bigram
+                following = nGramCounts[word1] = {}
+            total = following.get(word2, 0) + count
+            if total > 0:
+                following[word2] = total
+            else:   # the bigram is no longer in the training data
+                following.pop(word2, None)
+                if not following:
+                    del nGramCounts[word1]
+
+    def mergeCounts(self, other):
+        """
+        Requires: same as NGramModel.mergeCounts
+        Modifies: self.nGramCounts, other.nGramCounts
+        Effects:  adds the count of every bigram in other to self
+        """
+        nGramCounts = self.nGramCounts
+        for word1, other_following in other.nGramCounts.items():
+            following = nGramCounts.get(word1)
+            if following is None:   # takes over a word1 self has never seen
+                nGramCounts[word1] = other_following
+                continue
+            for word2, count in other_following.items():
+                following[word2] = following.get(word2, 0) + count
+
     def trainingDataHasNGram(self, sentence):
         """
         Requires: sentence is a list of strings, and len(sentence) >= 1
@@ -78,7 +101,7 @@ class BigramModel(NGramModel):
         """
 
         # checks for the last word of sentence is a key in self.nGramCounts
-        if sentence[-1] in self.nGramCounts.keys():
+        if sentence[-1] in self.nGramCounts:
             return True
         return False
 
@@ -103,6 +126,15 @@ class BigramModel(NGramModel):
 
         return candidates
 
+    def getContext(self, sentence):
+        """
+        Requires: sentence is a list of strings, and len(sentence) >= 1
+        Modifies: nothing
+        Effects:  returns a tuple of the last word of sentence, the
+                  only word getCandidateDictionary looks at
+        """
+        return (sentence[-1],)
+
     def trainRhymingModel(self, text):
         """
         Requires: text is a list of lists of strings
@@ -115,33 +147,18 @@ class BigramModel(NGramModel):
                   going backwards.
         """
 
-        # makes bigram_text a copy of text, then passes it through prepRhymingData
-        bigram_text = copy.deepcopy(text)
-        bigram_text = self.prepRhymingData(bigram_text)
-
-        # symbols shouldn't be counted because they won't
-        # be needed to produce sentence in reverse order
-        exclude = {'^::^', '^:::^'}
-
-        # assigns update function to update to avoid calling
-        # dot operator in every loop, which enhances efficiency
-        update = self.nGramCounts.update
-
-        bigram_count = 1
-        for i in range(len(bigram_text)):   # updates self.nGramCounts with bigram frequencies exactly
-            j = len(bigram_text[i]) - 1     # like trainModel (see lines 55-67), except in reverse
-            while j > 0:
-                word1 = bigram_text[i][j]
-                word2 = bigram_text[i][j - 1]
-                if word1 and word2 not in exclude:
-                    if word1 in self.nGramCounts:
-                        if word2 in self.nGramCounts[word1]:
-                            self.nGramCounts[word1][word2] += 1
-                        else:
-                            self.nGramCounts[word1].update({word2: bigram_count + 1})
-                    else:
-                        update({word1: {word2: bigram_count}})
-                j -= 1
+        # packed counts are read-only, so a compacted
+        # model goes back to dictionaries before counting
+        self.expand()
+
+        # counting a line sandwiched by prepRhymingData from its last
+        # word back to its first is the same as counting it forwards
+        # once it has been reversed, which is what prepReverseLine does
+        for line in text:
+            self.countNGrams(prepReverseLine(line))
+
+        # counts changed, so cached rhyme tables are out of date
+        self.clearCaches()
 
         return self.nGramCounts
 
@@ -155,27 +172,25 @@ class BigramModel(NGramModel):
                   the next rhyming token for the sentence.
         """
 
-        # opens rhymeLibrary and loads the dictionary into rhyme_dict
-        rhyme_library = open('rhymeLibrary.txt', 'r')
-        rhyme_dict = pickle.load(rhyme_library)
+        # shared rhyme index, the library is only loaded once per process
+        rhymeIndex = getRhymeIndex()
 
         # checks if self.nGramCounts contains words that rhyme
-        # with the last word of sentence if so, returns true
+        # with the last word of sentence if so, returns true.
+        # every word that follows another is also a key of
+        # self.nGramCounts, so only the model's own rhymes are tried
         if sentence2 is None:
-            rhyming_list = rhyme_dict[sentence1[-1]]
-            for i in range(len(rhyming_list)):
-                word = rhyming_list[i]
-                if word in self.nGramCounts[sentence1[-1]]:
+            keys = self.nGramCounts[sentence1[-1]]
+            for word in self.getVocabularyRhymes(sentence1[-1]):
+                if word in keys:
                     return True
         # checks the same conditions as above, except that
-        # it uses sentence1 as the rhyme-reference line
+        # it uses sentence1 as the rhyme-reference line, and
+        # the word must rhyme with the last word of sentence2 too
         else:
             keys = self.nGramCounts[sentence2[-1]]
-            rhyming_list = rhyme_dict[sentence2[-1]]
-            compare_list = rhyme_dict[sentence1[-1]]
-            for i in range(len(rhyming_list)):
-                word = rhyming_list[i]
-                if (word in keys) and (word in compare_list):
+            for word in self.getVocabularyRhymes(sentence1[-1]):
+                if word in keys and rhymeIndex.rhymes(sentence2[-1], word):
                     return True
 
         return False
@@ -189,7 +204,7 @@ class BigramModel(NGramModel):
         """
 
         # checks for the first word of sentence is a key in self.nGramCounts
-        if sentence[1] in self.nGramCounts.keys():
+        if sentence[1] in self.nGramCounts:
             return True
         return False
 
@@ -205,46 +220,32 @@ class BigramModel(NGramModel):
                   of the compared sentence.
         """
 
-        # opens rhymeLibrary and loads the dictionary into rhyme_dict
-        rhyme_library = open('rhymeLibrary.txt', 'r')
-        rhyme_dict = pickle.load(rhyme_library)
+        # the candidates of getCandidateDictionary, looked up in place
+        # rather than copied, since the row of '$:::$' holds every word
+        # that ends a line
+        allCandidates = self.nGramCounts.get(sentence2[-1], {})
 
-        # makes allCandidates the returned dictionary of getCandidateDictionary
-        allCandidates = self.getCandidateDictionary(sentence2)
-
-        # filters out '$:::$', it can't rhyme so shouldn't be included
-        exclude = '$:::$'
-        if exclude in allCandidates:
-            del allCandidates[exclude]
-
-        # if generating the final line of a stanza,
-        # makes sure the last word isn't one of these
+        # '$:::$' can't rhyme so shouldn't be included, and if
+        # generating the final line of a stanza, makes sure
+        # the last word isn't one of these
+        exclude = {'$:::$'}
         if finalLine:
-            bad_endings = [
+            exclude.update([
                 'for', 'nor', 'and', 'but', 'or', 'although', 'as', 'if',
                 'because', 'than', 'that', 'unless', 'until', 'til', 'when',
                 'where', 'whether', 'which', 'while', 'who', 'both', 'such', 'rather'
-            ]
-            for i in range(len(bad_endings)):
-                if bad_endings[i] in allCandidates:
-                    del allCandidates[bad_endings[i]]
+            ])
 
         # makes constrainedCandidates an empty dictionary
         constrainedCandidates = {}
 
-        # assigns update function to update to avoid calling
-        # dot operator in every loop, which enhances efficiency
-        update = constrainedCandidates.update
-
-        # checks if any of the words in allCandidates
-        # rhyme with the last word in sentence1.
-        # if so, updates constrainedCandidates with
-        # that key value pair
-        rhyming_list = rhyme_dict[sentence1[-1]]
-        for i in range(len(rhyming_list)):
-            word = rhyming_list[i]
-            if word in allCandidates:
-                update({word: allCandidates[word]})
+        # checks if any of the words in allCandidates rhyme with the
+        # last word in sentence1. only rhymes that are keys in
+        # self.nGramCounts can be candidates, so the model's rhyme
+        # table is intersected with allCandidates
+        for word in self.getVocabularyRhymes(sentence1[-1]):
+            if word in allCandidates and word not in exclude:
+                constrainedCandidates[word] = allCandidates[word]
 
         return constrainedCandidates
 
@@ -269,6 +270,15 @@ class BigramModel(NGramModel):
 
         return candidates
 
+    def getReverseContext(self, sentence):
+        """
+        Requires: sentence is a list of strings, and len(sentence) >= 1
+        Modifies: nothing
+        Effects:  returns a tuple of the first word of sentence, the
+                  only word getReverseCandidateDictionary looks at
+        """
+        return (sentence[0],)
+
     def getRhymables(self, sentence):
         """
         Requires: sentence is a list of strings and rhymeLibrary
@@ -282,10 +292,6 @@ class BigramModel(NGramModel):
                   chorus can rhyme
         """
 
-        # opens rhymeLibrary and loads the dictionary into rhyme_dict
-        rhyme_library = open('rhymeLibrary.txt', 'r')
-        rhyme_dict = pickle.load(rhyme_library)
-
         # makes allCandidates the returned dictionary of getCandidateDictionary
         allCandidates = self.getCandidateDictionary(sentence)
 
@@ -294,26 +300,18 @@ class BigramModel(NGramModel):
         if exclude in allCandidates:
             del allCandidates[exclude]
 
-        keys = allCandidates.keys()
-
         # makes constrainedCandidates an empty dictionary
         constrainedCandidates = {}
 
-        # assigns update function to update to avoid calling
-        # dot operator in every loop, which enhances efficiency
-        update = constrainedCandidates.update
-
-        # checks if any of the words in allCandidates
-        # rhymes with the last word in sentence1.
-        # if so, updates constrainedCandidates with
-        # that key value pair
-        for i in range(len(keys)):
-            rhyming_list = rhyme_dict[keys[i]]
-            for j in range(len(rhyming_list)):
-                word = rhyming_list[j]
-                if word in self.nGramCounts:
-                    if '$:::$' in self.nGramCounts[word]:        # ensures that a rhyming word can
-                        update({word: allCandidates[keys[i]]})   # be chosen in subsequent lines
+        # for every candidate, adds the rhyming words in
+        # self.nGramCounts that can end a line to
+        # constrainedCandidates. this ensures that a rhyming
+        # word can be chosen in subsequent lines
+        for key in allCandidates:
+            count = allCandidates[key]
+            for word in self.getVocabularyRhymes(key):
+                if '$:::$' in self.nGramCounts[word]:
+                    constrainedCandidates[word] = count
 
         return constrainedCandidates
 
@@ -0,0 +1,117 @@
+# -----------------------------------------------------------------------------
+# ModelChain class ------------------------------------------------------------
+# A list of n-gram models in descending priority, tri-, then bi-, then
+# unigrams, that can tell which of them to use for a sentence with a single
+# dictionary lookup. selectNGramModel and selectReverseNGramModel in
+# generate.py would otherwise ask every model in turn, for every word.
+# resolve goes one step further and returns the sampler of the next word
+# straight away, which is all generateSentence needs to draw it.
+#
+# The first time it is needed, every (word1, word2) context of the trigram
+# model is entered in a backoff table, forward and reverse, as a context the
+# trigram model answers. any other context is resolved the slow way the
+# first time it comes up and remembered from then on. the tables are kept
+# on the trigram model, which forgets them whenever it is trained again.
+
+class ModelChain(list):
+
+    def backoffTables(self):
+        """
+        Requires: self[0] is the highest order model of the chain
+        Modifies: self[0].backoffTables
+        Effects:  returns the forward and reverse backoff tables, which
+                  map each context to the model that answers it, and the
+                  table of the forward samplers resolve has looked up,
+                  building them first if the models were trained since
+        """
+        tables = self[0].backoffTables
+        if tables is None:
+            model = self[0]
+            forward = {}
+            for word1, following in model.nGramCounts.items():
+                for word2 in following:
+                    forward[(word1, word2)] = model
+            tables = model.backoffTables = (forward, dict(forward), {})
+        return tables
+
+    def select(self, sentence):
+        """
+        Requires: sentence is a list of strings
+        Modifies: the forward backoff table
+        Effects:  returns the first model of the chain whose
+                  trainingDataHasNGram is True for sentence, or None,
+                  exactly as selectNGramModel would
+        """
+        if len(sentence) < 2:
+            return self.search(sentence)
+
+        table = self.backoffTables()[0]
+        context = (sentence[-2], sentence[-1])
+        try:
+            return table[context]
+        except KeyError:
+            model = table[context] = self.search(sentence)
+            return model
+
+    def selectReverse(self, sentence):
+        """
+        Requires: sentence is a list of strings, and len(sentence) >= 2
+        Modifies: the reverse backoff table
+        Effects:  returns the first model of the chain whose
+                  trainingDataHasReverseNGram is True for sentence, or
+                  None, exactly as selectReverseNGramModel would
+        """
+        table = self.backoffTables()[1]
+        context = (sentence[1], sentence[0])
+        try:
+            return table[context]
+        except KeyError:
+            model = table[context] = self.searchReverse(sentence)
+            return model
+
+    def resolve(self, sentence):
+        """
+        Requires: sentence is a list of strings
+        Modifies: the backoff tables and the samplers of the models
+        Effects:  returns the WeightedSampler of the word after sentence,
+                  from the model select picks, or None if there is no
+                  model for sentence. the sampler of each context is kept
+                  in a table of its own, so after the first time a context
+                  comes up this is a single dictionary lookup
+        """
+        if len(sentence) < 2:
+            model = self.search(sentence)
+            return None if model is None else model.getSampler(sentence)
+
+        table = self.backoffTables()[2]
+        context = (sentence[-2], sentence[-1])
+        try:
+            return table[context]
+        except KeyError:
+            model = self.select(sentence)
+            sampler = table[context] = None if model is None else model.getSampler(sentence)
+            return sampler
+
+    def search(self, sentence):
+        """
+        Requires: sentence is a list of strings
+        Modifies: nothing
+        Effects:  asks each model in turn, the way select does the first
+                  time it sees a context
+        """
+        for model in self:
+            if model.trainingDataHasNGram(sentence):
+                return model
+        return None
+
+    def searchReverse(self, sentence):
+        """
+        Requires: same as selectReverse
+        Modifies: nothing
+        Effects:  asks each model in turn, the way selectReverse does the
+                  first time it sees a context
+        """
+        for model in self:
+            if model.trainingDataHasReverseNGram(sentence):
+                return model
+        return None
@@ -0,0 +1,118 @@
+import os
+import mmap
+import pickle
+import hashlib
+import sys
+sys.path.append('../data')
+from rhymeIndex import *
+
+# -----------------------------------------------------------------------------
+# Model snapshots -------------------------------------------------------------
+# A snapshot is a pickle of the trained lyrics models and the manifest of
+# the songs they were trained on, preceded by a one line header:
+#
+#     LYRICSNAPSHOT <version> <key>\n
+#
+# where key identifies the rhyme library the models' rhyme tables were
+# filled in from. loadSnapshot only returns the snapshot if both the version
+# and the key match; whether the lyrics themselves changed is worked out
+# from the manifest (see trainLyricsModels in generate.py).
+
+SNAPSHOT_MAGIC = b'LYRICSNAPSHOT'
+
+# bump this whenever the pickled layout of the snapshot changes
+SNAPSHOT_VERSION = 4
+
+
+def fileDigest(fileName):
+    """
+    Requires: nothing
+    Modifies: nothing
+    Effects:  returns the sha1 hex digest of the contents of fileName,
+              or '' if fileName doesn't exist
+    """
+    if not os.path.exists(fileName):
+        return ''
+    digest = hashlib.sha1()
+    input_file = open(fileName, 'rb')
+    for chunk in iter(lambda: input_file.read(1 << 16), b''):
+        digest.update(chunk)
+    input_file.close()
+    return digest.hexdigest()
+
+def snapshotKey():
+    """
+    Requires: nothing
+    Modifies: nothing
+    Effects:  returns the key a snapshot is saved under, which is the
+              digest of the rhyme library used by the process-wide
+              RhymeIndex (or of its compact index, if only that exists)
+    """
+    rhymeIndex = getRhymeIndex()
+    rhymeFile = rhymeIndex.fileName
+    if not os.path.exists(rhymeFile):
+        rhymeFile = rhymeIndex.indexFileName
+    return fileDigest(rhymeFile) or 'none'
+
+def saveSnapshot(fileName, snapshot, key):
+    """
+    Requires: snapshot is a (models, manifest) tuple, see trainLyricsModels,
+              and key was returned by snapshotKey
+    Modifies: the file fileName
+    Effects:  pickles snapshot to fileName behind the snapshot header. the
+              file is written next to fileName first and then renamed
+              over it, so a reader never sees a half written snapshot
+    """
+    header = b' '.join([SNAPSHOT_MAGIC, str(SNAPSHOT_VERSION).encode('ascii'),
+                        key.encode('ascii')]) + b'\n'
+
+    tempName = fileName + '.tmp'
+    snapshot_file = open(tempName, 'wb')
+    snapshot_file.write(header)
+    pickle.dump(snapshot, snapshot_file, pickle.HIGHEST_PROTOCOL)
+    snapshot_file.close()
+    os.replace(tempName, fileName)
+
+def loadSnapshot(fileName, key):
+    """
+    Requires: nothing
+    Modifies: nothing
+    Effects:  returns the snapshot saved in fileName by saveSnapshot, or
+              None if fileName doesn't exist, isn't a snapshot, or was
+              saved with a different SNAPSHOT_VERSION or key.
+
+              the file is memory-mapped and unpickled straight out of
+              the mapping, so it is never copied into a buffer first.
+    """
+    if not os.path.exists(fileName) or os.path.getsize(fileName) == 0:
+        return None
+
+    snapshot_file = open(fileName, 'rb')
+    try:
+        snapshot = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            header = snapshot.readline().split()
+            if header != [SNAPSHOT_MAGIC, str(SNAPSHOT_VERSION).encode('ascii'),
+                          key.encode('ascii')]:
+                return None
+            return pickle.load(snapshot)
+        except (pickle.UnpicklingError, EOFError):
+            # a truncated or corrupted snapshot is as good as none
+            return None
+        finally:
+            snapshot.close()
+    finally:
+        snapshot_file.close()
+
+
+# -----------------------------------------------------------------------------
+# Testing code ----------------------------------------------------------------
+
+if __name__ == '__main__':
+    from unigramModel import *
+    unigramModel = UnigramModel()
+    unigramModel.trainModel([['the', 'quick', 'brown', 'fox']])
+    saveSnapshot('test.snapshot', ([[unigramModel], [unigramModel]], {}), 'test')
+    print(loadSnapshot('test.snapshot', 'test')[0][0][0].nGramCounts)
+    print(loadSnapshot('test.snapshot', 'other'))
+    os.remove('test.snapshot')
@@ -1,7 +1,9 @@
 import random
 import sys
 sys.path.append('../data')
-import copy
+from rhymeIndex import *
+from weightedSampler import *
+from packedCounts import *
 
 
 
@@ -12,6 +14,10 @@ import copy
 
 class NGramModel(object):
 
+    # the packedCounts class that compact uses for this model's
+    # nGramCounts, or None if the counts are already flat
+    packedCountsClass = None
+
     def __init__(self):
         """
         Requires: nothing
@@ -20,8 +26,23 @@ class NGramModel(object):
                   dictionary as a member variable. It is called from the
                   constructors of the NGramModel child classes. This
                   function is done for you.
+
+                  self.rhymeTable memoizes getVocabularyRhymes, and
+                  self.samplers and self.reverseSamplers hold a
+                  WeightedSampler for each context getNextToken and
+                  getNextReverseToken have seen. self.reachability is
+                  the ReachabilityTable of a reverse trigram model, once
+                  it has been built (see reachability.py), and
+                  self.backoffTables the backoff tables of the ModelChain
+                  this model heads (see modelChain.py). all of them are
+                  cleared by clearCaches whenever the model is trained.
         """
         self.nGramCounts = {}
+        self.rhymeTable = {}
+        self.samplers = {}
+        self.reverseSamplers = {}
+        self.reachability = None
+        self.backoffTables = None
 
     def __str__(self):
         """
@@ -47,16 +68,9 @@ class NGramModel(object):
                   parameter in this function.
         """
 
-        # Makes copy of list text
-        textCopy = copy.deepcopy(text)
-
-        # iterates through textCopy and inserts/appends symbols
-        for i in range(len(textCopy)):
-            textCopy[i].insert(0, '^:::^')
-            textCopy[i].insert(0, '^::^')
-            textCopy[i].append('$:::$')
-
-        return textCopy
+        # builds a new padded list for every line,
+        # so text itself is never modified
+        return [prepLine(line) for line in text]
 
     def trainModel(self, text):
         """
@@ -69,6 +83,43 @@ class NGramModel(object):
         """
         return
 
+    def countNGrams(self, line, count=1):
+        """
+        Requires: line is a list of strings that has already been
+                  through prepLine, or prepReverseLine for a
+                  rhyming model
+        Modifies: self.nGramCounts
+        Effects:  adds count to every n-gram in line in self.nGramCounts,
+                  where a negative count subtracts line back out. this is
+                  what trainModel and trainRhymingModel do for each line,
+                  and what trainModels does for several models at once.
+                  It does not need to be modified here because you will
+                  override it in the NGramModel child classes.
+
+                  the caller is responsible for calling expand before and
+                  clearCaches after counting.
+        """
+        return
+
+    def mergeCounts(self, other):
+        """
+        Requires: other is a trained model of the same class as self,
+                  and neither model is compacted
+        Modifies: self.nGramCounts, other.nGramCounts
+        Effects:  adds every count of other to self.nGramCounts, leaving
+                  self as if it had also been trained on other's text.
+                  this is how the counts of worker processes are combined
+                  (see trainLyricsParallel in generate.py). rows of other
+                  may be taken over rather than copied, so other must not
+                  be used afterwards. It does not need to be modified here
+                  because you will override it in the NGramModel child
+                  classes.
+
+                  the caller is responsible for calling clearCaches after
+                  merging.
+        """
+        return
+
     def trainingDataHasNGram(self, sentence):
         """
         Requires: sentence is a list of strings, and trainingDataHasNGram
@@ -93,55 +144,205 @@ class NGramModel(object):
         """
         return {}
 
-    def weightedChoice(self, candidates):
+    def getContext(self, sentence):
         """
-        Requires: candidates is a dictionary; the keys of candidates are items
-                  you want to choose from and the values are integers
+        Requires: sentence is a list of strings
         Modifies: nothing
-        Effects:  returns a candidate item (a key in the candidates dictionary)
-                  based on the algorithm described in the spec.
+        Effects:  returns a tuple of the words of sentence that
+                  getCandidateDictionary depends on. two sentences with
+                  the same context have the same candidates. this
+                  function does not need to be modified because you
+                  will override it in the NGramModel child classes.
         """
+        return ()
 
-        # Assigns copy of dictionary candidates to cumulative
-        cumulative = copy.deepcopy(candidates)
+    def getReverseContext(self, sentence):
+        """
+        Requires: sentence is a list of strings
+        Modifies: nothing
+        Effects:  exactly the same as getContext, except for
+                  getReverseCandidateDictionary
+        """
+        return ()
 
-        # Creates list of cumulative's keys
-        keys = cumulative.keys()
+    def weightedChoice(self, candidates, rng=random):
+        """
+        Requires: candidates is a dictionary; the keys of candidates are items
+                  you want to choose from and the values are integers.
+                  rng is a random number generator, see weightedSampler.py
+        Modifies: the state of rng
+        Effects:  returns a candidate item (a key in the candidates dictionary)
+                  based on the algorithm described in the spec.
+        """
+        rng = asRandom(rng)
 
-        # Updates cumulatives' cumulative values
-        if len(cumulative) > 1:
-            i = 1
-            while i in range(len(cumulative)):
-                cumulative[keys[i]] = cumulative[keys[i]] + cumulative[keys[i - 1]]
-                i += 1
+        # draws a random int in the range 0 - the sum of the counts,
+        # then walks the candidates subtracting each count from x
+        # and returns the key whose count takes x below zero.
+        # the candidates are neither copied nor modified
+        x = rng.randrange(sum(candidates.values())) if candidates else -1
 
-        # Used for assinging a random int to x
-        values = cumulative.values()
+        for key in candidates:
+            x -= candidates[key]
+            if x < 0:
+                return key
 
-        # Assigns random int in range min(values) - max(values) to x
-        if len(cumulative) > 1:
-            x = random.randrange(min(values), max(values))
-        else:
-            x = values[0]
+        # there is nothing to choose from
+        raise IndexError('no candidates to choose from')
 
-        # Iterates through cumulative's values
-        # comparing each to x, then returns
-        # first key with a value greater than x
-        for i in range(len(cumulative)):
-            if x <= cumulative[keys[i]]:
-                return keys[i]
+    def clearCaches(self):
+        """
+        Requires: nothing
+        Modifies: self.rhymeTable, self.samplers, self.reverseSamplers,
+                  self.reachability, self.backoffTables
+        Effects:  forgets everything that was computed from
+                  self.nGramCounts. must be called whenever
+                  self.nGramCounts changes
+        """
+        self.rhymeTable = {}
+        self.samplers = {}
+        self.reverseSamplers = {}
+        self.reachability = None
+        self.backoffTables = None
 
-    def getNextToken(self, sentence):
+    def __getstate__(self):
         """
-        Requires: sentence is a list of strings, and this model can be used to
-                  choose the next token for the current sentence
+        Requires: nothing
         Modifies: nothing
+        Effects:  returns the attributes to pickle, e.g. in a model
+                  snapshot. the samplers are left out because they are
+                  cheap to rebuild and only cover the contexts this
+                  process happened to see, and the reachability and
+                  backoff tables because they are rebuilt the first time
+                  they are needed
+        """
+        state = self.__dict__.copy()
+        state['samplers'] = {}
+        state['reverseSamplers'] = {}
+        state['reachability'] = None
+        state['backoffTables'] = None
+        return state
+
+    def updateCaches(self, lineWords, changedWords):
+        """
+        Requires: lineWords is a set of every word in the lines just added
+                  to or subtracted from self.nGramCounts, and changedWords
+                  is the set of words that became or stopped being keys
+                  of self.nGramCounts because of it
+        Modifies: self.rhymeTable, self.samplers, self.reverseSamplers,
+                  self.reachability, self.backoffTables
+        Effects:  the incremental version of clearCaches. only the
+                  samplers of contexts made entirely of lineWords can
+                  have changed, and only the rhyme table entries of words
+                  that rhyme with one of changedWords, so everything
+                  else is kept. any line can change the reachability and
+                  backoff tables, so they are always forgotten
+        """
+        self.reachability = None
+        self.backoffTables = None
+        for samplers in [self.samplers, self.reverseSamplers]:
+            for context in list(samplers):
+                if all(word in lineWords for word in context):
+                    del samplers[context]
+
+        if changedWords:
+            rhymeIndex = getRhymeIndex()
+            for word in list(self.rhymeTable):
+                if any(rhymeIndex.rhymes(word, changed) for changed in changedWords):
+                    del self.rhymeTable[word]
+
+    def compact(self, vocabulary):
+        """
+        Requires: this model has been trained and vocabulary is a
+                  Vocabulary (see packedCounts.py), usually shared by
+                  all of the models trained on the same lyrics
+        Modifies: self.nGramCounts, vocabulary
+        Effects:  replaces self.nGramCounts with the read-only,
+                  integer-encoded packedCountsClass version of it. every
+                  other function keeps working because the packed counts
+                  answer the same dictionary lookups. training the model
+                  again expands it back to dictionaries first.
+        """
+        packed = self.packedCountsClass
+        if packed is not None and not isinstance(self.nGramCounts, packed):
+            self.nGramCounts = packed(self.nGramCounts, vocabulary)
+            self.clearCaches()
+        return self.nGramCounts
+
+    def expand(self):
+        """
+        Requires: nothing
+        Modifies: self.nGramCounts
+        Effects:  undoes compact, turning packed counts back into the
+                  dictionaries trainModel and trainRhymingModel update
+        """
+        packed = self.packedCountsClass
+        if packed is not None and isinstance(self.nGramCounts, packed):
+            self.nGramCounts = self.nGramCounts.toDict()
+            self.clearCaches()
+        return self.nGramCounts
+
+    def getVocabularyRhymes(self, word):
+        """
+        Requires: word is a string and rhymeLibrary is a txt file
+                  containing a pickle dictionary.
+                  see README for more info on rhymeLibrary
+        Modifies: self.rhymeTable
+        Effects:  returns a tuple of the words that rhyme with word and
+                  are also keys in self.nGramCounts. the tuple is
+                  computed the first time word is looked up and reused
+                  until the model is trained again
+        """
+        rhymes = self.rhymeTable.get(word)
+        if rhymes is None:
+            nGramCounts = self.nGramCounts
+            rhymes = tuple([rhyme for rhyme in getRhymeIndex().rhymingList(word)
+                            if rhyme in nGramCounts])
+            self.rhymeTable[word] = rhymes
+        return rhymes
+
+    def fillRhymeTable(self):
+        """
+        Requires: rhymeLibrary is a txt file containing a pickle dictionary.
+                  see README for more info on rhymeLibrary
+        Modifies: self.rhymeTable
+        Effects:  looks up getVocabularyRhymes for every key in
+                  self.nGramCounts up front, so that a snapshot of this
+                  model carries its complete rhyme table
+        """
+        for word in self.nGramCounts:
+            self.getVocabularyRhymes(word)
+
+    def getNextToken(self, sentence, rng=random):
+        """
+        Requires: sentence is a list of strings, and this model can be used to
+                  choose the next token for the current sentence. rng is a
+                  random number generator, see weightedSampler.py
+        Modifies: the state of rng, and self.samplers
         Effects:  returns the next token to be added to sentence by calling
                   the getCandidateDictionary and weightedChoice functions.
                   For more information on how to put all these functions
                   together, see the spec.
         """
-        return self.weightedChoice(self.getCandidateDictionary(sentence))
+
+        return self.getSampler(sentence).choose(rng)
+
+    def getSampler(self, sentence):
+        """
+        Requires: same as getNextToken
+        Modifies: self.samplers
+        Effects:  returns the WeightedSampler of the candidates
+                  getCandidateDictionary gives for sentence
+        """
+
+        # the candidates only depend on the sentence's context, so each
+        # context's candidate dictionary is frozen into a sampler once
+        context = self.getContext(sentence)
+        sampler = self.samplers.get(context)
+        if sampler is None:
+            sampler = WeightedSampler(self.getCandidateDictionary(sentence))
+            self.samplers[context] = sampler
+        return sampler
 
     def prepRhymingData(self, text):
         """
@@ -155,15 +356,9 @@ class NGramModel(object):
                   same ending sentence conditions
         """
 
-        # makes text_copy a copy of list text
-        text_copy = copy.deepcopy(text)
-
-        # iterates through textCopy and inserts/appends symbols
-        for i in range(len(text_copy)):
-            text_copy[i].insert(0, '$:::$')
-            text_copy[i].append('$:::$')
-
-        return text_copy
+        # builds a new sandwiched list for every line,
+        # so text itself is never modified
+        return [prepRhymingLine(line) for line in text]
 
     def trainRhymingModel(self, text):
         """
@@ -233,36 +428,167 @@ class NGramModel(object):
         """
         return {}
 
-    def getNextRhymingToken(self, sentence1, sentence2):
+    def getNextRhymingToken(self, sentence1, sentence2, finalLine=False, rng=random):
         """
         Requires: same as getNextToken
-        Modifies: nothing
+        Modifies: the state of rng
         Effects:  this function operates exactly like getNextToken,
                   except that it is only used for the last word of a
                   sentence and calls getRhymingCandidateDictionary instead
                   of getCandidateDictionary. it will return a word that makes
                   sentence rhyme with the compared sentence
         """
-        return self.weightedChoice(self.getRhymingCandidateDictionary(sentence1, sentence2))
+        return self.weightedChoice(self.getRhymingCandidateDictionary(sentence1, sentence2, finalLine), rng)
 
-    def getNextReverseToken(self, sentence):
+    def getNextReverseToken(self, sentence, rng=random):
         """
         Requires: same as getNextToken
-        Modifies: nothing
+        Modifies: the state of rng, and self.reverseSamplers
         Effects:  this function operates like the other NextToken functions
                   except that it is used to generate a sentence in reverse order
         """
-        return self.weightedChoice(self.getReverseCandidateDictionary(sentence))
 
-    def getNextRhymable(self, sentence):
+        return self.getReverseSampler(sentence).choose(rng)
+
+    def getReverseSampler(self, sentence):
+        """
+        Requires: same as getNextReverseToken
+        Modifies: self.reverseSamplers
+        Effects:  same as getSampler, except with the reverse context
+        """
+        context = self.getReverseContext(sentence)
+        sampler = self.reverseSamplers.get(context)
+        if sampler is None:
+            sampler = WeightedSampler(self.getReverseCandidateDictionary(sentence))
+            self.reverseSamplers[context] = sampler
+        return sampler
+
+    def getNextRhymable(self, sentence, rng=random):
         """
         Requires: same as getNextToken
-        Modifies: nothing
+        Modifies: the state of rng
         Effects:  this function operates exactly like getNextRhymingToken,
                   except that it is only used for the last word of the first
                   line of a verse or chorus
         """
-        return self.weightedChoice(self.getRhymables(sentence))
+        return self.weightedChoice(self.getRhymables(sentence), rng)
+
+
+# -----------------------------------------------------------------------------
+# Training helpers ------------------------------------------------------------
+
+def prepLine(line):
+    """
+    Requires: line is a list of strings
+    Modifies: nothing
+    Effects:  returns a new list of the words of line that starts with
+              '^::^' and '^:::^' and ends with '$:::$'
+    """
+    return ['^::^', '^:::^'] + line + ['$:::$']
+
+def prepRhymingLine(line):
+    """
+    Requires: line is a list of strings
+    Modifies: nothing
+    Effects:  returns a new list of the words of line sandwiched
+              between two '$:::$' symbols
+    """
+    return ['$:::$'] + line + ['$:::$']
+
+def prepReverseLine(line):
+    """
+    Requires: line is a list of strings
+    Modifies: nothing
+    Effects:  returns prepRhymingLine(line) read backwards. counting the
+              n-grams of this list in order is how the rhyming models
+              are trained to generate lines from the end
+    """
+    return ['$:::$'] + line[::-1] + ['$:::$']
+
+def trainModels(text, models, reverseModels=()):
+    """
+    Requires: text is an iterable of lists of strings, models and
+              reverseModels are lists of NGramModel objects
+    Modifies: the nGramCounts of every model in models and reverseModels
+    Effects:  trains every model in models as trainModel would, and every
+              model in reverseModels as trainRhymingModel would, in a
+              single pass over text. each line is padded once for all of
+              the models and text is never copied, so text can also be a
+              generator that yields one line at a time.
+
+              models that appear in both lists are only trained once,
+              as a forward model.
+    """
+    models = list(models)
+    reverseModels = [model for model in reverseModels if model not in models]
+    for model in models + reverseModels:
+        model.expand()
+
+    countText(text, models, reverseModels, 1)
+
+    # counts changed, so cached rhyme tables and samplers are out of date
+    for model in models + reverseModels:
+        model.clearCaches()
+
+def updateModels(addedText, removedText, models, reverseModels=()):
+    """
+    Requires: addedText and removedText are lists of lists of strings,
+              every line of removedText was trained into the models
+              earlier, and models and reverseModels are the same as
+              for trainModels
+    Modifies: the nGramCounts and caches of every model in models and
+              reverseModels
+    Effects:  takes the n-grams of removedText out of the models and adds
+              the n-grams of addedText, leaving every model with the same
+              counts as if it had been trained from scratch on the
+              updated text. the order of the keys can still differ,
+              since new words and contexts are added at the end, and
+              weightedChoice walks that order, so the words drawn with a
+              given seed may not match those of a fresh model.
+
+              the work is proportional to the size of addedText and
+              removedText, not to everything the models were trained on,
+              and only the caches those lines affect are forgotten (see
+              updateCaches). compacted models are expanded first.
+    """
+    models = list(models)
+    reverseModels = [model for model in reverseModels if model not in models]
+    allModels = models + reverseModels
+    for model in allModels:
+        model.expand()
+
+    # only these words can become or stop being keys of a model
+    lineWords = set(['^::^', '^:::^', '$:::$'])
+    for line in addedText + removedText:
+        lineWords.update(line)
+    keysBefore = [set(word for word in lineWords if word in model.nGramCounts)
+                  for model in allModels]
+
+    countText(removedText, models, reverseModels, -1)
+    countText(addedText, models, reverseModels, 1)
+
+    for model, keys in zip(allModels, keysBefore):
+        keysAfter = set(word for word in lineWords if word in model.nGramCounts)
+        model.updateCaches(lineWords, keys ^ keysAfter)
+
+def countText(text, models, reverseModels, count):
+    """
+    Requires: models and reverseModels have already been expanded and
+              have no models in common
+    Modifies: the nGramCounts of every model in models and reverseModels
+    Effects:  adds count times the n-grams of every line of text to each
+              model in models, and of every reversed line to each model
+              in reverseModels. the caller is responsible for bringing
+              the caches up to date afterwards.
+    """
+    for line in text:
+        forward_line = prepLine(line)
+        for model in models:
+            model.countNGrams(forward_line, count)
+        if reverseModels:
+            reverse_line = prepReverseLine(line)
+            for model in reverseModels:
+                model.countNGrams(reverse_line, count)
 
 
 # -----------------------------------------------------------------------------
@@ -0,0 +1,311 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+# -----------------------------------------------------------------------------
+# Packed n-gram counts --------------------------------------------------------
+# Read-only, integer-encoded replacements for the dict-of-dicts nGramCounts
+# of BigramModel and TrigramModel. Words are interned in a Vocabulary that
+# can be shared by every model, and counts live in flat arrays, so the
+# models keep working through the usual dictionary operations (in, [],
+# keys(), iteration) at a fraction of the memory.
+
+class Vocabulary(object):
+
+    def __init__(self):
+        """
+        Requires: nothing
+        Modifies: self (this instance of the Vocabulary object)
+        Effects:  this is the Vocabulary constructor. self.words[i] is the
+                  word with id i, and self.wordIds maps each word back to
+                  its id. ids are handed out in the order words are interned.
+        """
+        self.words = []
+        self.wordIds = {}
+
+    def __len__(self):
+        return len(self.words)
+
+    def intern(self, word):
+        """
+        Requires: word is a string
+        Modifies: self.words, self.wordIds
+        Effects:  returns the id of word, giving it the next id first
+                  if it hasn't been seen before
+        """
+        i = self.wordIds.get(word)
+        if i is None:
+            i = len(self.words)
+            self.words.append(word)
+            self.wordIds[word] = i
+        return i
+
+    def wordId(self, word):
+        """
+        Requires: word is a string
+        Modifies: nothing
+        Effects:  returns the id of word, or None if it hasn't been interned
+        """
+        return self.wordIds.get(word)
+
+
+class PackedRow(Mapping):
+
+    def __init__(self, vocabulary, ids, counts, lo, hi):
+        """
+        Requires: ids[lo:hi] is sorted and counts[lo:hi] are their counts
+        Modifies: self (this instance of the PackedRow object)
+        Effects:  a read-only {word: count} view of ids[lo:hi]
+        """
+        self.vocabulary = vocabulary
+        self.ids = ids
+        self.counts = counts
+        self.lo = lo
+        self.hi = hi
+
+    def find(self, word):
+        """
+        Requires: word is a string
+        Modifies: nothing
+        Effects:  returns the position of word in self.ids, or -1
+        """
+        i = self.vocabulary.wordIds.get(word)
+        if i is None:
+            return -1
+        k = bisect_left(self.ids, i, self.lo, self.hi)
+        if k < self.hi and self.ids[k] == i:
+            return k
+        return -1
+
+    def __getitem__(self, word):
+        k = self.find(word)
+        if k < 0:
+            raise KeyError(word)
+        return self.counts[k]
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    def __iter__(self):
+        words = self.vocabulary.words
+        for k in range(self.lo, self.hi):
+            yield words[self.ids[k]]
+
+    def __len__(self):
+        return self.hi - self.lo
+
+
+class PackedBigramCounts(Mapping):
+
+    def __init__(self, nGramCounts, vocabulary):
+        """
+        Requires: nGramCounts is a BigramModel's {word1: {word2: count}}
+                  dictionary and vocabulary is a Vocabulary
+        Modifies: vocabulary, which interns every word in nGramCounts
+        Effects:  packs nGramCounts. the word2 ids and counts of word1
+                  are self.nextIds[self.offsets[id]:self.offsets[id + 1]]
+                  and the matching slice of self.counts, with the word2
+                  ids sorted. self.offsets is indexed directly by word
+                  id, so finding word1 is a single array lookup.
+        """
+        rows = {}
+        for word1 in nGramCounts:
+            row = sorted((vocabulary.intern(word2), count)
+                         for word2, count in nGramCounts[word1].items())
+            rows[vocabulary.intern(word1)] = row
+
+        self.vocabulary = vocabulary
+        self.size = len(vocabulary)
+        self.offsets = array('i', [0])
+        self.nextIds = array('i')
+        self.counts = array('i')
+        for i in range(self.size):
+            for j, count in rows.get(i, ()):
+                self.nextIds.append(j)
+                self.counts.append(count)
+            self.offsets.append(len(self.nextIds))
+        self.length = len(rows)
+
+    def range(self, word):
+        """
+        Requires: word is a string
+        Modifies: nothing
+        Effects:  returns (lo, hi) such that word's row is
+                  self.nextIds[lo:hi]. lo == hi if word has no row
+        """
+        i = self.vocabulary.wordIds.get(word)
+        if i is None or i >= self.size:
+            return 0, 0
+        return self.offsets[i], self.offsets[i + 1]
+
+    def __getitem__(self, word):
+        lo, hi = self.range(word)
+        if lo == hi:
+            raise KeyError(word)
+        return PackedRow(self.vocabulary, self.nextIds, self.counts, lo, hi)
+
+    def __contains__(self, word):
+        lo, hi = self.range(word)
+        return lo != hi
+
+    def __iter__(self):
+        words = self.vocabulary.words
+        for i in range(self.size):
+            if self.offsets[i] != self.offsets[i + 1]:
+                yield words[i]
+
+    def __len__(self):
+        return self.length
+
+    def toDict(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns the dict-of-dicts these counts were packed from
+        """
+        return dict((word1, dict(self[word1])) for word1 in self)
+
+
+class PackedTrigramRow(Mapping):
+
+    def __init__(self, counts, lo, hi):
+        """
+        Requires: counts is a PackedTrigramCounts and counts.secondIds[lo:hi]
+                  are the word2 ids of one word1
+        Modifies: self (this instance of the PackedTrigramRow object)
+        Effects:  a read-only {word2: {word3: count}} view of that word1
+        """
+        self.packed = counts
+        self.lo = lo
+        self.hi = hi
+
+    def find(self, word):
+        """
+        Requires: word is a string
+        Modifies: nothing
+        Effects:  returns the position of word in self.packed.secondIds,
+                  or -1
+        """
+        i = self.packed.vocabulary.wordIds.get(word)
+        if i is None:
+            return -1
+        secondIds = self.packed.secondIds
+        k = bisect_left(secondIds, i, self.lo, self.hi)
+        if k < self.hi and secondIds[k] == i:
+            return k
+        return -1
+
+    def __getitem__(self, word):
+        k = self.find(word)
+        if k < 0:
+            raise KeyError(word)
+        packed = self.packed
+        return PackedRow(packed.vocabulary, packed.nextIds, packed.counts,
+                         packed.pairOffsets[k], packed.pairOffsets[k + 1])
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    def __iter__(self):
+        words = self.packed.vocabulary.words
+        for k in range(self.lo, self.hi):
+            yield words[self.packed.secondIds[k]]
+
+    def __len__(self):
+        return self.hi - self.lo
+
+
+class PackedTrigramCounts(Mapping):
+
+    def __init__(self, nGramCounts, vocabulary):
+        """
+        Requires: nGramCounts is a TrigramModel's
+                  {word1: {word2: {word3: count}}} dictionary and
+                  vocabulary is a Vocabulary
+        Modifies: vocabulary, which interns every word in nGramCounts
+        Effects:  packs nGramCounts. the sorted word2 ids of word1 are
+                  self.secondIds[self.firstOffsets[id]:self.firstOffsets[id + 1]],
+                  and the (word1, word2) pair at position k of
+                  self.secondIds has its word3 ids and counts at
+                  self.nextIds[self.pairOffsets[k]:self.pairOffsets[k + 1]]
+                  and the matching slice of self.counts.
+        """
+        rows = {}
+        for word1 in nGramCounts:
+            row = []
+            for word2 in nGramCounts[word1]:
+                inner = sorted((vocabulary.intern(word3), count)
+                               for word3, count in nGramCounts[word1][word2].items())
+                row.append((vocabulary.intern(word2), inner))
+            row.sort(key=lambda pair: pair[0])
+            rows[vocabulary.intern(word1)] = row
+
+        self.vocabulary = vocabulary
+        self.size = len(vocabulary)
+        self.firstOffsets = array('i', [0])
+        self.secondIds = array('i')
+        self.pairOffsets = array('i', [0])
+        self.nextIds = array('i')
+        self.counts = array('i')
+        for i in range(self.size):
+            for j, inner in rows.get(i, ()):
+                self.secondIds.append(j)
+                for k, count in inner:
+                    self.nextIds.append(k)
+                    self.counts.append(count)
+                self.pairOffsets.append(len(self.nextIds))
+            self.firstOffsets.append(len(self.secondIds))
+        self.length = len(rows)
+
+    def range(self, word):
+        """
+        Requires: word is a string
+        Modifies: nothing
+        Effects:  returns (lo, hi) such that word's word2 ids are
+                  self.secondIds[lo:hi]. lo == hi if word has none
+        """
+        i = self.vocabulary.wordIds.get(word)
+        if i is None or i >= self.size:
+            return 0, 0
+        return self.firstOffsets[i], self.firstOffsets[i + 1]
+
+    def __getitem__(self, word):
+        lo, hi = self.range(word)
+        if lo == hi:
+            raise KeyError(word)
+        return PackedTrigramRow(self, lo, hi)
+
+    def __contains__(self, word):
+        lo, hi = self.range(word)
+        return lo != hi
+
+    def __iter__(self):
+        words = self.vocabulary.words
+        for i in range(self.size):
+            if self.firstOffsets[i] != self.firstOffsets[i + 1]:
+                yield words[i]
+
+    def __len__(self):
+        return self.length
+
+    def toDict(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns the dict-of-dicts these counts were packed from
+        """
+        return dict((word1, dict((word2, dict(row[word2])) for word2 in row))
+                    for word1, row in ((word1, self[word1]) for word1 in self))
+
+
+# -----------------------------------------------------------------------------
+# Testing code ----------------------------------------------------------------
+
+if __name__ == '__main__':
+    vocabulary = Vocabulary()
+    bigrams = PackedBigramCounts({'the': {'quick': 1, 'lazy': 2}, 'quick': {'brown': 1}}, vocabulary)
+    print(bigrams.toDict())
+    print('the' in bigrams, 'fox' in bigrams, dict(bigrams['the']))
+    trigrams = PackedTrigramCounts({'the': {'quick': {'brown': 1}, 'lazy': {'dog': 3}}}, vocabulary)
+    print(trigrams.toDict())
+    print('lazy' in trigrams['the'], dict(trigrams['the']['lazy']))
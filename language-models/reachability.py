@@ -0,0 +1,143 @@
+from weightedSampler import *
+
+# -----------------------------------------------------------------------------
+# ReachabilityTable class -----------------------------------------------------
+# Works out ahead of time how a rhyming line can still be finished, so that a
+# line generated backwards from its last word (see
+# generateConstrainedRhymingSentence in generate.py) never has to be thrown away for running too long.
+#
+# The rhyming models read lines backwards, so while a line is being built
+# the next word to choose only depends on its first two words. that pair,
+# (second word, first word), is a state, and the table keeps a bitmask for
+# every state: bit k is set if the line can reach its start ('$:::$') after
+# exactly k more words.
+
+class ReachabilityTable(object):
+
+    def __init__(self, models, maxLength):
+        """
+        Requires: models is the list of rhyming models returned by
+                  trainLyricsModels, in tri-, then bi-, then unigram order,
+                  and maxLength is a non-negative int
+        Modifies: self (this instance of the ReachabilityTable object)
+        Effects:  this is the ReachabilityTable constructor. it finds every
+                  state of the reverse trigram model and fills self.masks
+                  with the bits 0 through maxLength of each one's mask.
+                  this takes maxLength passes over the trigrams.
+
+                  self.samplers caches the samplers choices returns.
+        """
+        self.models = models
+        self.maxLength = maxLength
+        self.masks = {}
+        self.samplers = {}
+
+        # the states each state can move to, and the
+        # states that can be followed by the start of the line
+        successors = {}
+        for word2, following in models[0].nGramCounts.items():
+            for word1 in following:
+                if word1 == '$:::$':
+                    continue
+                state = (word2, word1)
+                candidates = self.candidates(state)
+                successors[state] = [(word1, word) for word in candidates if word != '$:::$']
+                self.masks[state] = 1 if '$:::$' in candidates else 0
+
+        # a state can finish in exactly k words if one of
+        # the states after it can finish in exactly k - 1
+        masks = self.masks
+        for k in range(1, maxLength + 1):
+            previous = 1 << (k - 1)
+            for state, following in successors.items():
+                for next_state in following:
+                    if masks.get(next_state, 0) & previous:
+                        masks[state] |= 1 << k
+                        break
+
+    def candidates(self, state):
+        """
+        Requires: state is a tuple of two strings
+        Modifies: nothing
+        Effects:  returns the candidate dictionary of the word that comes
+                  before the two words of state, from the first rhyming
+                  model that knows them, the same way selectReverseNGramModel
+                  picks the model in generate.py
+        """
+        sentence = [state[1], state[0]]
+        for model in self.models:
+            if model.trainingDataHasReverseNGram(sentence):
+                return model.getReverseCandidateDictionary(sentence)
+        return {}
+
+    def mask(self, state):
+        """
+        Requires: state is a tuple of two strings
+        Modifies: nothing
+        Effects:  returns the mask of state. states the table didn't find,
+                  e.g. those only the unigram model knows, are worked out
+                  from the states that can follow them
+        """
+        mask = self.masks.get(state)
+        if mask is None:
+            mask = 0
+            for word in self.candidates(state):
+                if word == '$:::$':
+                    mask |= 1
+                else:
+                    mask |= self.masks.get((state[1], word), 0) << 1
+            mask &= (1 << (self.maxLength + 1)) - 1
+        return mask
+
+    def canFinish(self, state, fewest, most):
+        """
+        Requires: state is a tuple of two strings and most <= self.maxLength
+        Modifies: nothing
+        Effects:  returns True if the line can reach its start after at
+                  least fewest and at most most more words from state
+        """
+        fewest = max(fewest, 0)
+        if most < fewest:
+            return False
+        window = (1 << (most + 1)) - (1 << fewest)
+        return bool(self.mask(state) & window)
+
+    def choices(self, state, fewest, most):
+        """
+        Requires: same as canFinish
+        Modifies: self.samplers
+        Effects:  returns a WeightedSampler over the candidates of state
+                  that let the line reach its start after at least fewest
+                  and at most most more words, where '$:::$' itself ends
+                  the line after 0. the sampler is built the first time
+                  it is asked for and reused after that
+        """
+        fewest = max(fewest, 0)
+        key = (state, fewest, most)
+        sampler = self.samplers.get(key)
+        if sampler is None:
+            candidates = self.candidates(state)
+            allowed = {}
+            for word in candidates:
+                if word == '$:::$':
+                    if fewest == 0 and most >= 0:
+                        allowed[word] = candidates[word]
+                elif self.canFinish((state[1], word), fewest - 1, most - 1):
+                    allowed[word] = candidates[word]
+            sampler = self.samplers[key] = WeightedSampler(allowed)
+        return sampler
+
+
+def getReachability(models, maxLength):
+    """
+    Requires: same as the ReachabilityTable constructor
+    Modifies: models[0].reachability
+    Effects:  returns a ReachabilityTable of models covering at least
+              maxLength words. it is built the first time it is needed
+              and kept on the reverse trigram model, which forgets it
+              whenever it is trained again
+    """
+    table = models[0].reachability
+    if table is None or table.maxLength < maxLength:
+        table = models[0].reachability = ReachabilityTable(models, maxLength)
+    return table
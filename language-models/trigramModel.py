@@ -1,7 +1,5 @@
 import random
 from nGramModel import *
-import copy
-import pickle
 
 # -----------------------------------------------------------------------------
 # TrigramModel class ----------------------------------------------------------
@@ -10,6 +8,9 @@ import pickle
 
 class TrigramModel(NGramModel):
 
+    # see NGramModel.compact
+    packedCountsClass = PackedTrigramCounts
+
     def __init__(self):
         """
         Requires: nothing
@@ -37,30 +38,70 @@ class TrigramModel(NGramModel):
                   self.nGramCounts. For more details, see the spec.
         """
 
-        # makes a copy of text, then passes it through prepData
-        trigram_text = copy.deepcopy(text)
-        trigram_text = self.prepData(trigram_text)
-
-        # updates self.nGramCounts with trigram frequencies
-        trigram_count = 1
-        for i in range(len(trigram_text)):
-            for j in range(len(trigram_text[i]) - 2):
-                word1 = trigram_text[i][j]       # makes words 1-3 a three-word sequence (a trigram) in text.
-                word2 = trigram_text[i][j + 1]   # loop ensures that every three-word sequence is checked
-                word3 = trigram_text[i][j + 2]
-                if word1 in self.nGramCounts:
-                    if word2 in self.nGramCounts[word1]:
-                        if word3 in self.nGramCounts[word1][word2]:
-                            self.nGramCounts[word1][word2][word3] += 1   # changes only an existing trigram's value
-                        else:   # adds a new third word to an existing bigram
-                            self.nGramCounts[word1][word2].update({word3: trigram_count + 1})
-                    else:   # adds a new bigram to an existing unigram
-                        self.nGramCounts[word1].update({word2: {word3: trigram_count + 1}})
-                else:   # adds a brand new trigram
-                    self.nGramCounts.update({word1: {word2: {word3: trigram_count + 1}}})
+        # packed counts are read-only, so a compacted
+        # model goes back to dictionaries before counting
+        self.expand()
+
+        # counts each line once it has been padded by prepLine
+        for line in text:
+            self.countNGrams(prepLine(line))
+
+        # counts changed, so cached rhyme tables are out of date
+        self.clearCaches()
 
         return self.nGramCounts
 
+    def countNGrams(self, line, count=1):
+        """
+        Requires: line is a list of strings that has been through
+                  prepLine, or prepReverseLine for a rhyming model
+        Modifies: self.nGramCounts
+        Effects:  adds count to the count of every three-word sequence
+                  (a trigram) in line. a negative count takes line back
+                  out of the model, and trigrams whose count drops to
+                  zero are removed entirely
+        """
+        nGramCounts = self.nGramCounts
+        for j in range(len(line) - 2):
+            word1 = line[j]       # makes words 1-3 a three-word sequence (a trigram) in line.
+            word2 = line[j + 1]   # loop ensures that every three-word sequence is checked
+            word3 = line[j + 2]
+            second = nGramCounts.get(word1)
+            if second is None:   # adds a brand new trigram
+                second = nGramCounts[word1] = {}
+            following = second.get(word2)
+            if following is None:   # adds a new bigram to an existing unigram
+                following = second[word2] = {}
+            total = following.get(word3, 0) + count
+            if total > 0:
+                following[word3] = total
+            else:   # the trigram is no longer in the training data
+                following.pop(word3, None)
+                if not following:
+                    del second[word2]
+                    if not second:
+                        del nGramCounts[word1]
+
+    def mergeCounts(self, other):
+        """
+        Requires: same as NGramModel.mergeCounts
+        Modifies: self.nGramCounts, other.nGramCounts
+        Effects:  adds the count of every trigram in other to self
+        """
+        nGramCounts = self.nGramCounts
+        for word1, other_second in other.nGramCounts.items():
+            second = nGramCounts.get(word1)
+            if second is None:   # takes over a word1 self has never seen
+                nGramCounts[word1] = other_second
+                continue
+            for word2, other_following in other_second.items():
+                following = second.get(word2)
+                if following is None:   # takes over a new bigram of word1
+                    second[word2] = other_following
+                    continue
+                for word3, count in other_following.items():
+                    following[word3] = following.get(word3, 0) + count
+
     def trainingDataHasNGram(self, sentence):
         """
         Requires: sentence is a list of strings, and len(sentence) >= 2
@@ -74,8 +115,8 @@ class TrigramModel(NGramModel):
         # in self.nGramCounts, and if it is, checks if the last
         # word in the sentence is also a key in self.nGramCounts,
         # if so, returns true
-        if sentence[-2] in self.nGramCounts.keys():
-            if sentence[-1] in self.nGramCounts[sentence[-2]].keys():
+        if sentence[-2] in self.nGramCounts:
+            if sentence[-1] in self.nGramCounts[sentence[-2]]:
                 return True
         return False
 
@@ -102,6 +143,15 @@ class TrigramModel(NGramModel):
 
         return candidates
 
+    def getContext(self, sentence):
+        """
+        Requires: sentence is a list of strings, and len(sentence) >= 2
+        Modifies: nothing
+        Effects:  returns a tuple of the last two words of sentence,
+                  the only words getCandidateDictionary looks at
+        """
+        return (sentence[-2], sentence[-1])
+
     def trainRhymingModel(self, text):
         """
         Requires: text is a list of lists of strings
@@ -114,28 +164,18 @@ class TrigramModel(NGramModel):
                   going backwards.
         """
 
-        # makes trigram_text a copy of text, then passes it through prepRhymingData
-        trigram_text = copy.deepcopy(text)
-        trigram_text = self.prepRhymingData(trigram_text)
-
-        trigram_count = 1
-        for i in range(len(trigram_text)):   # updates self.nGramCounts with trigram frequencies exactly
-            j = len(trigram_text[i]) - 1     # like trainModel (see lines 45-60), except in reverse
-            while j > 1:
-                word1 = trigram_text[i][j]
-                word2 = trigram_text[i][j - 1]
-                word3 = trigram_text[i][j - 2]
-                if word1 in self.nGramCounts:
-                    if word2 in self.nGramCounts[word1]:
-                        if word3 in self.nGramCounts[word1][word2]:
-                            self.nGramCounts[word1][word2][word3] += 1
-                        else:
-                            self.nGramCounts[word1][word2].update({word3: trigram_count + 1})
-                    else:
-                        self.nGramCounts[word1].update({word2: {word3: trigram_count + 1}})
-                else:
-                    self.nGramCounts.update({word1: {word2: {word3: trigram_count}}})
-                j -= 1
+        # packed counts are read-only, so a compacted
+        # model goes back to dictionaries before counting
+        self.expand()
+
+        # counting a line sandwiched by prepRhymingData from its last
+        # word back to its first is the same as counting it forwards
+        # once it has been reversed, which is what prepReverseLine does
+        for line in text:
+            self.countNGrams(prepReverseLine(line))
+
+        # counts changed, so cached rhyme tables are out of date
+        self.clearCaches()
 
         return self.nGramCounts
 
@@ -149,55 +189,36 @@ class TrigramModel(NGramModel):
                   the next rhyming token for the sentence.
         """
 
-        # opens rhymeLibrary and loads the dictionary into rhyme_dict
-        rhyme_library = open('rhymeLibrary.txt', 'r')
-        rhyme_dict = pickle.load(rhyme_library)
+        # shared rhyme index, the library is only loaded once per process
+        rhymeIndex = getRhymeIndex()
 
-        # checks if the sentence's second to last
-        # word is a key in self.nGramCounts, and
-        # if it is, checks if the last word in the
-        # sentence is a key in keys2,
-        # if so, then checks if self.nGramCounts
-        # contains words that rhyme with that word
-        # if so, returns true
-        if sentence2 is None:   # if there is no rhyme-reference line
-            keys1 = self.nGramCounts.keys()                  # makes keys1 a list of self.nGramCount's keys
-            keys2 = self.nGramCounts[sentence1[-2]].keys()   # and keys2 a list of keys1's keys. then checks
-            if sentence1[-2] in keys1:                       # that the last two words of sentence1 align with
-                if sentence1[-1] in keys2:                   # keys1 and keys2, respectively
-                    rhymable_keys = self.getCandidateDictionary(sentence1).keys()      # makes rhymable_keys a list
-                    if len(rhymable_keys) != 0:                                        # of candidate words. returns
-                        if (len(rhymable_keys) == 1) and ('$:::$' in rhymable_keys):   # false if that list only
-                            return False                                               # contains '$:::$'
-                        else:
-                            for i in range(len(rhymable_keys)):                   # iterates through rhymable_keys and
-                                if rhymable_keys[i] != '$:::$':                   # checks that it contains a word
-                                    rhyming_list = rhyme_dict[rhymable_keys[i]]   # in keys1. this ensures that there
-                                    for j in range(len(rhyming_list)):            # are other words in self.nGramCounts
-                                        word = rhyming_list[j]                    # that rhyme with the word chosen
-                                        if word in keys1:
-                                            return True
-        # checks the same conditions as
-        # above except that it uses sentence1
-        # as the rhyme-reference line
+        # with no rhyme-reference line, the last two words of sentence1
+        # are the context. otherwise the last two words of sentence2 are,
+        # and the rhyme must also rhyme with the last word of sentence1
+        if sentence2 is None:
+            context = sentence1
         else:
-            keys1 = self.nGramCounts.keys()
-            keys2 = self.nGramCounts[sentence2[-2]].keys()
-            if sentence2[-2] in keys1:
-                if sentence2[-1] in keys2:
-                    rhymable_keys = self.nGramCounts[sentence2[-2]][sentence2[-1]].keys()
-                    if len(rhymable_keys) != 0:
-                        if (len(rhymable_keys) == 1) and ('$:::$' in rhymable_keys):
-                            return False
-                        else:
-                            for i in range(len(rhymable_keys)):
-                                if rhymable_keys[i] != '$:::$':
-                                    rhyming_list = rhyme_dict[rhymable_keys[i]]
-                                    compare_list = rhyme_dict[sentence1[-1]]
-                                    for j in range(len(rhyming_list)):
-                                        word = rhyming_list[j]
-                                        if (word in keys1) and (word in compare_list):
-                                            return True
+            context = sentence2
+
+        # checks that the last two words of the context align with the
+        # keys of self.nGramCounts and of its inner dictionary,
+        # respectively. if not, there are no candidate words
+        if context[-2] not in self.nGramCounts:
+            return False
+        if context[-1] not in self.nGramCounts[context[-2]]:
+            return False
+        rhymable_keys = self.nGramCounts[context[-2]][context[-1]]
+
+        # iterates through rhymable_keys and checks that one of them
+        # rhymes with a key of self.nGramCounts. this ensures that there
+        # are other words in self.nGramCounts that rhyme with the word
+        # chosen. '$:::$' can't rhyme, so a context whose only candidate
+        # is '$:::$' returns false
+        for key in rhymable_keys:
+            if key != '$:::$':
+                for word in self.getVocabularyRhymes(key):
+                    if sentence2 is None or rhymeIndex.rhymes(sentence1[-1], word):
+                        return True
 
         return False
 
@@ -215,8 +236,8 @@ class TrigramModel(NGramModel):
         # if it is, checks if the first word in the
         # sentence is a key in self.nGramCounts[sentence[1]],
         # if so, returns true
-        if sentence[1] in self.nGramCounts.keys():
-            if sentence[0] in self.nGramCounts[sentence[1]].keys():
+        if sentence[1] in self.nGramCounts:
+            if sentence[0] in self.nGramCounts[sentence[1]]:
                 return True
         return False
 
@@ -231,9 +252,8 @@ class TrigramModel(NGramModel):
                   of the compared sentence.
         """
 
-        # opens rhymeLibrary and loads the dictionary into rhyme_dict
-        rhyme_library = open('rhymeLibrary.txt', 'r')
-        rhyme_dict = pickle.load(rhyme_library)
+        # shared rhyme index, the library is only loaded once per process
+        rhymeIndex = getRhymeIndex()
 
         # makes allCandidates the returned dictionary of getCandidateDictionary
         allCandidates = self.getCandidateDictionary(sentence2)
@@ -250,7 +270,7 @@ class TrigramModel(NGramModel):
                 'for', 'nor', 'and', 'but', 'or', 'although', 'as', 'if',
                 'because', 'than', 'that', 'unless', 'until', 'til', 'when',
                 'where', 'whether', 'which', 'while', 'who', 'both', 'such', 'rather'
-                ]
+            ]
             for i in range(len(bad_endings)):
                 if bad_endings[i] in allCandidates:
                     del allCandidates[bad_endings[i]]
@@ -258,19 +278,14 @@ class TrigramModel(NGramModel):
         # makes constrainedCandidates an empty dictionary
         constrainedCandidates = {}
 
-        # assigns update function to update to avoid calling
-        # dot operator in every loop, which enhances efficiency
-        update = constrainedCandidates.update
-
-        # checks if any of the words in allCandidates
-        # rhyme with the last word in sentence1.
-        # if so, updates constrainedCandidates with
-        # that key value pair
-        rhyming_list = rhyme_dict[sentence1[-1]]
-        for i in range(len(rhyming_list)):
-            word = rhyming_list[i]
-            if word in allCandidates:
-                update({word: allCandidates[word]})
+        # checks if any of the words in allCandidates rhyme with the
+        # last word in sentence1. the first word of a line is never a
+        # key of a reversed TrigramModel, so the candidates are
+        # checked against the rhyme buckets rather than the rhyme table
+        rhyme_word = sentence1[-1]
+        for word in allCandidates:
+            if rhymeIndex.rhymes(rhyme_word, word):
+                constrainedCandidates[word] = allCandidates[word]
 
         return constrainedCandidates
 
@@ -298,6 +313,16 @@ class TrigramModel(NGramModel):
 
         return candidates
 
+    def getReverseContext(self, sentence):
+        """
+        Requires: sentence is a list of strings, and len(sentence) >= 2
+        Modifies: nothing
+        Effects:  returns a tuple of the second and first words of
+                  sentence, the only words getReverseCandidateDictionary
+                  looks at
+        """
+        return (sentence[1], sentence[0])
+
     def getRhymables(self, sentence):
         """
         Requires: sentence is a list of strings and rhymeLibrary
@@ -311,9 +336,8 @@ class TrigramModel(NGramModel):
                   chorus can rhyme
         """
 
-        # opens rhymeLibrary and loads the dictionary into rhyme_dict
-        rhyme_library = open('rhymeLibrary.txt', 'r')
-        rhyme_dict = pickle.load(rhyme_library)
+        # shared rhyme index, the library is only loaded once per process
+        rhymeIndex = getRhymeIndex()
 
         # makes allCandidates the returned dictionary of getCandidateDictionary
         allCandidates = self.getCandidateDictionary(sentence)
@@ -323,25 +347,18 @@ class TrigramModel(NGramModel):
         if exclude in allCandidates:
             del allCandidates[exclude]
 
-        keys = allCandidates.keys()
-
         # makes constrainedCandidates an empty dictionary
         constrainedCandidates = {}
 
-        # assigns update function to update to avoid calling
-        # dot operator in every loop, which enhances efficiency
-        update = constrainedCandidates.update
-
-        # checks if any of the words in allCandidates
-        # rhymes with the last word in sentence.
-        # if so, updates constrainedCandidates with
-        # that key value pair
-        for i in range(len(keys)):
-            rhyming_list = rhyme_dict[keys[i]]
-            for j in range(len(rhyming_list)):
-                word = rhyming_list[j]
-                if word in allCandidates:
-                    update({word: allCandidates[keys[i]]})
+        # checks if any of the words in allCandidates rhymes with
+        # another candidate. if so, updates constrainedCandidates
+        # with the rhyming word and the count of the candidate
+        # it rhymes with
+        for key in allCandidates:
+            count = allCandidates[key]
+            for word in allCandidates:
+                if rhymeIndex.rhymes(key, word):
+                    constrainedCandidates[word] = count
 
         return constrainedCandidates
 
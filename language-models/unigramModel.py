@@ -1,8 +1,6 @@
 import random
 from nGramModel import *
 from collections import Counter
-import copy
-import pickle
 
 # -----------------------------------------------------------------------------
 # UnigramModel class ----------------------------------------------------------
@@ -19,8 +17,14 @@ class UnigramModel(NGramModel):
                   for you. It allows UnigramModel to access the data
                   in the NGramModel class by calling the NGramModel
                   constructor.
+
+                  self.rhymingCandidates memoizes the result of
+                  getRhymingCandidateDictionary, which doesn't depend
+                  on the sentences for a UnigramModel.
         """
         super(UnigramModel, self).__init__()
+        self.nGramCounts = Counter()
+        self.rhymingCandidates = {}
 
     def trainModel(self, text):
         """
@@ -37,20 +41,45 @@ class UnigramModel(NGramModel):
                   self.nGramCounts. For more details, see the spec.
         """
 
-        # Makes a copy of text, then passes it through prepData
-        unigram_text = copy.deepcopy(text)
-        unigram_text = self.prepData(unigram_text)
-
-        # Prevents symbols from being counted
-        exclude = {'^::^', '^:::^'}
+        # starts over from an empty Counter, then counts
+        # each line once it has been through prepLine
+        self.nGramCounts = Counter()
+        for line in text:
+            self.countNGrams(prepLine(line))
 
-        # Uses Counter function with a list comprehension
-        # to make a dictionary of each word and its count
-        self.nGramCounts = Counter(word for sublist in unigram_text
-                                   for word in sublist if word not in exclude)
+        # counts changed, so cached rhyme tables are out of date
+        self.clearCaches()
 
         return self.nGramCounts
 
+    def countNGrams(self, line, count=1):
+        """
+        Requires: line is a list of strings that has been through prepLine
+        Modifies: self.nGramCounts
+        Effects:  adds count to the count of every word in line,
+                  except for the '^::^' and '^:::^' symbols. a negative
+                  count takes line back out of the model, and words
+                  whose count drops to zero are removed entirely
+        """
+        nGramCounts = self.nGramCounts
+        for word in line:
+            if word not in {'^::^', '^:::^'}:   # prevents symbols from being counted
+                total = nGramCounts.get(word, 0) + count
+                if total > 0:
+                    nGramCounts[word] = total
+                else:   # the word is no longer in the training data
+                    nGramCounts.pop(word, None)
+
+    def mergeCounts(self, other):
+        """
+        Requires: same as NGramModel.mergeCounts
+        Modifies: self.nGramCounts
+        Effects:  adds the count of every word in other to self
+        """
+        nGramCounts = self.nGramCounts
+        for word, count in other.nGramCounts.items():
+            nGramCounts[word] = nGramCounts.get(word, 0) + count
+
     def trainingDataHasNGram(self, sentence1):
         """
         Requires: sentence is a list of strings
@@ -105,6 +134,26 @@ class UnigramModel(NGramModel):
             return True
         return False
 
+    def clearCaches(self):
+        """
+        Requires: nothing
+        Modifies: self.rhymeTable, self.rhymingCandidates
+        Effects:  same as NGramModel.clearCaches, and also forgets
+                  the memoized rhyming candidates
+        """
+        super(UnigramModel, self).clearCaches()
+        self.rhymingCandidates = {}
+
+    def updateCaches(self, lineWords, changedWords):
+        """
+        Requires: same as NGramModel.updateCaches
+        Modifies: self.rhymeTable, self.samplers, self.rhymingCandidates
+        Effects:  same as NGramModel.updateCaches. the rhyming candidates
+                  depend on every count, so they are always forgotten
+        """
+        super(UnigramModel, self).updateCaches(lineWords, changedWords)
+        self.rhymingCandidates = {}
+
     def getRhymingCandidateDictionary(self, sentence1, sentence2, finalLine=False):
         """
         Requires: same as getCandidateDictionary and rhymeLibrary
@@ -116,49 +165,41 @@ class UnigramModel(NGramModel):
                   of the compared sentence.
         """
 
-        # opens rhymeLibrary and loads the dictionary into rhyme_dict
-        rhyme_library = open('rhymeLibrary.txt', 'r')
-        rhyme_dict = pickle.load(rhyme_library)
+        # the candidates don't depend on either sentence, so they
+        # are only filtered once for each value of finalLine.
+        # callers must not modify the returned dictionary
+        if finalLine in self.rhymingCandidates:
+            return self.rhymingCandidates[finalLine]
 
         # makes allCandidates the returned dictionary of getCandidateDictionary
         allCandidates = self.getCandidateDictionary(sentence2)
 
         # filters out '$:::$', it can't rhyme so shouldn't be included
-        exclude = '$:::$'
-        if exclude in allCandidates:
-            del allCandidates[exclude]
+        exclude = {'$:::$'}
 
         # if generating the final line of a stanza,
         # makes sure the last word isn't one of these
         if finalLine:
-            bad_endings = [
+            exclude.update([
                 'for', 'nor', 'and', 'but', 'or', 'although', 'as', 'if',
                 'because', 'than', 'that', 'unless', 'until', 'til', 'when',
                 'where', 'whether', 'which', 'while', 'who', 'both', 'such', 'rather'
-            ]
-            for i in range(len(bad_endings)):
-                if bad_endings[i] in allCandidates:
-                    del allCandidates[bad_endings[i]]
-
-        keys = allCandidates.keys()
+            ])
 
         # makes constrainedCandidates an empty dictionary
         constrainedCandidates = {}
 
-        # assigns update function to update to avoid calling
-        # dot operator in every loop, which enhances efficiency
-        update = constrainedCandidates.update
-
-        # checks if any of the words in allCandidates
-        # rhymes with the last word in sentence1.
-        # if so, updates constrainedCandidates with
-        # that key value pair
-        for i in range(len(keys)):
-            rhyming_list = rhyme_dict[keys[i]]
-            for j in range(len(rhyming_list)):
-                word = rhyming_list[j]
-                if word in self.getDictionary():
-                    update({word: allCandidates[keys[i]]})
+        # for every candidate, adds the words in self.nGramCounts
+        # that rhyme with it to constrainedCandidates. the rhymes
+        # come from the model's own rhyme table, so no rhyme is
+        # checked against self.nGramCounts more than once
+        for key in allCandidates:
+            if key not in exclude:
+                count = allCandidates[key]
+                for word in self.getVocabularyRhymes(key):
+                    constrainedCandidates[word] = count
+
+        self.rhymingCandidates[finalLine] = constrainedCandidates
 
         return constrainedCandidates
 
@@ -185,34 +226,18 @@ class UnigramModel(NGramModel):
                   chorus can rhyme
         """
 
-        # opens rhymeLibrary and loads the dictionary into rhyme_dict
-        rhyme_library = open('rhymeLibrary.txt', 'r')
-        rhyme_dict = pickle.load(rhyme_library)
-
         # makes allCandidates the returned dictionary of getCandidateDictionary
         allCandidates = self.getCandidateDictionary(sentence)
 
-        # filters out '$:::$', it can't rhyme so shouldn't be included
-        exclude = '$:::$'
-        if exclude in allCandidates:
-            del allCandidates[exclude]
-
         # makes constrainedCandidates an empty dictionary
         constrainedCandidates = {}
 
-        # assigns update function to update to avoid calling
-        # dot operator in every loop, which enhances efficiency
-        update = constrainedCandidates.update
-
-        # checks if any of the words in allCandidates
-        # rhymes with the last word in sentence1.
-        # if so, updates constrainedCandidates with
-        # that key value pair
-        rhyming_list = rhyme_dict[sentence[-1]]
-        for i in range(len(rhyming_list)):
-            word = rhyming_list[i]
-            if word in allCandidates:
-                update({word: allCandidates[word]})
+        # the words that rhyme with the last word in sentence and are
+        # candidates. allCandidates is self.nGramCounts, so these are
+        # exactly the entries of the rhyme table. '$:::$' can't rhyme
+        # so it is never among them
+        for word in self.getVocabularyRhymes(sentence[-1]):
+            constrainedCandidates[word] = allCandidates[word]
 
         return constrainedCandidates
 
@@ -0,0 +1,128 @@
+import random
+from array import array
+from bisect import bisect_right
+
+# -----------------------------------------------------------------------------
+# WeightedSampler class -------------------------------------------------------
+# A frozen candidate dictionary that can be sampled from repeatedly
+
+class WeightedSampler(object):
+
+    def __init__(self, candidates):
+        """
+        Requires: candidates is a dictionary; the keys of candidates are items
+                  you want to choose from and the values are positive integers
+        Modifies: self (this instance of the WeightedSampler object)
+        Effects:  this is the WeightedSampler constructor. it freezes the
+                  keys of candidates into self.keys and stores the running
+                  total of their counts in self.cumulative, so that
+                  self.cumulative[i] is the sum of the counts of
+                  self.keys[0] through self.keys[i].
+
+                  later changes to candidates are not seen by the sampler.
+        """
+        self.keys = tuple(candidates)
+        self.cumulative = array('l')
+
+        total = 0
+        for key in self.keys:
+            total += candidates[key]
+            self.cumulative.append(total)
+        self.total = total
+
+    def __len__(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns the number of candidates
+        """
+        return len(self.keys)
+
+    def choose(self, rng=random):
+        """
+        Requires: rng is a random.Random, a numpy.random.Generator, or
+                  the random module itself, see asRandom
+        Modifies: the state of rng
+        Effects:  returns one of self.keys, where each key is chosen with
+                  probability proportional to its count. draws a random
+                  integer in [0, self.total) and binary searches
+                  self.cumulative for it, so a draw is O(log k) and
+                  allocates nothing.
+
+                  raises IndexError if there are no candidates, just as
+                  indexing an empty list would.
+        """
+        rng = asRandom(rng)
+        if self.total <= 0:
+            raise IndexError('no candidates to choose from')
+        return self.keys[bisect_right(self.cumulative, rng.randrange(self.total))]
+
+
+# -----------------------------------------------------------------------------
+# Random number generators ----------------------------------------------------
+# Every function that makes a random choice takes an rng argument, which is
+# anything with the methods of random.Random that are used: randrange,
+# gauss, choice and random. giving each generator its own random.Random
+# keeps concurrent generators independent and makes their output depend on
+# their seed alone. NumPy Generators are wrapped in a GeneratorRandom.
+
+class GeneratorRandom(object):
+
+    def __init__(self, generator):
+        """
+        Requires: generator is a numpy.random.Generator
+        Modifies: self (this instance of the GeneratorRandom object)
+        Effects:  this is the GeneratorRandom constructor. it lets
+                  generator be used anywhere a random.Random can
+        """
+        self.generator = generator
+
+    def random(self):
+        return float(self.generator.random())
+
+    def randrange(self, stop):
+        if stop <= 0:
+            raise ValueError('empty range for randrange()')
+        return int(self.generator.integers(stop))
+
+    def gauss(self, mu, sigma):
+        return float(self.generator.normal(mu, sigma))
+
+    def choice(self, seq):
+        return seq[self.randrange(len(seq))]
+
+    def randranges(self, stop, size):
+        """
+        Requires: stop and size are positive ints
+        Modifies: the state of self.generator
+        Effects:  returns a NumPy array of size draws of randrange(stop),
+                  drawn all at once, for vectorized sampling
+        """
+        return self.generator.integers(stop, size=size)
+
+
+def asRandom(rng):
+    """
+    Requires: rng is None, the random module, a random.Random, or a
+              numpy.random.Generator
+    Modifies: nothing
+    Effects:  returns rng as something every sampling function accepts:
+              the random module if rng is None, a GeneratorRandom if rng
+              is a NumPy Generator, and rng itself otherwise
+    """
+    if rng is None:
+        return random
+    if hasattr(rng, 'randrange'):
+        return rng
+    return GeneratorRandom(rng)
+
+
+# -----------------------------------------------------------------------------
+# Testing code ----------------------------------------------------------------
+
+if __name__ == '__main__':
+    choices = { 'the': 2, 'quick': 1, 'brown': 1 }
+    sampler = WeightedSampler(choices)
+    rng = random.Random(0)
+    draws = [sampler.choose(rng) for i in range(10000)]
+    print(dict((key, draws.count(key)) for key in choices))
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import sys
+import json
+import time
+import random
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from songFarm import *
+
+# -----------------------------------------------------------------------------
+# Lyrics server ---------------------------------------------------------------
+# Serves generation requests to many clients at once over TCP. The models are
+# trained (or loaded from their snapshot) once when the server starts, and
+# the generation itself runs in a pool of worker processes set up the same
+# way as songFarm's, so the event loop is never blocked by it.
+#
+# Each request is one line of JSON, and each response is one line of JSON
+# with the same "id". a connection can send several requests without waiting,
+# and their responses are written as soon as each one is ready. requests:
+#
+#     {"id": 1, "type": "song", "seed": 42}
+#     {"id": 2, "type": "line", "length": 6}
+#
+# "seed" is optional, and the seed that was used is always sent back.
+# "timeout" (a positive number of seconds, counted from when the request
+# arrives) overrides the server's default for that request.
+# lines still being generated when it runs out are finished greedily, and
+# those depend on how busy the server was, so the seed only gives the same
+# response again if "timedOut" is false. responses:
+#
+#     {"id": 1, "ok": true, "seed": 42, "timedOut": false, "song": {...}}
+#     {"id": 2, "ok": true, "seed": 1234, "timedOut": false, "line": ["so", "its", "over"]}
+#     {"id": 3, "ok": false, "error": "timed out after 10 seconds"}
+
+DEFAULT_PORT = 8765
+DEFAULT_TIMEOUT = 10.0
+
+# seconds a response is waited for past its deadline, for the worker to
+# finish the lines it had started greedily and send the result back
+DEADLINE_GRACE = 1.0
+
+
+class LyricsServer(object):
+
+    def __init__(self, models, processes=None, timeout=DEFAULT_TIMEOUT, snapshotFile=None):
+        """
+        Requires: models is a list returned by trainLyricsModels and
+                  processes is None or a positive int. snapshotFile is the
+                  same as for songFarm.farmSongs
+        Modifies: self (this instance of the LyricsServer object)
+        Effects:  this is the LyricsServer constructor. it prepares the
+                  models and starts processes worker processes right away
+                  (one per core if processes is None), but doesn't listen
+                  for connections until serve is called.
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self.timeout = timeout
+
+        prepareModels(models)
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            initargs = (models,)
+        else:
+            context = multiprocessing.get_context()
+            initargs = (None, snapshotFile) if snapshotFile is not None else (models,)
+        self.executor = ProcessPoolExecutor(processes, mp_context=context,
+                                            initializer=initFarmWorker, initargs=initargs)
+
+        # starts the workers now, before there are any client sockets
+        # for forked workers to inherit and keep open
+        self.executor.submit(int).result()
+
+    async def handleRequest(self, request):
+        """
+        Requires: request is a dictionary decoded from one request line
+        Modifies: nothing
+        Effects:  generates what request asks for in a worker process and
+                  returns the response dictionary. the worker is given
+                  the time the request's timeout runs out, counted from
+                  when it arrived, so time spent queued behind other
+                  requests counts too. the worker skips the request if
+                  that time has passed when it gets to it, and otherwise
+                  falls back to greedy lines, so it is done soon after. a
+                  request that isn't done DEADLINE_GRACE seconds after its
+                  timeout gets an error response.
+        """
+        response = {'id': request.get('id')}
+        seed = request.get('seed')
+        if seed is None:
+            seed = random.randrange(2 ** 63)
+        timeout = request.get('timeout', self.timeout)
+        if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not timeout > 0:
+            response.update(ok=False, error='bad request: timeout must be a positive number')
+            return response
+        deadline = time.time() + timeout
+
+        loop = asyncio.get_running_loop()
+        try:
+            if request.get('type') == 'song':
+                job = loop.run_in_executor(self.executor, farmSong, seed, deadline)
+                song = await asyncio.wait_for(job, timeout + DEADLINE_GRACE)
+                response.update(song=song.toDict(), timedOut=song.timedOut())
+            elif request.get('type') == 'line':
+                length = int(request.get('length', 6))
+                job = loop.run_in_executor(self.executor, farmLine, seed, length, deadline)
+                response['line'], response['timedOut'] = await asyncio.wait_for(job, timeout + DEADLINE_GRACE)
+            else:
+                raise ValueError('unknown request type {0!r}'.format(request.get('type')))
+        except (asyncio.TimeoutError, TimeoutError):
+            response.update(ok=False, error='timed out after {0} seconds'.format(timeout))
+            return response
+        except Exception as error:
+            response.update(ok=False, error='{0}: {1}'.format(type(error).__name__, error))
+            return response
+
+        response.update(ok=True, seed=seed)
+        return response
+
+    async def handleConnection(self, reader, writer):
+        """
+        Requires: reader and writer are the streams of one client connection
+        Modifies: nothing
+        Effects:  reads requests from the connection until the client closes
+                  it, handling each one concurrently with the others, and
+                  writes every response back as soon as it is ready
+        """
+        async def respond(request):
+            response = await self.handleRequest(request)
+            writer.write(json.dumps(response).encode('utf-8') + b'\n')
+            await writer.drain()
+
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line.decode('utf-8'))
+                    if not isinstance(request, dict):
+                        raise ValueError('a request must be a JSON object')
+                except ValueError as error:
+                    writer.write(json.dumps({'id': None, 'ok': False,
+                                             'error': 'bad request: {0}'.format(error)}).encode('utf-8') + b'\n')
+                    await writer.drain()
+                    continue
+                task = asyncio.ensure_future(respond(request))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            # the client is done sending, but still gets its responses
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass   # the client went away first, which is fine
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  listens for connections on host:port and serves them
+                  until the task running this coroutine is cancelled
+        """
+        server = await asyncio.start_server(self.handleConnection, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Requires: nothing
+        Modifies: self.executor
+        Effects:  stops the worker processes
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# -----------------------------------------------------------------------------
+# Main ------------------------------------------------------------------------
+# Usage: python lyricsServer.py [artist] [port]
+
+def main():
+    lyricsDirectory = sys.argv[1] if len(sys.argv) > 1 else 'Coldplay'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT
+    snapshotFile = lyricsDirectory + 'Models.snapshot'
+
+    print('Loading models for', lyricsDirectory, '...')
+    lyricsModels = trainLyricsModels(lyricsDirectory, snapshotFile=snapshotFile)
+    server = LyricsServer(lyricsModels, snapshotFile=snapshotFile)
+
+    print('Serving lyrics on port', port)
+    try:
+        asyncio.run(server.serve(port=port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
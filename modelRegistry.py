@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from generate import *
+
+# -----------------------------------------------------------------------------
+# ModelRegistry class ---------------------------------------------------------
+# Serves the lyrics models of every artist in data/lyrics from one process.
+# An artist's models are trained (or loaded from their snapshot) the first
+# time they are asked for, and the least recently used models are dropped
+# whenever the models kept in memory add up to more than maxBytes. a set of
+# models is measured with deepSizeOf right after it is built and prepared,
+# and again every REMEASURE_EVERY times it is asked for, since the samplers
+# and tables the models cache while generating keep growing after that.
+#
+# models are built and measured outside the registry's lock, so training
+# one artist never holds up callers asking for other artists. callers
+# asking for models that are being built wait for that build instead of
+# starting their own.
+
+# default memory budget for the models a ModelRegistry keeps, in bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# how many times a set of models is returned between measurements
+REMEASURE_EVERY = 64
+
+
+class ModelRegistry(object):
+
+    def __init__(self, maxBytes=DEFAULT_MAX_BYTES, compact=False, snapshotDirectory=None):
+        """
+        Requires: maxBytes is a positive int. snapshotDirectory is None or
+                  an existing directory
+        Modifies: self (this instance of the ModelRegistry object)
+        Effects:  this is the ModelRegistry constructor. nothing is trained
+                  until getModels or getBlendedModels is called.
+
+                  compact is passed on to trainLyricsModels for every
+                  artist. if snapshotDirectory is given, each artist's
+                  models are saved there as <artist>Models.snapshot so
+                  that later processes can start from them.
+
+                  self.models maps the key of every set of models in
+                  memory to (models, size), least recently used first,
+                  and self.totalBytes is the sum of their sizes.
+                  self.uses counts how many times each set of models has
+                  been returned since it was last measured, and
+                  self.building maps the key of every set of models being
+                  built to the Future its other callers wait on. self.lock
+                  guards these, and is never held while models are built
+                  or measured.
+        """
+        self.maxBytes = maxBytes
+        self.compact = compact
+        self.snapshotDirectory = snapshotDirectory
+        self.models = OrderedDict()
+        self.uses = {}
+        self.building = {}
+        self.totalBytes = 0
+        self.lock = threading.Lock()
+
+    def artists(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns the sorted names of every artist in data/lyrics.
+                  the directory is listed again on every call, so artists
+                  added while the registry is running are picked up
+        """
+        return DataLoader().listArtists()
+
+    def snapshotFile(self, artist):
+        """
+        Requires: artist is a string
+        Modifies: nothing
+        Effects:  returns the snapshot file of artist's models, or None if
+                  this registry doesn't save snapshots
+        """
+        if self.snapshotDirectory is None:
+            return None
+        return os.path.join(self.snapshotDirectory, artist + 'Models.snapshot')
+
+    def getModels(self, artist):
+        """
+        Requires: artist is one of self.artists()
+        Modifies: self.models, self.totalBytes
+        Effects:  returns artist's models, as returned by trainLyricsModels.
+                  they are trained or loaded the first time artist is asked
+                  for and kept until they are evicted to stay within
+                  self.maxBytes.
+
+                  raises KeyError if there is no artist directory named
+                  artist.
+        """
+        if artist not in self.models and artist not in self.artists():
+            raise KeyError(artist)
+        return self.getOrBuild(artist, lambda: trainLyricsModels(
+            artist, self.compact, self.snapshotFile(artist)))
+
+    def getBlendedModels(self, artists):
+        """
+        Requires: artists is a list of names in self.artists()
+        Modifies: self.models, self.totalBytes
+        Effects:  returns models trained on the lyrics of every artist in
+                  artists at once, in the same lists as trainLyricsModels.
+                  the blend is cached like a single artist's models, under
+                  the sorted artist names, so asking for the same artists in
+                  any order returns the same models.
+
+                  raises KeyError if any artist has no artist directory,
+                  and ValueError if artists is empty.
+        """
+        artists = sorted(set(artists))
+        if not artists:
+            raise ValueError('there are no artists to blend')
+        if len(artists) == 1:
+            return self.getModels(artists[0])
+
+        key = tuple(artists)
+        if key not in self.models:
+            known = self.artists()
+            for artist in artists:
+                if artist not in known:
+                    raise KeyError(artist)
+        return self.getOrBuild(key, lambda: trainBlendedModels(artists, self.compact))
+
+    def getOrBuild(self, key, build):
+        """
+        Requires: build is a function that takes no arguments and returns
+                  a list of models
+        Modifies: self.models, self.totalBytes
+        Effects:  returns the models cached under key, marking them as the
+                  most recently used. if there are none, calls build,
+                  prepares what it returns (see prepareModels) and caches
+                  it under key. the models are measured then, and again
+                  every REMEASURE_EVERY times they are returned, and each
+                  time the least recently used models are evicted until
+                  the cache fits in self.maxBytes again. the models being
+                  returned are never evicted, even if they don't fit on
+                  their own.
+
+                  only one caller builds the models under a key at a
+                  time; the others wait for it and get the same models,
+                  or the same exception if build raised one.
+        """
+        with self.lock:
+            cached = self.models.get(key)
+            if cached is not None:
+                self.models.move_to_end(key)
+                self.uses[key] += 1
+                remeasure = self.uses[key] >= REMEASURE_EVERY
+                if remeasure:
+                    self.uses[key] = 0
+            else:
+                future = self.building.get(key)
+                builder = future is None
+                if builder:
+                    future = self.building[key] = Future()
+
+        if cached is not None:
+            if remeasure:
+                self.resize(key, cached[0], deepSizeOf(cached[0]))
+            return cached[0]
+        if not builder:
+            return future.result()
+
+        try:
+            models = build()
+            prepareModels(models)
+            size = deepSizeOf(models)
+        except BaseException as error:
+            with self.lock:
+                del self.building[key]
+            future.set_exception(error)
+            raise
+
+        with self.lock:
+            del self.building[key]
+            self.models[key] = (models, 0)
+            self.uses[key] = 0
+        self.resize(key, models, size)
+        future.set_result(models)
+        return models
+
+    def resize(self, key, models, size):
+        """
+        Requires: size is what deepSizeOf measured models at
+        Modifies: self.models, self.uses, self.totalBytes
+        Effects:  records size as the size of models, if they are still
+                  cached under key, then evicts the least recently used
+                  models other than them until the cache fits in
+                  self.maxBytes, or only they are left.
+        """
+        with self.lock:
+            cached = self.models.get(key)
+            if cached is None or cached[0] is not models:
+                return   # evicted while they were being measured
+            self.totalBytes += size - cached[1]
+            self.models[key] = (models, size)
+
+            while self.totalBytes > self.maxBytes and len(self.models) > 1:
+                evicted = next(other for other in self.models if other != key)
+                del self.uses[evicted]
+                self.totalBytes -= self.models.pop(evicted)[1]
+
+    def evict(self, key):
+        """
+        Requires: key is an artist name or a tuple of artist names
+        Modifies: self.models, self.totalBytes
+        Effects:  drops the models cached under key, if there are any,
+                  e.g. after that artist's lyrics were retrained elsewhere
+        """
+        with self.lock:
+            if isinstance(key, (list, tuple)):
+                key = tuple(sorted(set(key)))
+                if len(key) == 1:
+                    key = key[0]
+            cached = self.models.pop(key, None)
+            if cached is not None:
+                del self.uses[key]
+                self.totalBytes -= cached[1]
+
+
+# -----------------------------------------------------------------------------
+# Helpers ---------------------------------------------------------------------
+
+def trainBlendedModels(artists, compact=False):
+    """
+    Requires: artists is a non-empty list of artist directory names
+    Modifies: nothing
+    Effects:  trains the lyrics models on every song of every artist in
+              artists, in that order, by training each artist separately
+              and merging the counts. returns them in the same lists as
+              trainLyricsModels
+    """
+    models = None
+    for artist in artists:
+        artist_models = trainLyricsShard(artist)
+        if models is None:
+            models = artist_models
+        else:
+            for model, artist_model in zip(models[0] + models[1][:2],
+                                           artist_models[0] + artist_models[1][:2]):
+                model.mergeCounts(artist_model)
+
+    # counts changed, so cached rhyme tables and samplers are out of date
+    for model in models[0] + models[1][:2]:
+        model.clearCaches()
+
+    compactLyricsModels(models, compact)
+    return models
+
+def deepSizeOf(obj, seen=None):
+    """
+    Requires: nothing
+    Modifies: seen
+    Effects:  returns the number of bytes used by obj and everything it
+              refers to, counting each object only once. containers are
+              copied before they are walked, so that models being
+              generated from in other threads can be measured.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in list(obj.items()):
+            size += deepSizeOf(key, seen) + deepSizeOf(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in list(obj):
+            size += deepSizeOf(item, seen)
+    elif hasattr(obj, '__dict__'):
+        size += deepSizeOf(obj.__dict__, seen)
+    return size
+
+
+# -----------------------------------------------------------------------------
+# Testing code ----------------------------------------------------------------
+
+if __name__ == '__main__':
+    registry = ModelRegistry()
+    print(registry.artists())
+    for artist in registry.artists():
+        registry.getModels(artist)
+        print(artist, registry.totalBytes)
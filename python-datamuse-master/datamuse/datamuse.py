@@ -1,9 +1,200 @@
 import json
+import time
+import sqlite3
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlencode
 import requests
+from requests.adapters import HTTPAdapter
+
+# responses worth asking again for, as they are usually gone a moment later
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# how long a cached response is used for, in seconds, and how many bytes
+# of responses a cache keeps
+DEFAULT_TTL = 90 * 24 * 60 * 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class ResponseCache():
+    def __init__(self, path, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        """A cache of API responses in the SQLite file at path, which
+        several clients and processes can share.
+        :ttl
+            seconds a response is used for after it was fetched, or None
+            to keep responses until they are evicted
+        :max_bytes
+            once the cached responses add up to more than this, the least
+            recently used ones are evicted
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                                    'key TEXT PRIMARY KEY, body TEXT NOT NULL, '
+                                    'created REAL NOT NULL, accessed REAL NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed '
+                                    'ON responses (accessed)')
+        self.size = self.total_bytes()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def key(endpoint, params):
+        """The same query always has the same key, whatever the order of
+        its params. params that are None are left out, as requests does.
+        """
+        params = sorted((name, value) for name, value in params.items() if value is not None)
+        return endpoint + '?' + urlencode(params)
+
+    def get(self, endpoint, params):
+        """Returns the cached response to the query, or None if there is
+        none or it has expired.
+        """
+        key = self.key(endpoint, params)
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute('SELECT body, created FROM responses WHERE key = ?',
+                                          (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and row[1] + self.ttl <= now:
+                self.connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.size -= len(row[0])
+                return None
+            self.connection.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+        return json.loads(row[0])
+
+    def contains(self, endpoint, params):
+        """Whether get would return a response for the query, without
+        marking it as used.
+        """
+        oldest = 0 if self.ttl is None else time.time() - self.ttl
+        with self.lock:
+            return self.connection.execute('SELECT 1 FROM responses WHERE key = ? AND created > ?',
+                                           (self.key(endpoint, params), oldest)).fetchone() is not None
+
+    def put(self, endpoint, params, data):
+        """Caches data as the response to the query, evicting the least
+        recently used responses if the cache has grown past max_bytes.
+        """
+        key = self.key(endpoint, params)
+        body = json.dumps(data)
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute('SELECT length(body) FROM responses WHERE key = ?',
+                                          (key,)).fetchone()
+            self.connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                                    (key, body, now, now))
+            self.size += len(body) - (row[0] if row else 0)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Drops every expired response, then the least recently used
+        responses until the rest fit in max_bytes.
+        """
+        with self.lock, self.connection:
+            if self.ttl is not None:
+                self.connection.execute('DELETE FROM responses WHERE created <= ?',
+                                        (time.time() - self.ttl,))
+            # other clients may share the file, so this is counted again
+            self.size = self.connection.execute(
+                'SELECT COALESCE(SUM(length(body)), 0) FROM responses').fetchone()[0]
+            if self.max_bytes is None or self.size <= self.max_bytes:
+                return
+            evicted = []
+            for key, length in self.connection.execute(
+                    'SELECT key, length(body) FROM responses ORDER BY accessed'):
+                if self.size <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                self.size -= length
+            self.connection.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+    def total_bytes(self):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COALESCE(SUM(length(body)), 0) FROM responses').fetchone()[0]
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM responses')
+            self.size = 0
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class RateLimiter():
+    def __init__(self, rate):
+        """Lets the threads that share it through at most rate times
+        per second between them, evenly spaced, or as often as they
+        like if rate is None.
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self, count=1):
+        """Blocks until the calling thread may send count requests."""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + count * self.interval
+        if start > now:
+            time.sleep(start - now)
+
 
 class Datamuse():
-    def __init__(self):
+    def __init__(self, max_connections=10, timeout=10, retries=3, backoff=0.5, cache=None,
+                 rate=None):
+        """A client for the Datamuse API.
+        :max_connections
+            the most connections kept open to the API at once, and the
+            default number of requests the bulk methods send at once
+        :timeout
+            seconds to wait for the API to connect and to answer
+        :retries
+            how many times a request is sent again after a connection
+            error, a timeout or one of RETRY_STATUSES
+        :backoff
+            seconds to wait before the first retry, doubled for every
+            retry after it
+        :cache
+            a ResponseCache, or the path of the file of one, that answers
+            the queries it has seen before instead of the API
+        :rate
+            the most requests per second sent to the API by every thread
+            using this client together, retries included, or None for no
+            limit. queries the cache answers don't count
+        """
         self.api_root = 'https://api.datamuse.com'
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = RateLimiter(rate)
+        if isinstance(cache, str):
+            cache = ResponseCache(cache)
+        self.cache = cache
+
+        # one session for every request, so connections are kept
+        # alive and reused instead of opened for every call
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
         self.word_params = {
             'ml',
             'sl',
@@ -34,24 +225,140 @@ class Datamuse():
             'v'
         }
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Closes the connections of the session, and the cache."""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
     def validate_args(self, args, param_set):
         for arg in args:
             if arg not in param_set:
                 raise ValueError('{0} is not a valid parameter for this endpoint.'.format(arg))
 
     def get_resource(self, endpoint, **kwargs):
-        # I feel like this should have some kind of error handling...
+        """Returns the decoded json response of the API for endpoint.
+        Connection errors, timeouts and RETRY_STATUSES are retried with
+        exponential backoff; once the retries run out, the last error
+        is raised (requests' ConnectionError, Timeout or HTTPError).
+        Responses are looked up in and added to the cache, if there is one.
+        """
+        if self.cache is not None:
+            data = self.cache.get(endpoint, kwargs)
+            if data is not None:
+                return data
+
         url = self.api_root + endpoint
-        response = requests.get(url, params=kwargs)
-        data = response.json()
-        return data
+        for attempt in range(self.retries + 1):
+            try:
+                self.limiter.wait()
+                response = self.session.get(url, params=kwargs, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    data = response.json()
+                    if self.cache is not None:
+                        self.cache.put(endpoint, kwargs, data)
+                    return data
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
 
     def words(self, **kwargs):
         self.validate_args(kwargs, self.word_params)
         words = '/words'
         return self.get_resource(words, **kwargs)
 
+    def cached_words(self, **kwargs):
+        """Whether words(**kwargs) would be answered by the cache."""
+        self.validate_args(kwargs, self.word_params)
+        return self.cache is not None and self.cache.contains('/words', kwargs)
+
     def suggest(self, **kwargs):
         self.validate_args(kwargs, self.suggest_params)
         sug = '/sug'
-        return self.get_resource(sug, **kwargs)
\ No newline at end of file
+        return self.get_resource(sug, **kwargs)
+
+    def bulk_words(self, words, relations=('rel_rhy', 'rel_nry'), workers=None, **kwargs):
+        """Fetches every relation in relations for every word in words,
+        sending up to workers requests at once (max_connections if None).
+        Any other kwargs are sent with every request, e.g. max=10.
+        :returns
+            {word: {relation: response}}, e.g.
+            {'orange': {'rel_rhy': [], 'rel_nry': [{'word': 'storage', 'score': 973}]}}
+        """
+        self.validate_args(set(relations) | set(kwargs), self.word_params)
+        words = list(dict.fromkeys(words))
+        results = dict((word, {}) for word in words)
+
+        def fetch(word, relation):
+            params = dict(kwargs)
+            params[relation] = word
+            results[word][relation] = self.words(**params)
+
+        with ThreadPoolExecutor(max_workers=workers or self.max_connections) as executor:
+            jobs = [executor.submit(fetch, word, relation)
+                    for word in words for relation in relations]
+            try:
+                for job in jobs:
+                    job.result()
+            except BaseException:
+                for job in jobs:
+                    job.cancel()
+                raise
+        return results
+
+
+class AsyncDatamuse():
+    def __init__(self, api=None, **kwargs):
+        """The Datamuse client for asyncio. Requests are sent by the
+        blocking client api (a new Datamuse(**kwargs) if None) from a
+        thread pool, so waiting on them never blocks the event loop.
+        """
+        self.api = api if api is not None else Datamuse(**kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=self.api.max_connections)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.api.close()
+
+    async def run(self, function, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(function, **kwargs))
+
+    async def words(self, **kwargs):
+        return await self.run(self.api.words, **kwargs)
+
+    async def suggest(self, **kwargs):
+        return await self.run(self.api.suggest, **kwargs)
+
+    async def bulk_words(self, words, relations=('rel_rhy', 'rel_nry'), workers=None, **kwargs):
+        """The same as Datamuse.bulk_words, with up to workers requests
+        awaited at once.
+        """
+        self.api.validate_args(set(relations) | set(kwargs), self.api.word_params)
+        words = list(dict.fromkeys(words))
+        results = dict((word, {}) for word in words)
+        semaphore = asyncio.Semaphore(workers or self.api.max_connections)
+
+        async def fetch(word, relation):
+            params = dict(kwargs)
+            params[relation] = word
+            async with semaphore:
+                results[word][relation] = await self.words(**params)
+
+        await asyncio.gather(*[fetch(word, relation)
+                               for word in words for relation in relations])
+        return results
@@ -1,6 +1,16 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import asyncio
+import threading
 import unittest
+import requests
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 import datamuse
-from datamuse import Datamuse
+from datamuse import Datamuse, AsyncDatamuse, ResponseCache
 
 class DatamuseTestCase(unittest.TestCase):
     def setUp(self):
@@ -31,6 +41,203 @@ class DatamuseTestCase(unittest.TestCase):
         with self.assertRaises(ValueError):
             data = self.api.words(**args)
 
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers /words like the API, with one made up word per query.
+    The first `failures` requests get a 503, and requests for the word
+    'slow' are answered after a second.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            failing = server.failures > 0
+            server.failures -= 1
+        if failing:
+            self.respond(503, {'error': 'busy'})
+            return
+        query = parse_qs(urlparse(self.path).query)
+        relation = 'rel_rhy' if 'rel_rhy' in query else 'rel_nry'
+        word = query[relation][0]
+        if word == 'slow':
+            time.sleep(1)
+        self.respond(200, [{'word': word + '-' + relation, 'score': 100}])
+
+    def respond(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # the client hangs up on slow answers once it times out
+        pass
+
+
+class StandInTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer(('127.0.0.1', 0), StandInHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.failures = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api = Datamuse(timeout=0.5, retries=2, backoff=0.01)
+        self.api.api_root = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.api.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_words(self):
+        data = self.api.words(rel_rhy='orange')
+        self.assertEqual(data, [{'word': 'orange-rel_rhy', 'score': 100}])
+
+    def test_session_reused(self):
+        connections = []
+        connect = StandInHandler.setup
+
+        def setup(handler):
+            connections.append(handler.client_address)
+            connect(handler)
+        StandInHandler.setup = setup
+        try:
+            for i in range(5):
+                self.api.words(rel_rhy='orange')
+        finally:
+            StandInHandler.setup = connect
+        self.assertEqual(len(connections), 1)
+
+    def test_retries(self):
+        self.server.failures = 2
+        data = self.api.words(rel_rhy='orange')
+        self.assertEqual(data[0]['word'], 'orange-rel_rhy')
+        self.assertEqual(self.server.requests, 3)
+
+    def test_retries_run_out(self):
+        self.server.failures = 3
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.api.words(rel_rhy='orange')
+        self.assertEqual(self.server.requests, 3)
+
+    def test_timeout(self):
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.api.words(rel_rhy='slow')
+        self.assertEqual(self.server.requests, 3)
+
+    def test_bulk_words(self):
+        words = ['orange', 'door', 'hinge', 'orange']
+        data = self.api.bulk_words(words, workers=3, max=5)
+        self.assertEqual(list(data), ['orange', 'door', 'hinge'])
+        for word in data:
+            self.assertEqual(data[word]['rel_rhy'][0]['word'], word + '-rel_rhy')
+            self.assertEqual(data[word]['rel_nry'][0]['word'], word + '-rel_nry')
+        self.assertEqual(self.server.requests, 6)
+
+    def test_rate(self):
+        self.api.limiter = datamuse.RateLimiter(20)
+        start = time.monotonic()
+        self.api.bulk_words(['orange', 'door', 'hinge'], workers=3)
+        # the first request goes straight through, the other five wait
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+        self.assertEqual(self.server.requests, 6)
+
+    def test_bulk_bad_request(self):
+        with self.assertRaises(ValueError):
+            self.api.bulk_words(['orange'], relations=('foo',))
+
+    def test_async_bulk_words(self):
+        async def fetch():
+            async with AsyncDatamuse(self.api) as api:
+                single = await api.words(rel_nry='door')
+                bulk = await api.bulk_words(['orange', 'door'], workers=2)
+                return single, bulk
+        single, bulk = asyncio.run(fetch())
+        self.assertEqual(single[0]['word'], 'door-rel_nry')
+        self.assertEqual(bulk['orange']['rel_rhy'][0]['word'], 'orange-rel_rhy')
+        self.assertEqual(bulk['door']['rel_nry'][0]['word'], 'door-rel_nry')
+
+    def test_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'datamuse.cache')
+            self.api.cache = ResponseCache(path)
+            first = self.api.words(rel_rhy='orange', max=5)
+            self.assertTrue(self.api.cached_words(max=5, rel_rhy='orange'))
+            self.assertEqual(self.api.words(max=5, rel_rhy='orange'), first)
+            self.assertEqual(self.server.requests, 1)
+
+            # a later client, e.g. another artist's rebuild, shares it
+            with Datamuse(cache=path) as api:
+                api.api_root = self.api.api_root
+                self.assertEqual(api.words(rel_rhy='orange', max=5), first)
+                api.words(rel_rhy='door', max=5)
+            self.assertEqual(self.server.requests, 2)
+        finally:
+            shutil.rmtree(directory)
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'datamuse.cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key_ignores_order(self):
+        self.assertEqual(ResponseCache.key('/words', {'rel_rhy': 'door', 'max': 5}),
+                         ResponseCache.key('/words', {'max': 5, 'rel_rhy': 'door'}))
+        self.assertNotEqual(ResponseCache.key('/words', {'rel_rhy': 'door'}),
+                            ResponseCache.key('/words', {'rel_nry': 'door'}))
+
+    def test_get_put(self):
+        cache = ResponseCache(self.path)
+        self.assertIsNone(cache.get('/words', {'rel_rhy': 'door'}))
+        cache.put('/words', {'rel_rhy': 'door'}, [{'word': 'more', 'score': 1}])
+        self.assertEqual(cache.get('/words', {'rel_rhy': 'door'}), [{'word': 'more', 'score': 1}])
+        cache.put('/words', {'rel_rhy': 'door'}, [])
+        self.assertEqual(cache.get('/words', {'rel_rhy': 'door'}), [])
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size, cache.total_bytes())
+        cache.close()
+
+    def test_ttl(self):
+        cache = ResponseCache(self.path, ttl=0.1)
+        cache.put('/words', {'rel_rhy': 'door'}, [])
+        self.assertTrue(cache.contains('/words', {'rel_rhy': 'door'}))
+        time.sleep(0.2)
+        self.assertFalse(cache.contains('/words', {'rel_rhy': 'door'}))
+        self.assertIsNone(cache.get('/words', {'rel_rhy': 'door'}))
+        self.assertEqual(len(cache), 0)
+        cache.close()
+
+    def test_evicts_least_recently_used(self):
+        body = [{'word': 'x' * 80, 'score': 1}]
+        size = len(json.dumps(body))
+        cache = ResponseCache(self.path, max_bytes=3 * size)
+        for word in ['a', 'b', 'c']:
+            cache.put('/words', {'rel_rhy': word}, body)
+        cache.get('/words', {'rel_rhy': 'a'})
+        cache.put('/words', {'rel_rhy': 'd'}, body)
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get('/words', {'rel_rhy': 'b'}))
+        for word in ['a', 'c', 'd']:
+            self.assertEqual(cache.get('/words', {'rel_rhy': word}), body)
+        self.assertLessEqual(cache.size, 3 * size)
+        cache.close()
+
 # though really you can just run `nosetests -sv` from this directory
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
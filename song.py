@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# -----------------------------------------------------------------------------
+# Song class ------------------------------------------------------------------
+# A generated song, as returned by generateSong and generateSongs in
+# generate.py, so that songs can be kept, ranked and printed later
+
+class Song(object):
+
+    def __init__(self, verseOne, verseTwo, chorus, rhymeScheme, seed=None, stats=None):
+        """
+        Requires: verseOne, verseTwo, and chorus are lists of lists of
+                  strings, and rhymeScheme is one of RHYME_SCHEMES
+        Modifies: self (this instance of the Song object)
+        Effects:  this is the Song constructor. seed is the seed the song
+                  was generated from, if any, so that it can be generated
+                  again. stats holds the GenerationStats of every line, in
+                  one list per stanza like the lines, if they were kept.
+        """
+        self.verseOne = verseOne
+        self.verseTwo = verseTwo
+        self.chorus = chorus
+        self.rhymeScheme = rhymeScheme
+        self.seed = seed
+        self.stats = stats
+
+    def stanzas(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns the stanzas in the order they are sung:
+                  verse one, chorus, verse two, chorus
+        """
+        return [self.verseOne, self.chorus, self.verseTwo, self.chorus]
+
+    def lines(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns every line of the song in the order it is sung,
+                  where each line is a list of strings
+        """
+        return [line for stanza in self.stanzas() for line in stanza]
+
+    def timedOut(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns True if any line was cut short by the song's
+                  timeout. such a song depends on how fast it was
+                  generated, so generating it again from its seed may not
+                  give the same song. returns False if no stats were kept.
+        """
+        return any(line_stats.timeouts for stanza in (self.stats or [])
+                   for line_stats in stanza)
+
+    def toDict(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns the song as a dictionary of plain lists and
+                  strings, e.g. to be written out as JSON
+        """
+        return {'verseOne': self.verseOne, 'verseTwo': self.verseTwo,
+                'chorus': self.chorus, 'rhymeScheme': self.rhymeScheme,
+                'seed': self.seed}
+
+    def __str__(self):
+        """
+        Requires: nothing
+        Modifies: nothing
+        Effects:  returns the lyrics as printSongLyrics prints them,
+                  one capitalized line per line with a blank line
+                  between stanzas
+        """
+        return '\n\n'.join('\n'.join(' '.join(line).capitalize() for line in stanza)
+                           for stanza in self.stanzas())
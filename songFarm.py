@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import sys
+import time
+import random
+import multiprocessing
+from generate import *
+
+# -----------------------------------------------------------------------------
+# Song farm -------------------------------------------------------------------
+# Generates a batch of songs in several worker processes at once. Song i of a
+# batch is always generated from songSeed(seed, i), and the songs are handed
+# back in order, so a master seed gives exactly the same songs as
+# generateSongs no matter how many workers there are.
+#
+# Where the operating system can fork, the workers are forked after the
+# models have been prepared and share them copy-on-write. Elsewhere, every
+# worker gets its own copy of the models, or loads them from a snapshot.
+
+# the models of this worker process, set up by initFarmWorker
+_farmModels = None
+
+
+def initFarmWorker(models, snapshotFile=None):
+    """
+    Requires: models is a list returned by trainLyricsModels, or None if
+              snapshotFile is a snapshot saved by trainLyricsModels
+    Modifies: _farmModels
+    Effects:  runs once in each worker process before it generates any
+              songs, and makes the models available to farmSong
+    """
+    global _farmModels
+    if models is None:
+        models = loadSnapshot(snapshotFile, snapshotKey())[0]
+        prepareModels(models)
+    _farmModels = models
+
+def farmSong(seed, deadline=None):
+    """
+    Requires: initFarmWorker has been run in this process
+    Modifies: the caches of the models
+    Effects:  generates one song from seed in a worker process. deadline
+              is the same as for generateSong; it is a time.time() rather
+              than a timeout so that the time the job spent queued counts
+              against it. raises TimeoutError without generating anything
+              if deadline has already passed when the job starts.
+    """
+    checkDeadline(deadline)
+    return generateSong(_farmModels, seed, deadline=deadline)
+
+def farmLine(seed, desiredLength, deadline=None):
+    """
+    Requires: initFarmWorker has been run in this process and
+              desiredLength is a positive int
+    Modifies: the caches of the models
+    Effects:  generates a single line of about desiredLength words from
+              seed in a worker process. if deadline is given, the line
+              falls back to greedySentence once time.time() is past it,
+              and the job is skipped like farmSong's if it already is.
+              returns the line, as a list of strings, and whether it fell
+              back because of the deadline, like Song.timedOut
+    """
+    checkDeadline(deadline)
+    stats = GenerationStats()
+    line = generateSentence(_farmModels[0], desiredLength, rng=random.Random(seed),
+                            deadline=deadline, stats=stats)
+    return line, stats.timeouts > 0
+
+def checkDeadline(deadline):
+    """
+    Requires: deadline is None or a time.time()
+    Modifies: nothing
+    Effects:  raises TimeoutError if deadline has passed, so that a job
+              whose caller has stopped waiting for it isn't generated
+    """
+    if deadline is not None and time.time() > deadline:
+        raise TimeoutError('the deadline passed before the job started')
+
+def farmSongs(models, n, seed=None, processes=None, snapshotFile=None):
+    """
+    Requires: models is a list returned by trainLyricsModels and n is a
+              non-negative int. processes is None or a positive int.
+              if snapshotFile is given, it is a snapshot of the same models
+    Modifies: the caches of the models
+    Effects:  generator over the same n Songs as generateSongs(models, n,
+              seed), in the same order, generated by a pool of processes
+              workers (one per core if processes is None). each song is
+              yielded as soon as it and every song before it are done.
+
+              the workers inherit models copy-on-write if they can be
+              forked. otherwise they load the models from snapshotFile,
+              which is memory-mapped, or are sent a copy of models if
+              there is no snapshot.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 63)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    # prepared before forking, so the workers share
+    # the filled rhyme tables and the reachability table instead of
+    # each building their own
+    prepareModels(models)
+    seeds = (songSeed(seed, i) for i in range(n))
+
+    if processes <= 1:
+        for song_seed in seeds:
+            yield generateSong(models, song_seed)
+        return
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        initargs = (models,)
+    else:
+        context = multiprocessing.get_context()
+        initargs = (None, snapshotFile) if snapshotFile is not None else (models,)
+
+    pool = context.Pool(processes, initializer=initFarmWorker, initargs=initargs)
+    try:
+        for song in pool.imap(farmSong, seeds):
+            yield song
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+# -----------------------------------------------------------------------------
+# Testing code ----------------------------------------------------------------
+
+if __name__ == '__main__':
+    lyricsModels = trainLyricsModels('Coldplay')
+    numSongs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for processes in [1, multiprocessing.cpu_count()]:
+        start = time.time()
+        songs = list(farmSongs(lyricsModels, numSongs, seed=0, processes=processes))
+        print('processes = %d: %d songs in %.3fs' % (processes, len(songs), time.time() - start))